@@ -14,6 +14,7 @@ import app_secrets
 import config
 
 from define_routes import define_routes  # Import the function to define routes
+from define_commands import define_commands  # flask CLI commands (flask wics ...)
 
 def create_app(config_name=app_secrets.config_to_use):  # type: ignore
     flskapp = Flask(__name__, static_folder='assets', template_folder='templates')
@@ -79,6 +80,10 @@ def create_app(config_name=app_secrets.config_to_use):  # type: ignore
         )
     cTools = calvincTools(appContext)
 
+    # templates evaluate CTD_QTY_Expr with eval_arith; use the memoized one
+    from procs.ctdqty import eval_arith
+    flskapp.jinja_env.globals['eval_arith'] = eval_arith
+
     # # initialize Huey
     # from database import huey_engine, set_SQLite_WAL_mode
     # set_SQLite_WAL_mode()  # set the SQLite journal mode to WAL (Write-Ahead Logging) to allow for better concurrency between the main application and the background tasks when they are both accessing the same SQLite database. This is necessary because SQLite has limited support for concurrent writes, and using WAL mode can help mitigate some of those issues by allowing multiple readers and a single writer to access the database at the same time without blocking each other as much as in the default journal mode.
@@ -90,6 +95,7 @@ def create_app(config_name=app_secrets.config_to_use):  # type: ignore
     
     # define routes
     define_routes(flskapp)  # Call the function to define routes
+    define_commands(flskapp)
     
     return flskapp
 
@@ -0,0 +1,55 @@
+// Material goto boxes: typeahead from /WICS/api/materials/search instead of a full Material list in the page.
+//
+//  attachMatlTypeahead(inputElmnt, datalistElmnt, searchURL, MatlMap)
+//      as the user types, fill datalistElmnt with the best matches; every match shown is remembered in
+//      MatlMap ("Material:org" -> id), so MatlMap.has() / .get() keep working for anything picked from the list
+//  resolveMaterial(inputElmnt, searchURL, MatlMap)
+//      Promise of the id of the "Material:org" typed in inputElmnt (undefined if there is no such Material);
+//      one not in MatlMap yet is looked up (case doesn't matter), and inputElmnt is set to it as stored
+
+const MATLSEARCH_DELAY_MS = 150;
+
+function _fetchMatlSearch(searchURL, q, limit) {
+    const url = searchURL + "?q=" + encodeURIComponent(q) + (limit ? "&limit=" + limit : "");
+    return fetch(url, {headers: {"Accept": "application/json"}})
+        .then(response => response.ok ? response.json() : {results: []})
+        .catch(() => ({results: []}));
+}
+
+function attachMatlTypeahead(inputElmnt, datalistElmnt, searchURL, MatlMap) {
+    let timer = null;
+    let lastQ = null;
+    inputElmnt.addEventListener("input", function() {
+        const q = inputElmnt.value.trim();
+        if (timer) { clearTimeout(timer); }
+        if (q == "" || q == lastQ || MatlMap.has(inputElmnt.value)) { return; }
+        timer = setTimeout(function() {
+            lastQ = q;
+            _fetchMatlSearch(searchURL, q).then(function(data) {
+                if (inputElmnt.value.trim() != q) { return; }      // user has typed on; a newer search is coming
+                datalistElmnt.replaceChildren();
+                for (const m of data.results) {
+                    MatlMap.set(m.Material_org, m.id);
+                    const opt = document.createElement("option");
+                    opt.value = m.Material_org;
+                    opt.label = m.Description;
+                    datalistElmnt.appendChild(opt);
+                }
+            });
+        }, MATLSEARCH_DELAY_MS);
+    });
+}
+
+function resolveMaterial(inputElmnt, searchURL, MatlMap) {
+    const v = inputElmnt.value.trim();
+    if (v == "") { return Promise.resolve(undefined); }
+    if (MatlMap.has(inputElmnt.value)) { return Promise.resolve(MatlMap.get(inputElmnt.value)); }
+    return _fetchMatlSearch(searchURL, v, 1).then(function(data) {
+        const m = data.results[0];
+        if (!m) { return undefined; }
+        if (m.Material_org.toLowerCase() != v.toLowerCase()) { return undefined; }
+        MatlMap.set(m.Material_org, m.id);
+        inputElmnt.value = m.Material_org;
+        return m.id;
+    });
+}
@@ -0,0 +1,45 @@
+// Validate-only uploads: show the summary a validateOnly Counts or MM60 upload returns (procs/uplvalidate.py).
+//
+//  showUploadValidation(element, validation)
+//      fill element with how many rows would be added/changed/removed and how many have errors,
+//      each with the rows the server listed
+
+const UPLVALIDATE_HEADINGS = Object.freeze({
+    errors: "with errors",
+    inserts: "would be added",
+    updates: "would be changed",
+    deletes: "would be removed",
+});
+
+function showUploadValidation(element, validation) {
+    element.replaceChildren();
+
+    const heading = document.createElement("h4");
+    heading.textContent = validation.ok
+        ? "Validation passed - nothing has been written yet"
+        : "Validation found errors - nothing has been written";
+    heading.style.color = validation.ok ? "green" : "red";
+    element.appendChild(heading);
+
+    const stats = document.createElement("div");
+    stats.textContent = Object.entries(validation.stats).map(([k, v]) => `${k}: ${v}`).join(", ");
+    element.appendChild(stats);
+
+    for (const [kind, text] of Object.entries(UPLVALIDATE_HEADINGS)) {
+        const n = validation.counts[kind];
+        if (!n) { continue; }
+        const details = document.createElement("details");
+        details.open = (kind === "errors");
+        const summary = document.createElement("summary");
+        summary.textContent = `${n} ${text}` + (validation.truncated[kind] ? ` (first ${validation.lists[kind].length} listed)` : "");
+        details.appendChild(summary);
+        const ul = document.createElement("ul");
+        for (const item of validation.lists[kind]) {
+            const li = document.createElement("li");
+            li.textContent = (item.rowNum != null ? `Sprsht row ${item.rowNum}: ` : "") + item.text;
+            ul.appendChild(li);
+        }
+        details.appendChild(ul);
+        element.appendChild(details);
+    }
+}
@@ -0,0 +1,22 @@
+"""
+Huey side of async_procs.jobrunner (JOB_RUNNER = 'huey').
+
+Storage is a SQLite file (HUEY_SQLITE_FILE), so no Redis or other broker is needed.
+Only imported when the huey runner is used, and by the consumer:
+
+    huey_consumer.py async_procs.huey_tasks.huey --workers 2 --logfile=./huey.log
+"""
+from huey import SqliteHuey
+
+import app_secrets
+import config
+
+huey = SqliteHuey('WICS4', filename=config.config[app_secrets.config_to_use].HUEY_SQLITE_FILE)
+
+@huey.task()
+def run_job(jobpath:str, args:tuple, kwargs:dict):
+    # the consumer is its own process; it needs its own app (and app context)
+    from app import app as flskapp
+    from async_procs.jobrunner import run_job_in_app_context
+    return run_job_in_app_context(flskapp, jobpath, args, kwargs)
+# run_job
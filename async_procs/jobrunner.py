@@ -0,0 +1,62 @@
+"""
+Background job runner for the long WICS procs (MM60 Material List update, ...).
+
+A job is named by its dotted path, 'package.module:function', so it can be queued
+by any runner and resolved again wherever it runs.  Jobs always run inside a
+Flask app context and report progress through async_comm as before.
+
+config JOB_RUNNER:
+    'thread'    in-process ThreadPoolExecutor (JOB_RUNNER_THREADS workers).  Nothing else to run,
+                but a job dies with the gunicorn worker that started it.
+    'huey'      Huey with SqliteHuey storage (HUEY_SQLITE_FILE) - no broker needed.  Run a consumer:
+                    huey_consumer.py async_procs.huey_tasks.huey
+    'inline'    run the job in the calling request (the old behaviour; handy for debugging)
+"""
+import importlib, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, Flask
+
+
+_thread_pool:ThreadPoolExecutor|None = None
+_thread_pool_lock = threading.Lock()
+
+def resolve_job(jobpath:str):
+    """'package.module:function' -> the function"""
+    modname, _, fnname = jobpath.partition(':')
+    return getattr(importlib.import_module(modname), fnname)
+
+def run_job_in_app_context(flskapp:Flask, jobpath:str, args:tuple, kwargs:dict):
+    with flskapp.app_context():
+        try:
+            return resolve_job(jobpath)(*args, **kwargs)
+        except Exception:
+            flskapp.logger.exception(f'background job {jobpath}{args} failed')
+            raise
+# run_job_in_app_context
+
+def _get_thread_pool(nthreads:int) -> ThreadPoolExecutor:
+    global _thread_pool
+    with _thread_pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=max(1, nthreads), thread_name_prefix='WICSjob')
+    return _thread_pool
+
+def enqueue_job(jobpath:str, *args, **kwargs) -> None:
+    """
+    queue jobpath(*args, **kwargs) on the configured runner and return immediately
+    (except for 'inline', which returns when the job is done).
+    args/kwargs must be picklable for the 'huey' runner - pass ids and file names, not ORM objects.
+    """
+    runner = current_app.config.get('JOB_RUNNER', 'thread')
+    if runner == 'huey':
+        from async_procs.huey_tasks import run_job
+        run_job(jobpath, args, kwargs)
+    elif runner == 'inline':
+        resolve_job(jobpath)(*args, **kwargs)
+    else:   # 'thread'
+        flskapp = current_app._get_current_object()     # type: ignore[attr-defined]
+        pool = _get_thread_pool(current_app.config.get('JOB_RUNNER_THREADS', 2))
+        pool.submit(run_job_in_app_context, flskapp, jobpath, args, kwargs)
+    # endif runner
+# enqueue_job
@@ -0,0 +1,79 @@
+"""
+In-process pub/sub for async_comm progress.
+
+async_comm.set_async_comm_state / delete_async_comm publish here after they commit;
+the SSE progress streams block in wait() instead of polling WICS_async_comm.
+A notification only says "reqid changed" - listeners still read the record itself.
+A reqid is forgotten once its terminal state is published and nobody is waiting on it any more.
+
+This only reaches listeners in the same process.  When the job runs somewhere else
+(JOB_RUNNER = 'huey', or another gunicorn worker), wait() simply times out and the
+caller falls back to reading the DB (see progress_UplSprSht).
+"""
+import threading, time
+
+
+# how long a "deleted" marker is kept for listeners that have not woken up yet
+_DELETED_KEEP_SECS = 60
+
+class ProgressNotifier:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._versions:dict[str, int] = {}
+        self._deleted:dict[str, float] = {}     # reqid -> time deleted
+        self._waiting:dict[str, int] = {}       # reqid -> listeners in wait()
+        self._terminal:set[str] = set()         # reqids whose terminal state is published, kept for their listeners
+
+    def publish(self, reqid, version:int, terminal:bool = False) -> None:
+        """terminal: nothing more will come for reqid - it's forgotten once its listeners have heard this"""
+        reqid = str(reqid)
+        with self._cond:
+            self._deleted.pop(reqid, None)
+            if terminal and not self._waiting.get(reqid):
+                self._versions.pop(reqid, None)
+                self._terminal.discard(reqid)
+                return
+            self._versions[reqid] = version
+            if terminal:
+                self._terminal.add(reqid)
+            else:
+                self._terminal.discard(reqid)
+            self._cond.notify_all()
+
+    def publish_deleted(self, reqid) -> None:
+        reqid = str(reqid)
+        now = time.monotonic()
+        with self._cond:
+            self._versions.pop(reqid, None)
+            self._terminal.discard(reqid)
+            self._deleted[reqid] = now
+            for r in [r for r, t in self._deleted.items() if now - t > _DELETED_KEEP_SECS]:
+                del self._deleted[r]
+            self._cond.notify_all()
+
+    def wait(self, reqid, last_version:int, timeout:float) -> str|None:
+        """
+        block until reqid is published past last_version or deleted, or until timeout.
+        returns 'changed', 'deleted', or None (timed out - nothing heard in this process)
+        """
+        reqid = str(reqid)
+        def heard():
+            if reqid in self._deleted: return 'deleted'
+            if self._versions.get(reqid, 0) > last_version: return 'changed'
+            return None
+        with self._cond:
+            self._waiting[reqid] = self._waiting.get(reqid, 0) + 1
+            try:
+                self._cond.wait_for(heard, timeout=timeout)
+                return heard()
+            finally:
+                self._waiting[reqid] -= 1
+                if not self._waiting[reqid]:
+                    del self._waiting[reqid]
+                    if reqid in self._terminal:
+                        # the last listener has heard the end
+                        self._terminal.discard(reqid)
+                        self._versions.pop(reqid, None)
+# ProgressNotifier
+
+progress_notifier = ProgressNotifier()
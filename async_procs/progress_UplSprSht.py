@@ -1,43 +1,64 @@
 from models import async_comm
+from async_procs.notifier import progress_notifier
 
 
-from flask import Response, stream_with_context
+from flask import Response, stream_with_context, current_app
 
 
 import json
-import time
 
 
+# the stream ends when it sends one of these
+SSE_TERMINAL_STATECODES = ('done', 'fatalerr')
+
 def progress_UplSprSht(reqid):
+    # waits on progress_notifier (set_async_comm_state publishes there); the DB is read only when
+    # something was published, or - for jobs running in another process - when the wait times out.
+    # The timeout backs off from SSE_FALLBACKPOLL_MIN_SECS to SSE_FALLBACKPOLL_MAX_SECS while nothing changes
+    pollMin = float(current_app.config.get('SSE_FALLBACKPOLL_MIN_SECS', 1.0))
+    pollMax = max(pollMin, float(current_app.config.get('SSE_FALLBACKPOLL_MAX_SECS', 15.0)))
 
     def generate():
         last_version = 0
+        seen_row = False
+        pollWait = pollMin
 
-        while True:
-            # session = HueySession()
-
-            row = async_comm.get_async_comm_state(reqid)    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to None if we can't get the record
-
-            if row and row.version > last_version:
-
-                payload = json.dumps({
-                    "statecode": row.statecode,
-                    "statetext": row.statetext
-                })  #should I dump the whole record here instead of just statecode and statetext?  Maybe not a good idea if there are big text fields or something, but it would be more flexible for the frontend if it had access to all the fields without me having to predict which ones it might want.  For now, I'll just include statecode and statetext since those are the ones I know the frontend will need, and I can always add more later if needed.
-
-                yield f"data: {payload}\n\n"
+        try:
+            while True:
+                row = async_comm.get_async_comm_record(reqid)
 
-                last_version = row.version
-
-                if row.statecode == "done":
+                if row is None:
+                    # deleted (e.g. by cleanup after failure), or never existed - nothing more will come
+                    yield f"event: end\ndata: {json.dumps({'reqid': str(reqid), 'seen': seen_row})}\n\n"
                     break
-
-            # session.close()
-
-            yield ": keepalive\n\n"
-
-            time.sleep(1)
-        # endwhile (until we break on statecode == "done")
+                seen_row = True
+
+                if row['version'] > last_version:
+                    payload = json.dumps({
+                        "statecode": row['statecode'],
+                        "statetext": row['statetext']
+                    })  #should I dump the whole record here instead of just statecode and statetext?  Maybe not a good idea if there are big text fields or something, but it would be more flexible for the frontend if it had access to all the fields without me having to predict which ones it might want.  For now, I'll just include statecode and statetext since those are the ones I know the frontend will need, and I can always add more later if needed.
+
+                    yield f"data: {payload}\n\n"
+
+                    last_version = row['version']
+                    pollWait = pollMin
+
+                    if row['statecode'] in SSE_TERMINAL_STATECODES:
+                        break
+                # endif new version
+
+                heard = progress_notifier.wait(reqid, last_version, timeout=pollWait)
+                if heard is None:
+                    # nothing in this process; keep the connection alive (a dead client shows up here
+                    # as GeneratorExit) and poll the DB a little less often next time
+                    yield ": keepalive\n\n"
+                    pollWait = min(pollWait * 2, pollMax)
+                # endif heard
+            # endwhile (until the state is terminal or the record is gone)
+        except GeneratorExit:
+            # client went away
+            return
     # generate
 
     r = Response(stream_with_context(generate()),
@@ -45,4 +66,4 @@ def progress_UplSprSht(reqid):
 
     r.headers["X-Accel-Buffering"] = "no"
 
-    return r
\ No newline at end of file
+    return r
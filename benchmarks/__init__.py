@@ -0,0 +1 @@
+"""Stand-alone benchmark scripts.  Run from the project root, e.g. ``python -m benchmarks.bench_sprsht_ingest``."""
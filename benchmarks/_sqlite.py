@@ -0,0 +1,38 @@
+"""
+Build WICS tables in a throwaway SQLite database for the benchmarks.
+
+The models use a few MySQL column types (TINYINT, LONGTEXT, ...) that SQLite's DDL compiler
+does not know; they are rendered as their plain SQLite equivalents here.  BigInteger is rendered
+as INTEGER, so a BigInteger primary key is SQLite's rowid and numbers itself as in MySQL.  Nothing outside
+benchmarks/ imports this module.
+"""
+from sqlalchemy import Table, Column, BigInteger
+from sqlalchemy.dialects.mysql import TINYINT, SMALLINT, INTEGER, LONGTEXT, DATETIME
+from sqlalchemy.ext.compiler import compiles
+
+
+@compiles(BigInteger, 'sqlite')
+@compiles(TINYINT, 'sqlite')
+@compiles(SMALLINT, 'sqlite')
+@compiles(INTEGER, 'sqlite')
+def _sqlite_integer(type_, compiler, **kw):
+    return 'INTEGER'
+
+@compiles(LONGTEXT, 'sqlite')
+def _sqlite_text(type_, compiler, **kw):
+    return 'TEXT'
+
+@compiles(DATETIME, 'sqlite')
+def _sqlite_datetime(type_, compiler, **kw):
+    return 'DATETIME'
+
+
+def create_tables(engine, *models):
+    """(re)create the tables of models; a bare stand-in is added for the calvincTools user table they may refer to"""
+    metadata = models[0].metadata
+    usertbl = metadata.tables.get('userprofiles_wicsuser')
+    if usertbl is None:
+        usertbl = Table('userprofiles_wicsuser', metadata, Column('id', BigInteger, primary_key=True))
+    tables = [usertbl] + [m.__table__ for m in models]
+    metadata.drop_all(engine, tables=tables)
+    metadata.create_all(engine, tables=tables)
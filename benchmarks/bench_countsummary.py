@@ -0,0 +1,186 @@
+"""
+Regression + benchmark: procs.countsummary.fnCountSummarySections (two set-based queries)
+vs. the per-org raw SQL fnCountSummaryRpt ran before (3 queries per org).
+
+    python -m benchmarks.bench_countsummary
+    python -m benchmarks.bench_countsummary --orgs 50 --matls 200 --repeat 5
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_countschedule,
+WICS_actualcounts and a VIEW_materials stand-in), checks that both produce the same sections,
+in the same order, for the default and 'REQ' variations, then times them.
+"""
+import argparse, datetime, os, random, tempfile, time
+
+from flask import Flask
+from sqlalchemy import select, text
+
+from database import app_db
+from models import Organizations, MaterialList, CountSchedule, ActualCounts
+from procs.countsummary import fnCountSummarySections
+
+from benchmarks._sqlite import create_tables
+
+
+VIEW_materials_sql = """
+    CREATE VIEW VIEW_materials AS
+    SELECT mtl.id, mtl.org_id, org.orgname AS OrgName,
+        mtl.Material || ':' || org.orgname AS Material_org,
+        'PT' || (mtl.id % 4) AS PartType,
+        mtl.Description, mtl.TypicalContainerQty, mtl.TypicalPalletQty, mtl.Notes
+    FROM WICS_materiallist mtl
+        INNER JOIN WICS_organizations org ON mtl.org_id = org.id
+    """
+
+def build_db(nOrgs:int, nMatls:int, CountDate:datetime.date, seed:int = 1):
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, CountSchedule, ActualCounts)
+    with app_db.engine.begin() as conn:
+        conn.execute(text('DROP VIEW IF EXISTS VIEW_materials'))
+        conn.execute(text(VIEW_materials_sql))
+
+    orgs = [{'id': o+1, 'orgname': f'Org {o+1:03d}'} for o in range(nOrgs)]
+    matls, sched, counts = [], [], []
+    for org in orgs:
+        for m in range(nMatls):
+            mid = len(matls) + 1
+            matls.append({'id': mid, 'org_id': org['id'], 'Material': f'{rnd.randint(10000, 99999)}-{m}',
+                'Description': f'material {mid}', 'TypicalContainerQty': '10', 'TypicalPalletQty': '100', 'Notes': None})
+            scheduled, counted = rnd.random() < 0.08, rnd.random() < 0.10
+            if scheduled:
+                for _ in range(1 if rnd.random() < 0.95 else 2):
+                    sched.append({'id': len(sched)+1, 'CountDate': CountDate, 'Material_id': mid, 'Counter': 'SCHED',
+                        'Requestor': rnd.choice([None, 'REQSTR']), 'RequestFilled': 0,
+                        'Priority': None, 'ReasonScheduled': 'cycle', 'Notes': None})
+            if counted:
+                for n in range(rnd.randint(1, 3)):
+                    counts.append({'id': len(counts)+1, 'CountDate': CountDate, 'Material_id': mid, 'Counter': rnd.choice(['AB', 'CD']),
+                        'LOCATION': f'L{n}', 'FLAG_PossiblyNotRecieved': 0, 'FLAG_MovementDuringCount': 0,
+                        'LocationOnly': 1 if rnd.random() < 0.05 else 0,
+                        'CycCtID': None, 'CTD_QTY_Expr': f'{rnd.randint(1, 40)}*10', 'PKGID_Desc': None, 'TAGQTY': None, 'Notes': None})
+            # other days, which must not show up
+            if rnd.random() < 0.10:
+                counts.append({'id': len(counts)+1, 'CountDate': CountDate - datetime.timedelta(days=1), 'Material_id': mid, 'Counter': 'ZZ',
+                    'LOCATION': 'X', 'FLAG_PossiblyNotRecieved': 0, 'FLAG_MovementDuringCount': 0, 'LocationOnly': 0,
+                    'CycCtID': None, 'CTD_QTY_Expr': '1', 'PKGID_Desc': None, 'TAGQTY': None, 'Notes': None})
+    app_db.session.execute(Organizations.__table__.insert(), orgs)
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    app_db.session.execute(CountSchedule.__table__.insert(), sched)
+    app_db.session.execute(ActualCounts.__table__.insert(), counts)
+    app_db.session.commit()
+    return len(matls), len(sched), len(counts)
+# build_db
+
+
+def old_sections(CountDate:datetime.date, Rptvariation=None) -> list[dict]:
+    """the per-org raw SQL fnCountSummaryRpt ran before procs.countsummary"""
+    fldlist = "0 as id, cs.id as cs_id, cs.CountDate as cs_CountDate , cs.Counter as cs_Counter" \
+        ", cs.Priority as cs_Priority, cs.ReasonScheduled as cs_ReasonScheduled" \
+        ", cs.Requestor, cs.RequestFilled" \
+        ", cs.Notes as cs_Notes" \
+        ", ac.id as ac_id, ac.CountDate as ac_CountDate, ac.CycCtID as ac_CycCtID, ac.Counter as ac_Counter" \
+        ", ac.LocationOnly as ac_LocationOnly, ac.CTD_QTY_Expr as ac_CTD_QTY_Expr" \
+        ", ac.LOCATION as ac_LOCATION, ac.PKGID_Desc as ac_PKGID_Desc, ac.TAGQTY as ac_TAGQTY" \
+        ", ac.FLAG_PossiblyNotRecieved, ac.FLAG_MovementDuringCount, ac.Notes as ac_Notes" \
+        ", mtl.id as matl_id, mtl.org_id, mtl.OrgName" \
+        ", mtl.Material_org as Matl_PartNum, mtl.PartType as PartType" \
+        ", mtl.Description, mtl.TypicalContainerQty, mtl.TypicalPalletQty, mtl.Notes as mtl_Notes"
+    datestr = "'" + str(CountDate) + "'"
+    date_condition = '(ac.CountDate = ' + datestr + ' OR cs.CountDate = ' + datestr + ') '
+    order_by = 'Matl_PartNum'
+    VIEW_Material_sql = "VIEW_materials mtl "
+
+    sections = []
+    for org in app_db.session.execute(select(Organizations).order_by(Organizations.orgname)).scalars():
+        org_condition = '(mtl.org_id = ' + str(org.id) + ')'
+
+        sql = 'SELECT ' + fldlist + ' FROM WICS_countschedule cs INNER JOIN ' + VIEW_Material_sql + \
+            ' INNER JOIN (SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac ' + \
+            ' ON cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id AND ac.Material_id=mtl.id' + \
+            ' WHERE NOT ac.LocationOnly AND ' + date_condition + ' AND ' + org_condition
+        if Rptvariation == 'REQ':
+            sql += ' AND Requestor IS NOT NULL'
+        sql += ' ORDER BY ' + order_by
+        sections.append({'org': org, 'Title': 'A', 'rawrows': app_db.session.execute(text(sql)).all()})
+
+        if Rptvariation is None:
+            sql = 'SELECT ' + fldlist + ' ' + ' FROM WICS_countschedule cs RIGHT JOIN' + \
+                ' ((SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac INNER JOIN ' + VIEW_Material_sql + ' ON ac.Material_id=mtl.id)' + \
+                ' ON cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id' + \
+                ' WHERE NOT ac.LocationOnly AND ' + date_condition + ' AND ' + org_condition + \
+                ' AND (cs.id IS NULL)' + ' ORDER BY ' + order_by
+            sections.append({'org': org, 'Title': 'B', 'rawrows': app_db.session.execute(text(sql)).all()})
+
+        sql = 'SELECT ' + fldlist + ' ' + ' FROM (WICS_countschedule cs INNER JOIN ' + VIEW_Material_sql + ' ON cs.Material_id=mtl.id)' + \
+            ' LEFT JOIN (SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac ' + \
+            ' ON cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id' + \
+            ' WHERE ' + date_condition + ' AND ' + org_condition + ' AND (ac.id IS NULL)'
+        if Rptvariation == 'REQ':
+            sql += ' AND (Requestor IS NOT NULL)'
+        sql += ' ORDER BY ' + order_by
+        sections.append({'org': org, 'Title': 'C', 'rawrows': app_db.session.execute(text(sql)).all()})
+    # endfor org
+    return sections
+# old_sections
+
+
+# the fields CreateOutputRows reads from a raw row
+compared_fields = ('OrgName', 'Matl_PartNum', 'matl_id', 'org_id', 'Description', 'PartType',
+    'TypicalContainerQty', 'TypicalPalletQty', 'mtl_Notes',
+    'cs_Counter', 'cs_ReasonScheduled', 'cs_Notes', 'Requestor', 'RequestFilled',
+    'ac_CycCtID', 'ac_Counter', 'ac_LOCATION', 'ac_PKGID_Desc', 'ac_TAGQTY', 'ac_CTD_QTY_Expr', 'ac_Notes',
+    'FLAG_PossiblyNotRecieved', 'FLAG_MovementDuringCount', 'cs_id', 'ac_id')
+
+def section_signature(rawrows) -> tuple:
+    """materials in report order, plus each material's rows (order within a material is not defined by either query)"""
+    matlorder, matlrows = [], {}
+    for r in rawrows:
+        if not matlorder or matlorder[-1] != r.matl_id:
+            assert r.matl_id not in matlrows, f'material {r.matl_id} rows are not contiguous'
+            matlorder.append(r.matl_id)
+            matlrows[r.matl_id] = []
+        matlrows[r.matl_id].append(tuple(str(getattr(r, f)) for f in compared_fields))
+    return tuple(matlorder), {m: sorted(rows) for m, rows in matlrows.items()}
+
+def check_same(old:list[dict], new:list[dict]):
+    assert len(old) == len(new), (len(old), len(new))
+    for o, n in zip(old, new):
+        assert o['org'].id == n['org'].id
+        assert section_signature(o['rawrows']) == section_signature(n['rawrows']), (o['org'].orgname, o['Title'], n['Title'])
+
+def timed(fn, *args, repeat:int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        app_db.session.expunge_all()
+        t0 = time.perf_counter()
+        fn(*args)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best    # type: ignore[return-value]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orgs', type=int, default=50)
+    parser.add_argument('--matls', type=int, default=100, help='materials per org')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dbName = os.path.join(tempfile.mkdtemp(prefix='wics_bench_'), 'countsummary.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    CountDate = datetime.date(2025, 3, 14)
+    with flskapp.app_context():
+        nMatls, nSched, nCounts = build_db(args.orgs, args.matls, CountDate)
+        print(f'{args.orgs} orgs, {nMatls} materials, {nSched} schedule recs, {nCounts} count recs')
+
+        for Rptvariation in (None, 'REQ'):
+            check_same(old_sections(CountDate, Rptvariation), fnCountSummarySections(CountDate, Rptvariation))
+            t_old = timed(old_sections, CountDate, Rptvariation, repeat=args.repeat)
+            t_new = timed(fnCountSummarySections, CountDate, Rptvariation, repeat=args.repeat)
+            print(f'variation {str(Rptvariation):>4}: same sections | per-org SQL {t_old*1000:8.1f} ms | set-based {t_new*1000:8.1f} ms | {t_old/t_new:5.1f}x')
+        # endfor Rptvariation
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: posting a Counts workbook with views.ActualCounts.upldActCounts.proc_UpActCountSprsheet_01ReadSheet
+(two passes: one IN lookup for all the Material numbers, then bulk writes a chunk at a time).
+
+    python -m benchmarks.bench_countupload
+    python -m benchmarks.bench_countupload --rows 1000 5000 20000 --matls 20000
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_actualcounts,
+WICS_uploadsapresults, WICS_async_comm) and synthetic Counts workbooks.  Some rows name a
+Material that doesn't exist, or one in two orgs without an org_id, some change the Material's
+typical qtys; the results are checked, then the statements sent to the DB are counted and timed.
+"""
+import argparse, datetime, os, random, tempfile, time, uuid
+
+from flask import Flask
+from openpyxl import Workbook
+from sqlalchemy import event, select, func
+
+from database import app_db
+from models import Organizations, MaterialList, ActualCounts, UploadSAPResults, async_comm
+from views.ActualCounts.upldActCounts import proc_UpActCountSprsheet_00InitUpld, proc_UpActCountSprsheet_01ReadSheet
+
+from benchmarks._sqlite import create_tables
+
+
+Counts_header = ['CountDate', 'Material', 'Counter', 'LOCATION', 'LocationOnly', 'CTD_QTY_Expr', 'Typ Cntner Qty', 'Typ Plt Qty', 'Notes']
+
+def build_db(nMatls:int, nOrgs:int, seed:int = 1) -> list[dict]:
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, ActualCounts, UploadSAPResults)
+    async_comm.__table__.drop(app_db.engine, checkfirst=True)
+    async_comm.__table__.create(app_db.engine)
+    orgs = [{'id': o+1, 'orgname': f'ORG{o+1}'} for o in range(nOrgs)]
+    matls = []
+    for mid in range(1, nMatls+1):
+        matls.append({'id': mid, 'org_id': rnd.randint(1, nOrgs), 'Material': f'M{mid:07d}', 'Description': f'material {mid}',
+            'TypicalContainerQty': '10', 'TypicalPalletQty': '100'})
+    # every 50th Material number is in a second org, too
+    for m in matls[::50]:
+        matls.append({**m, 'id': len(matls)+1, 'org_id': m['org_id'] % nOrgs + 1})
+    app_db.session.execute(Organizations.__table__.insert(), orgs)
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    app_db.session.commit()
+    return matls
+# build_db
+
+def write_workbook(fName:str, nRows:int, matls:list[dict], seed:int = 2) -> dict:
+    """a Counts workbook of nRows rows; returns how many rows of each kind it has"""
+    rnd = random.Random(seed)
+    dupnums = {m['Material'] for m in matls[::50]}
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Counts')
+    ws.append(Counts_header)
+    kinds = {'good': 0, 'nomatl': 0, 'ambiguous': 0, 'typqty': 0, 'ignored': 0}
+    CountDate = datetime.date(2026, 9, 30)
+    for n in range(nRows):
+        m = rnd.choice(matls)
+        r = rnd.random()
+        row = [CountDate, m['Material'], 'AB', f'L{n % 400}', None, f'{rnd.randint(1, 40)}*10', None, None, None]
+        if r < 0.02:
+            row[1] = f'X{n:07d}'
+            kinds['nomatl'] += 1
+        elif r < 0.03:
+            row[1] = None
+            kinds['ignored'] += 1
+        elif m['Material'] in dupnums:
+            kinds['ambiguous'] += 1
+        else:
+            if r < 0.05:
+                row[6] = str(rnd.randint(11, 99))
+                kinds['typqty'] += 1
+            if r > 0.97:
+                row[4], row[5] = 1, None
+            kinds['good'] += 1
+        ws.append(row)
+    # endfor n
+    wb.save(fName)
+    return kinds
+# write_workbook
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--matls', type=int, default=20000)
+    parser.add_argument('--orgs', type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'countupload.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    nStmts = 0
+    with flskapp.app_context():
+        @event.listens_for(app_db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            nonlocal nStmts
+            nStmts += 1
+
+        matls = build_db(args.matls, args.orgs)
+        print(f'{len(matls)} materials, {args.orgs} orgs')
+        for nRows in args.rows:
+            fName = os.path.join(tmpdir, f'counts{nRows}.xlsx')
+            kinds = write_workbook(fName, nRows, matls)
+            app_db.session.execute(ActualCounts.__table__.delete())
+            app_db.session.commit()
+            reqid = str(uuid.uuid4())
+            proc_UpActCountSprsheet_00InitUpld(reqid)
+
+            nStmts = 0
+            t0 = time.perf_counter()
+            proc_UpActCountSprsheet_01ReadSheet(reqid, fName)
+            elapsed = time.perf_counter() - t0
+            stmts = nStmts
+
+            totals = dict(app_db.session.execute(
+                select(UploadSAPResults.errState, UploadSAPResults.rowNum)
+                .where(UploadSAPResults.errState.in_(['nRowsTotal', 'nRowsAdded', 'nRowsErrors', 'nRowsIgnored']))
+                ).tuples().all())
+            nCounts = app_db.session.scalar(select(func.count()).select_from(ActualCounts))
+            nUnevaluated = app_db.session.scalar(select(func.count()).select_from(ActualCounts).where(ActualCounts.CTD_QTY_Invalid.is_(None)))
+            nSuccess = app_db.session.scalar(select(func.count()).select_from(UploadSAPResults).where(UploadSAPResults.errState == 'success'))
+            assert totals['nRowsTotal'] == nRows + 1, totals
+            assert totals['nRowsAdded'] == nCounts == nSuccess == kinds['good'], (totals, nCounts, kinds)
+            assert totals['nRowsErrors'] == kinds['nomatl'] + kinds['ambiguous'], (totals, kinds)
+            assert totals['nRowsIgnored'] == kinds['ignored'], (totals, kinds)
+            assert nUnevaluated == 0
+            print(f'  {nRows:6d} rows: {elapsed*1000:8.1f} ms  {stmts:5d} statements  '
+                f"({kinds['good']} added, {totals['nRowsErrors']} errors, {kinds['typqty']} typ qty changes)")
+        # endfor nRows
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Latency benchmark: procs.matlsearch (the /WICS/api/materials/search typeahead index).
+
+    python -m benchmarks.bench_matlsearch
+    python -m benchmarks.bench_matlsearch --matls 100000 --queries 300
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_mfrpntomaterial),
+checks a few searches against what they must find, then times:
+    - building the index
+    - searches by kind (Material prefix, exact label, MfrPN prefix, Description substring, no match)
+    - the first search after a material is changed (incremental patch + haystack re-join), and the one after that
+"""
+import argparse, os, random, statistics, tempfile, time
+
+from flask import Flask
+from sqlalchemy import update
+
+from database import app_db
+from models import Organizations, MaterialList, MfrPNtoMaterial
+from procs.matlsearch import search_materials, _matlsearch_index
+
+from benchmarks._sqlite import create_tables
+
+
+WORDS = ('bracket', 'screw', 'washer', 'housing', 'cable', 'assy', 'panel', 'valve', 'sensor', 'gasket',
+    'bearing', 'spring', 'clip', 'cover', 'plate', 'motor', 'fuse', 'relay', 'label', 'hose')
+
+def build_db(nMatls:int, nOrgs:int, seed:int = 1) -> dict:
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, MfrPNtoMaterial)
+    orgs = [{'id': o+1, 'orgname': f'ORG{o+1}'} for o in range(nOrgs)]
+    matls, mfrpns = [], []
+    for mid in range(1, nMatls+1):
+        matls.append({'id': mid, 'org_id': rnd.randint(1, nOrgs), 'Material': f'{rnd.randint(100000, 999999)}-{mid:06d}',
+            'Description': ' '.join(rnd.choice(WORDS) for _ in range(3)) + f' {rnd.randint(1, 500)}mm'})
+        for _ in range(rnd.choice((0, 0, 1, 2))):
+            mfrpns.append({'id': len(mfrpns)+1, 'Material_id': mid, 'MfrPN': f'MPN{len(mfrpns)+1:07d}X', 'Manufacturer': 'ACME'})
+    # endfor mid
+    app_db.session.execute(Organizations.__table__.insert(), orgs)
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    app_db.session.execute(MfrPNtoMaterial.__table__.insert(), mfrpns)
+    app_db.session.commit()
+    return {'orgs': orgs, 'matls': matls, 'mfrpns': mfrpns}
+# build_db
+
+def check_results(data:dict):
+    orgname = {o['id']: o['orgname'] for o in data['orgs']}
+    m = data['matls'][len(data['matls']) // 2]
+    label = f"{m['Material']}:{orgname[m['org_id']]}"
+    assert search_materials(label, 5)[0]['id'] == m['id'], 'exact label'
+    assert search_materials(label.upper(), 5)[0]['id'] == m['id'], 'exact label, other case'
+    assert search_materials(m['Material'], 5)[0]['id'] == m['id'], 'exact Material'
+    # the prefix hits come first, as many as there are (up to the limit); substring hits may follow
+    prefix = m['Material'][:3]
+    nPrefix = min(25, sum(x['Material'].startswith(prefix) for x in data['matls']))
+    res = search_materials(prefix, 25)
+    hits = [r['Material_org'] for r in res[:nPrefix]]
+    assert len(hits) == nPrefix and all(h.startswith(prefix) for h in hits), 'Material prefix'
+    assert not any(r['Material_org'].startswith(prefix) for r in res[nPrefix:]), 'Material prefix, all of them'
+    assert hits == sorted(hits), 'Material prefix order'
+    p = data['mfrpns'][0]
+    assert search_materials(p['MfrPN'], 5)[0]['id'] == p['Material_id'], 'MfrPN'
+    desc = data['matls'][7]['Description']
+    assert any(r['id'] == data['matls'][7]['id'] for r in search_materials(desc, 200)), 'Description'
+    assert search_materials('no such thing', 5) == [], 'no match'
+
+def timed_queries(queries:list[str]) -> list[float]:
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search_materials(q)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def report(kind:str, times:list[float]):
+    ms = sorted(t * 1000 for t in times)
+    p95 = ms[min(len(ms)-1, int(len(ms) * 0.95))]
+    print(f'  {kind:<22} n={len(ms):4d}  p50 {statistics.median(ms):7.3f} ms  p95 {p95:7.3f} ms  max {ms[-1]:7.3f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matls', type=int, default=100000)
+    parser.add_argument('--orgs', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=200, help='queries of each kind')
+    args = parser.parse_args()
+
+    dbName = os.path.join(tempfile.mkdtemp(prefix='wics_bench_'), 'matlsearch.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    flskapp.config['MATLCHOICE_RECHECK_SECS'] = 3600     # no signature checks mid-benchmark
+    app_db.init_app(flskapp)
+
+    rnd = random.Random(2)
+    with flskapp.app_context():
+        data = build_db(args.matls, args.orgs)
+        print(f"{len(data['matls'])} materials, {len(data['mfrpns'])} MfrPNs, {len(data['orgs'])} orgs")
+
+        t0 = time.perf_counter()
+        search_materials('x')
+        print(f'index build (first search): {(time.perf_counter() - t0)*1000:.1f} ms')
+        check_results(data)
+        print('results check: ok')
+
+        orgname = {o['id']: o['orgname'] for o in data['orgs']}
+        sample = rnd.sample(data['matls'], args.queries)
+        kinds = {
+            'Material prefix (3)': [m['Material'][:3] for m in sample],
+            'Material prefix (6)': [m['Material'][:6] for m in sample],
+            'exact label': [f"{m['Material']}:{orgname[m['org_id']]}" for m in sample],
+            'MfrPN prefix': [p['MfrPN'][:8] for p in rnd.sample(data['mfrpns'], args.queries)],
+            'Description word': [rnd.choice(WORDS) for _ in range(args.queries)],
+            'Description rare': [m['Description'] for m in sample],
+            'no match': [f'zz{rnd.randint(0, 10**6)}' for _ in range(args.queries)],
+            }
+        print(f'searches ({args.matls} materials):')
+        for kind, queries in kinds.items():
+            report(kind, timed_queries(queries))
+
+        # incremental: change one material through the ORM; the next search patches it in
+        after_change, after_that = [], []
+        for m in rnd.sample(data['matls'], 20):
+            rec = app_db.session.get(MaterialList, m['id'])
+            rec.Description = rec.Description + ' revised'
+            app_db.session.commit()
+            after_change += timed_queries(['revised'])
+            after_that += timed_queries(['revised'])
+        # endfor m
+        report('1st after a change', after_change)
+        report('2nd after a change', after_that)
+        assert _matlsearch_index._built
+
+        # a bulk UPDATE can't say which materials changed - the whole index is rebuilt
+        app_db.session.execute(update(MaterialList).where(MaterialList.id <= 10).values(Notes='bulk'))
+        app_db.session.commit()
+        report('after a bulk UPDATE', timed_queries(['revised']))
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
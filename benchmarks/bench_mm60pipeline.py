@@ -0,0 +1,213 @@
+"""
+Benchmark: the whole MM60 Material List update (views.Material.updtMatlList 01ReadSpreadsheet ..
+04Add) on SQLite, now that 02..04 are SQLAlchemy Core instead of MySQL-only SQL.
+
+    python -m benchmarks.bench_mm60pipeline
+    python -m benchmarks.bench_mm60pipeline --rows 100000 --xlsx --no-remove
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_sapplants_org, WICS_materiallist and
+the tables 02 keeps Materials for) and a synthetic MM60 sheet: most rows are Materials WICS has,
+some with a new Description or Price, the rest are new.  Some WICS Materials aren't on the sheet;
+a few of those have counts, so only the others go.  proc_MatlListSAPSprsheet_Validate's forecast
+is taken first, then each phase is timed, and what it wrote is checked against the forecast
+(and another update's staging rows are checked to come through untouched).  A routine refresh
+follows: the same sheet with --changes rows changed, of which only those should be staged.
+"""
+import argparse, csv, datetime, os, random, tempfile, time, uuid
+
+from flask import Flask
+from openpyxl import Workbook
+from sqlalchemy import event, select, func
+
+from database import app_db
+from models import (
+    Organizations, SAPPlants_org, MaterialList, tmpMaterialListUpdate, MaterialListChangeLog, MM60UpdateLedger,
+    ActualCounts, CountSchedule, SAP_SOHRecs, async_comm,
+    )
+from views.Material.updtMatlList import (
+    proc_MatlListSAPSprsheet_00InitUMLasync_comm,
+    proc_MatlListSAPSprsheet_01ReadSpreadsheet,
+    proc_MatlListSAPSprsheet_02_identifyexistingMaterial,
+    proc_MatlListSAPSprsheet_03_UpdateExistingRecs,
+    proc_MatlListSAPSprsheet_04_Remove,
+    proc_MatlListSAPSprsheet_04_Add,
+    proc_MatlListSAPSprsheet_99_Cleanup,
+    proc_MatlListSAPSprsheet_99_PurgeAbandoned,
+    proc_MatlListSAPSprsheet_Validate,
+    )
+
+from benchmarks._sqlite import create_tables
+
+
+MM60_header = ['Plant', 'Material', 'Material description', 'Material type', 'Matl Group',
+    'Manufact.', 'MPN', 'ABC', 'Price', 'per', 'Currency']
+Plants = {'1000': 1, '1100': 2, '2000': 3}
+
+def synthetic_matl(n:int, rnd:random.Random) -> dict:
+    Plant = rnd.choice(list(Plants))
+    return {'Plant': Plant, 'org_id': Plants[Plant], 'Material': f'{100000 + n:08d}',
+        'Description': f'material {n} {rnd.choice(["BOLT", "NUT", "PANEL", "CABLE", "LABEL"])}',
+        'SAPMaterialType': rnd.choice(['ROH', 'HALB', 'FERT']), 'SAPMaterialGroup': f'MG{rnd.randint(1, 40):03d}',
+        'SAPManuf': 'ACME', 'SAPMPN': f'MPN-{n}', 'SAPABC': rnd.choice(['A', 'B', 'C']),
+        'Price': round(rnd.uniform(0.01, 2500), 2), 'PriceUnit': rnd.choice([1, 10, 100]), 'Currency': 'USD'}
+
+def build_db(nRows:int, seed:int = 1) -> list[dict]:
+    """the WICS side: 80% of the sheet's Materials, plus 5% that aren't on it (a fifth of those counted); returns the sheet's rows"""
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, SAPPlants_org, MaterialList, tmpMaterialListUpdate, MaterialListChangeLog, MM60UpdateLedger,
+        ActualCounts, CountSchedule, SAP_SOHRecs)
+    async_comm.__table__.drop(app_db.engine, checkfirst=True)
+    async_comm.__table__.create(app_db.engine)
+    app_db.session.execute(Organizations.__table__.insert(), [{'id': o, 'orgname': f'ORG{o}'} for o in sorted(set(Plants.values()))])
+    app_db.session.execute(SAPPlants_org.__table__.insert(), [{'SAPPlant': p, 'org_id': o} for p, o in Plants.items()])
+
+    sheet, matls, counts = [], [], []
+    for n in range(nRows + nRows // 20):
+        m = synthetic_matl(n, rnd)
+        onSheet, inWICS = n < nRows, n < nRows * 4 // 5 or n >= nRows
+        if inWICS:
+            matls.append({**m, 'id': len(matls) + 1})
+            if not onSheet and rnd.random() < 0.2:
+                counts.append({'CountDate': datetime.date(2026, 9, 30), 'Material_id': len(matls), 'CycCtID': '', 'Counter': 'AB',
+                    'LocationOnly': 0, 'CTD_QTY_Expr': '1', 'LOCATION': 'L1', 'FLAG_PossiblyNotRecieved': 0, 'FLAG_MovementDuringCount': 0})
+        if onSheet:
+            r = rnd.random()
+            if inWICS and r < 0.05:
+                m = {**m, 'Description': m['Description'] + ' rev B'}
+            elif inWICS and r < 0.08:
+                m = {**m, 'Price': round(m['Price'] + 1, 2)}
+            sheet.append(m)
+    # endfor n
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    if counts:
+        app_db.session.execute(ActualCounts.__table__.insert(), counts)
+    app_db.session.commit()
+    rnd.shuffle(sheet)
+    return sheet
+# build_db
+
+def sheet_rows(sheet:list[dict]):
+    for m in sheet:
+        yield [m['Plant'], m['Material'], m['Description'], m['SAPMaterialType'], m['SAPMaterialGroup'],
+            m['SAPManuf'], m['SAPMPN'], m['SAPABC'], m['Price'], m['PriceUnit'], m['Currency']]
+
+def write_sheet(fName:str, sheet:list[dict]):
+    if fName.endswith('.csv'):
+        with open(fName, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(MM60_header)
+            w.writerows(sheet_rows(sheet))
+    else:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Sheet1')
+        ws.append(MM60_header)
+        for row in sheet_rows(sheet):
+            ws.append(row)
+        wb.save(fName)
+
+def count(model, *where) -> int:
+    return app_db.session.scalar(select(func.count()).select_from(model).where(*where))
+
+def run_update(fName:str, sheet:list[dict], remove:bool, timer) -> str:
+    """one whole MM60 update of fName, phase by phase (timed), checked against the validator's forecast; returns its reqid"""
+    UpdateExistFldList = ['Description', 'SAPPrice']
+    nMatlsBefore = count(MaterialList)
+    reqid = str(uuid.uuid4())
+    proc_MatlListSAPSprsheet_00InitUMLasync_comm(reqid, UpdateExistFldList, remove)
+
+    t0 = time.perf_counter()
+    forecast = proc_MatlListSAPSprsheet_Validate(reqid, fName, UpdateExistFldList, remove, cleanup_file=False)['counts']
+    print(f'  {"validate":<12} {(time.perf_counter() - t0)*1000:9.1f} ms  {forecast}')
+    assert forecast['errors'] == 0, forecast
+
+    phases = [
+        ('01 read', lambda: proc_MatlListSAPSprsheet_01ReadSpreadsheet(reqid, fName, cleanup_file=False)),
+        ('02 identify', lambda: proc_MatlListSAPSprsheet_02_identifyexistingMaterial(reqid)),
+        ('03 update', lambda: proc_MatlListSAPSprsheet_03_UpdateExistingRecs(reqid)),
+        ('04 remove', lambda: proc_MatlListSAPSprsheet_04_Remove(reqid)),
+        ('04 add', lambda: proc_MatlListSAPSprsheet_04_Add(reqid)),
+        ]
+    tTotal = 0.0
+    for phase, proc in phases:
+        elapsed, stmts = timer(proc)
+        tTotal += elapsed
+        print(f'  {phase:<12} {elapsed*1000:9.1f} ms  {stmts:5d} statements')
+        if phase == '01 read':
+            print(f'  {"":<12} {count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == reqid):9d} rows staged')
+        elif phase == '02 identify':
+            assert count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == reqid, tmpMaterialListUpdate.recStatus == 'ADD') == forecast['inserts']
+            assert count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == reqid, tmpMaterialListUpdate.recStatus.like('DEL%')) == forecast['deletes']
+        elif phase == '03 update':
+            assert count(MaterialListChangeLog, MaterialListChangeLog.reqid == reqid) == forecast['updates']
+    # endfor phase
+    print(f'  {"total":<12} {tTotal*1000:9.1f} ms')
+
+    assert count(MaterialList) == nMatlsBefore - forecast['deletes'] + forecast['inserts']
+    assert count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == reqid, tmpMaterialListUpdate.MaterialLink_id.is_(None), tmpMaterialListUpdate.recStatus == 'ADD') == 0
+    # every sheet row is now in WICS as the sheet has it
+    inWICS = {(m.org_id, m.Material): (m.Description, float(m.Price)) for m in app_db.session.execute(
+        select(MaterialList.org_id, MaterialList.Material, MaterialList.Description, MaterialList.Price))}
+    assert all(inWICS[(m['org_id'], m['Material'])] == (m['Description'], m['Price']) for m in sheet)
+    print('  results check: ok')
+    return reqid
+# run_update
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--changes', type=int, default=300, help='rows changed for the routine refresh that follows the first update')
+    parser.add_argument('--xlsx', action='store_true', help='an .xlsx sheet rather than a CSV (writing it takes a while)')
+    parser.add_argument('--no-remove', dest='remove', action='store_false', help="don't remove Materials missing from the sheet")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'mm60pipeline.sqlite')
+    fName = os.path.join(tmpdir, 'mm60.xlsx' if args.xlsx else 'mm60.csv')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    nStmts = 0
+    with flskapp.app_context():
+        @event.listens_for(app_db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            nonlocal nStmts
+            nStmts += 1
+        def timer(proc):
+            nonlocal nStmts
+            nStmts = 0
+            t0 = time.perf_counter()
+            proc()
+            return time.perf_counter() - t0, nStmts
+
+        sheet = build_db(args.rows)
+        write_sheet(fName, sheet)
+        print(f'{len(sheet)} sheet rows ({os.path.basename(fName)}), {count(MaterialList)} WICS materials')
+
+        # another update's staging rows, abandoned part way: this one must leave them alone, the janitor mustn't
+        otherreqid = str(uuid.uuid4())
+        app_db.session.execute(tmpMaterialListUpdate.__table__.insert(),
+            [{'reqid': otherreqid, 'recStatus': 'ADD', 'org_id': 1, 'Material': m['Material'], 'Description': 'other update'} for m in sheet[:100]])
+        app_db.session.commit()
+
+        print('first update:')
+        reqid = run_update(fName, sheet, args.remove, timer)
+        proc_MatlListSAPSprsheet_99_Cleanup(reqid)
+        assert count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == otherreqid) == 100
+        assert proc_MatlListSAPSprsheet_99_PurgeAbandoned() == [otherreqid] and count(tmpMaterialListUpdate) == 0
+
+        # a routine refresh: the same sheet but for a few changed rows; only those are staged
+        rnd = random.Random(3)
+        changed = rnd.sample(range(len(sheet)), min(args.changes, len(sheet)))
+        for n in changed:
+            sheet[n] = {**sheet[n], 'Description': sheet[n]['Description'] + ' (refreshed)'}
+        write_sheet(fName, sheet)
+        print(f'routine refresh ({len(changed)} rows changed):')
+        reqid = run_update(fName, sheet, False, timer)
+        assert count(tmpMaterialListUpdate, tmpMaterialListUpdate.reqid == reqid) == len(changed)
+        proc_MatlListSAPSprsheet_99_Cleanup(reqid)
+    os.remove(fName)
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
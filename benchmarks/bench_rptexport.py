@@ -0,0 +1,119 @@
+"""
+Benchmark: report spreadsheets through procs.rptexport (openpyxl write-only / streamed csv, from a row
+generator, cached in SAP_FILELOC/tmpdl) against the way the Count Summary built its spreadsheet on
+every view - a list of dicts, written through a regular openpyxl Workbook (as Excelfile_fromqs does).
+
+    python -m benchmarks.bench_rptexport
+    python -m benchmarks.bench_rptexport --rows 200000
+
+The rows are synthetic Count Summary lines (CountSummaryExportFields).  Times and peak Python memory
+(tracemalloc - the times include its overhead) for each way, and for sending a cached export.  The xlsx and csv are read back and checked
+against the rows; then the TTL (a stale file is rebuilt, and purged) and a csv download abandoned half
+way (no partial file is left, and nothing is cached) are checked.
+"""
+import argparse, csv, io, math, os, random, tempfile, time, tracemalloc
+
+from flask import Flask
+from openpyxl import Workbook, load_workbook
+
+from procs.rptexport import fnReportExport, purge_report_exports, report_export_dir, report_export_name
+from views.ActualCounts.rptCountSummary import CountSummaryExportFields
+
+
+def gen_rows(nRows:int, seed:int = 1):
+    rnd = random.Random(seed)
+    for n in range(nRows):
+        counted, sap = rnd.randint(0, 5000), rnd.randint(0, 5000)
+        yield [f'ORG{n % 3 + 1}', f'{100000 + n:08d}', rnd.choice(['ROH', 'HALB', 'FERT']), f'material {n}',
+            counted, sap, counted - sap, min(counted, sap) / max(counted, sap, 1) * 100, 'counter A, counter B']
+
+def old_xlsx(nRows:int, fName:str) -> None:
+    """the whole report as a list of dicts, then a regular Workbook, cell by cell"""
+    qdict = [dict(zip(CountSummaryExportFields, row)) for row in gen_rows(nRows)]
+    wb = Workbook()
+    ws = wb.active
+    ws.append(list(CountSummaryExportFields))
+    for rec in qdict:
+        ws.append(list(rec.values()))
+    wb.save(fName)
+
+def body(resp) -> bytes:
+    """the whole body of a download Response - sent file or stream"""
+    resp.direct_passthrough = False
+    data = resp.get_data()
+    resp.close()
+    return data
+
+def measure(fn, *args):
+    """(result, seconds, peak MB)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    flskapp = Flask(__name__)
+    flskapp.config['SAP_FILELOC'] = tmpdir
+    flskapp.config['RPTEXPORT_TTL_SECS'] = 600
+    header = CountSummaryExportFields
+    key = ('2026-10-01', None, 'SAP 2026-10-01')
+    rows_fn = lambda: gen_rows(args.rows)
+
+    with flskapp.test_request_context():
+        svdir = report_export_dir()
+        _, tOld, mOld = measure(old_xlsx, args.rows, os.path.join(tmpdir, 'old.xlsx'))
+        xlsx, tXlsx, mXlsx = measure(lambda: body(fnReportExport('CountSummary', key, header, rows_fn, 'xlsx')))
+        cachedX, tCachedX, mCachedX = measure(lambda: body(fnReportExport('CountSummary', key, header, rows_fn, 'xlsx')))
+        csvData, tCsv, mCsv = measure(lambda: body(fnReportExport('CountSummary', key, header, rows_fn, 'csv')))
+        cachedC, tCachedC, mCachedC = measure(lambda: body(fnReportExport('CountSummary', key, header, rows_fn, 'csv')))
+
+        # results check: both formats hold the rows, and the cached files are the same files
+        want = [list(header), *gen_rows(args.rows)]
+        wb = load_workbook(io.BytesIO(xlsx), read_only=True)
+        # the floats are written to 16 digits
+        same = lambda a, b: a == b or (isinstance(b, float) and math.isclose(a, b, rel_tol=1e-14))
+        got = list(wb.active.iter_rows(values_only=True))
+        assert len(got) == len(want)
+        assert all(len(g) == len(w) and all(map(same, g, w)) for g, w in zip(got, want))
+        wb.close()
+        got = list(csv.reader(io.StringIO(csvData.decode('utf-8-sig'))))
+        assert got == [[str(v) for v in row] for row in want]
+        assert cachedX == xlsx and cachedC == csvData
+        print(f'{args.rows} rows; results check: ok')
+
+        for kind, elapsed, peak in (('old: list + Workbook', tOld, mOld),
+                ('xlsx, write-only', tXlsx, mXlsx), ('xlsx, cached', tCachedX, mCachedX),
+                ('csv, streamed', tCsv, mCsv), ('csv, cached', tCachedC, mCachedC)):
+            print(f'  {kind:<22} {elapsed * 1000:8.0f} ms   peak {peak:7.1f} MB')
+
+        # a stale file is rebuilt (and the rows read again), and purged when nobody asks for it
+        fName = os.path.join(svdir, report_export_name('CountSummary', key, 'xlsx'))
+        stale = time.time() - 601
+        os.utime(fName, (stale, stale))
+        nCalls = []
+        body(fnReportExport('CountSummary', key, header, lambda: (nCalls.append(1), gen_rows(10))[1], 'xlsx'))
+        assert nCalls and os.stat(fName).st_mtime > stale
+        os.utime(fName, (stale, stale))
+        assert purge_report_exports() >= 1 and not os.path.exists(fName)
+
+        # a csv download abandoned half way leaves nothing behind
+        for f in os.listdir(svdir):
+            os.remove(os.path.join(svdir, f))
+        resp = fnReportExport('CountSummary', ('2026-10-02',), header, rows_fn, 'csv')
+        stream = iter(resp.response)
+        next(stream)
+        resp.close()
+        assert os.listdir(svdir) == [], os.listdir(svdir)
+        print('  TTL, purge, abandoned download: ok')
+    # endwith test_request_context
+
+if __name__ == '__main__':
+    main()
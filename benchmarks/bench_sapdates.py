@@ -0,0 +1,111 @@
+"""
+Latency benchmark: procs.sapdates (the cached SAP snapshot dates behind nearestSAPDate and fnSAPExists)
+against the ORDER BY ... LIMIT 1 queries nearestSAPDate ran before.
+
+    python -m benchmarks.bench_sapdates
+    python -m benchmarks.bench_sapdates --days 2000 --lookups 20000
+
+Builds a synthetic SQLite database (WICS_sap_sohsnapshots) with --days snapshots, a few days apart,
+checks nearestSAPDate and fnSAPExists against the queries for random dates (before, between, on and
+after the snapshots), then times both.  Then it checks the cache is dropped when a snapshot is
+committed in this process, and picked up (after SAPDATES_RECHECK_SECS) when another connection adds one.
+"""
+import argparse, datetime, os, random, statistics, tempfile, time
+
+from flask import Flask
+from sqlalchemy import select
+
+from database import app_db
+from models import SAP_SOHSnapshot
+from views.SAP.procs_SAP import nearestSAPDate, fnSAPExists
+
+from benchmarks._sqlite import create_tables
+
+
+FirstDate = datetime.date(2020, 1, 6)
+
+def build_db(nDays:int, seed:int = 1) -> list[datetime.date]:
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, SAP_SOHSnapshot)
+    dates, D = [], FirstDate
+    for _ in range(nDays):
+        dates.append(D)
+        D += datetime.timedelta(days=rnd.choice((1, 1, 2, 3, 7)))
+    app_db.session.execute(SAP_SOHSnapshot.__table__.insert(),
+        [{'uploaded_at': D, 'nRows': 1000, 'nRowsNew': 10, 'LoadedAt': datetime.datetime(2026, 1, 1)} for D in dates])
+    app_db.session.commit()
+    return dates
+
+def query_nearest(for_date:datetime.date) -> datetime.date|None:
+    """nearestSAPDate as it was: one query, and another if for_date is before every snapshot"""
+    stmt = select(SAP_SOHSnapshot.uploaded_at).where(SAP_SOHSnapshot.uploaded_at <= for_date).order_by(SAP_SOHSnapshot.uploaded_at.desc()).limit(1)
+    nearest_date = app_db.session.execute(stmt).scalar_one_or_none()
+    if nearest_date is None:
+        stmt_earliest = select(SAP_SOHSnapshot.uploaded_at).order_by(SAP_SOHSnapshot.uploaded_at.asc()).limit(1)
+        nearest_date = app_db.session.execute(stmt_earliest).scalar_one_or_none()
+    return nearest_date
+
+def query_exists(for_date:datetime.date) -> bool:
+    return query_nearest(for_date) == for_date
+
+def timed(fn, lookups:list[datetime.date]) -> list[float]:
+    times = []
+    for D in lookups:
+        t0 = time.perf_counter()
+        fn(D)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def report(kind:str, times:list[float]):
+    us = sorted(t * 1e6 for t in times)
+    p95 = us[min(len(us)-1, int(len(us) * 0.95))]
+    print(f'  {kind:<24} n={len(us):6d}  p50 {statistics.median(us):8.1f} us  p95 {p95:8.1f} us')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=500)
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'sapdates.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    flskapp.config['SAPDATES_RECHECK_SECS'] = 0.5
+    app_db.init_app(flskapp)
+
+    with flskapp.app_context():
+        dates = build_db(args.days)
+        rnd = random.Random(2)
+        span = (dates[-1] - dates[0]).days + 60
+        lookups = [dates[0] + datetime.timedelta(days=rnd.randint(-30, span)) for _ in range(args.lookups)]
+        for D in lookups[:1000] + dates[:50]:
+            assert nearestSAPDate(D) == query_nearest(D), D
+            assert fnSAPExists(D) == query_exists(D), D
+        print(f'{len(dates)} SAP snapshots, {dates[0]} .. {dates[-1]}; results check: ok')
+
+        report('nearest: query', timed(query_nearest, lookups))
+        report('nearest: cached', timed(nearestSAPDate, lookups))
+        report('exists: query', timed(query_exists, lookups))
+        report('exists: cached', timed(fnSAPExists, lookups))
+
+        # a snapshot committed here is seen at once
+        newDate = dates[-1] + datetime.timedelta(days=1)
+        assert nearestSAPDate(newDate) == dates[-1]
+        app_db.session.add(SAP_SOHSnapshot(uploaded_at=newDate, nRows=1, nRowsNew=1, LoadedAt=datetime.datetime.now()))
+        app_db.session.commit()
+        assert nearestSAPDate(newDate) == newDate and fnSAPExists(newDate)
+
+        # one committed by another process is seen once the recheck interval is up
+        otherDate = dates[0] - datetime.timedelta(days=5)
+        with app_db.engine.begin() as conn:
+            conn.execute(SAP_SOHSnapshot.__table__.insert(), {'uploaded_at': otherDate, 'nRows': 1, 'nRowsNew': 1, 'LoadedAt': datetime.datetime.now()})
+        t0 = time.perf_counter()
+        while not fnSAPExists(otherDate):
+            assert time.perf_counter() - t0 < 5, 'snapshot from another connection not seen'
+            time.sleep(0.05)
+        print(f'  invalidation: ok (commit here: at once; another connection: {time.perf_counter() - t0:.2f} s)')
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
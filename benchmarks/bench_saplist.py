@@ -0,0 +1,112 @@
+"""
+Benchmark: fnSAPList's SAP_SOHRecs entities against its column projection (fields=SAP_QTY_FIELDS)
+and the fnSAPListIter stream, for a whole snapshot - time and peak Python memory.
+
+    python -m benchmarks.bench_saplist
+    python -m benchmarks.bench_saplist --matls 60000 --chunksize 5000
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_unitsofmeasure,
+WICS_sap_sohrecs, WICS_sap_sohsnapshots, WICS_sap_sohtotals) with one SAP snapshot, then for each
+mode builds what the Count Summary does with it (fnSAPByMaterial: each Material's lines and total),
+except the stream, which keeps only the totals.  The modes are checked to agree line for line and
+total for total.
+"""
+import argparse, datetime, os, random, tempfile, time, tracemalloc
+
+from flask import Flask
+
+from database import app_db
+from models import Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals
+from procs.sohsnapshot import SOH_datflds, store_SOH_snapshot
+from views.SAP.procs_SAP import fnSAPList, fnSAPListIter, SAP_QTY_FIELDS
+
+from benchmarks._sqlite import create_tables
+
+
+Plants = {'1000': 1, '1100': 2, '2000': 3}
+UOMs = {'EA': 1, 'BOX': 12}
+SAPDate = datetime.date(2026, 10, 1)
+
+def build_db(nMatls:int, seed:int = 1):
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals)
+    app_db.session.execute(Organizations.__table__.insert(), [{'id': o, 'orgname': f'ORG{o}'} for o in sorted(set(Plants.values()))])
+    app_db.session.execute(UnitsOfMeasure.__table__.insert(),
+        [{'UOM': UOM, 'UOMText': UOM.lower(), 'DimensionText': 'count', 'Multiplier1': mult} for UOM, mult in UOMs.items()])
+    matls, lines = [], []
+    for mid in range(1, nMatls+1):
+        Plant = rnd.choice(list(Plants))
+        m = {'id': mid, 'org_id': Plants[Plant], 'Plant': Plant, 'Material': f'{100000 + mid:08d}',
+            'Description': f'material {mid}', 'TypicalContainerQty': '', 'TypicalPalletQty': '', 'Notes': ''}
+        matls.append(m)
+        for sloc in rnd.sample(['0001', '0002', '0003', 'QC01', 'SHIP'], rnd.randint(1, 3)):
+            qty = rnd.randint(0, 5000)
+            lines.append([{'org_id': m['org_id'], 'Material_id': mid, 'MaterialPartNum': m['Material'], 'Description': m['Description'],
+                'Plant': Plant, 'MaterialType': 'ROH', 'StorageLocation': sloc, 'BaseUnitofMeasure': rnd.choice(['EA', 'EA', 'BOX', 'KG']),
+                'Currency': 'USD', 'SpecialStock': '', 'Batch': '', 'Vendor': '', 'Amount': qty,
+                'ValueUnrestricted': round(qty * 1.25, 2), 'Blocked': 0, 'ValueBlocked': 0}[fld] for fld in SOH_datflds])
+    # endfor mid
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    store_SOH_snapshot(SAPDate, SOH_datflds, lines)
+    app_db.session.commit()
+    return len(lines)
+
+def entities():
+    return fnSAPList(SAPDate, byMaterial=True)['SAPByMaterial']
+
+def projection():
+    return fnSAPList(SAPDate, byMaterial=True, fields=SAP_QTY_FIELDS)['SAPByMaterial']
+
+def stream(chunkSize:int):
+    totals:dict[int, float] = {}
+    for row in fnSAPListIter(SAPDate, chunkSize=chunkSize):
+        totals[row.Material_id] = totals.get(row.Material_id, 0) + (row.Amount or 0) * (row.mult if row.mult is not None else 1)
+    return totals
+
+def measure(fn, *args):
+    """(result, seconds, peak MB) - the session's identity map is emptied first"""
+    app_db.session.expunge_all()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matls', type=int, default=40000)
+    parser.add_argument('--chunksize', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'saplist.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    with flskapp.app_context():
+        nLines = build_db(args.matls)
+        print(f'{args.matls} materials, {nLines} SAP lines on {SAPDate}')
+
+        byEntity, tEnt, mEnt = measure(entities)
+        entRows = {mid: [(r.Material_id, r.MaterialPartNum, r.StorageLocation, r.Amount, r.BaseUnitofMeasure, r.mult) for r in v['SAPRows']]
+            for mid, v in byEntity.items()}
+        entTotals = {mid: v['SAPTotal'] for mid, v in byEntity.items()}
+        del byEntity
+        byProj, tProj, mProj = measure(projection)
+        assert {mid: [tuple(r) for r in v['SAPRows']] for mid, v in byProj.items()} == entRows
+        assert {mid: v['SAPTotal'] for mid, v in byProj.items()} == entTotals
+        del byProj
+        streamed, tStream, mStream = measure(stream, args.chunksize)
+        assert streamed == entTotals
+        print('  results check: ok')
+
+        for kind, elapsed, peak in (('entities', tEnt, mEnt), (f'fields={len(SAP_QTY_FIELDS)} columns', tProj, mProj),
+                                    ('stream, totals only', tStream, mStream)):
+            print(f'  {kind:<22} {elapsed * 1000:8.0f} ms   peak {peak:7.1f} MB')
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
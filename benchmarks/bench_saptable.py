@@ -0,0 +1,179 @@
+"""
+Benchmark: the SAP table screen - the whole snapshot rendered into SAP/show_SAP_table.html (as
+fnShowSAP did) against procs.saptable's keyset pages of JSON (fnSAPTable_json).
+
+    python -m benchmarks.bench_saptable
+    python -m benchmarks.bench_saptable --matls 40000 --pagesize 200 --repeat 1
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_unitsofmeasure,
+WICS_sap_sohrecs, WICS_sap_sohsnapshots, WICS_sap_sohtotals) with two SAP snapshots stored through
+procs.sohsnapshot.  Times fnSAPList plus rendering its rows the way the old template did, and the
+first page, a page deep in the table and a walk through every page.  Every sort, both ways, and a
+few filters are walked page by page and checked against the same lines sorted in Python.
+"""
+import argparse, datetime, json, os, random, statistics, tempfile, time
+
+from flask import Flask
+from jinja2 import Template
+
+from database import app_db
+from models import Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals
+from procs.sohsnapshot import SOH_datflds, store_SOH_snapshot
+from procs.saptable import fnSAPTablePage, SAPTABLE_SORTS
+from views.SAP.procs_SAP import fnSAPList
+
+from benchmarks._sqlite import create_tables
+
+
+Plants = {'1000': 1, '1100': 2, '2000': 3}
+SLocs = ['0001', '0002', '0003', 'QC01', 'SHIP']
+SAPDates = (datetime.date(2026, 9, 1), datetime.date(2026, 10, 1))
+
+# the old show_SAP_table.html's row loop
+old_rows_tmpl = Template("""
+    {% for SAProw in SAPSet %}
+    <li>
+        {{ SAProw.Material.org.orgname }}
+        {{ SAProw.Material.Material }} |
+        {{ SAProw.Description }} |
+        {{ SAProw.StorageLocation }} |
+        {{ SAProw.Amount|round(3) }}  {{ SAProw.BaseUnitofMeasure }} |
+        {{ SAProw.Currency }} {{ SAProw.ValueUnrestricted|round(2) }} |
+        {{ SAProw.SpecialStock }} |
+        {{ SAProw.Batch }} |
+        {{ SAProw.Vendor }}
+        |&#x26AB|   <!-- big round separator ball -->
+        {{ SAProw.Blocked|round(3) }}  {{ SAProw.BaseUnitofMeasure }} |
+        {{ SAProw.Currency }} {{ SAProw.ValueBlocked|round(2) }} |
+    </li>
+    {% if loop.index is divisibleby 5 %}<hr>{% endif %}
+    {% endfor %}
+""")
+
+def build_db(nMatls:int, seed:int = 1) -> list[dict]:
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals)
+    app_db.session.execute(Organizations.__table__.insert(), [{'id': o, 'orgname': f'ORG{o}'} for o in sorted(set(Plants.values()))])
+    app_db.session.execute(UnitsOfMeasure.__table__.insert(), [{'UOM': 'EA', 'UOMText': 'each', 'DimensionText': 'count', 'Multiplier1': 1}])
+    matls = []
+    for mid in range(1, nMatls+1):
+        Plant = rnd.choice(list(Plants))
+        matls.append({'id': mid, 'org_id': Plants[Plant], 'Plant': Plant, 'Material': f'{rnd.randint(100000, 999999)}-{mid:06d}',
+            'Description': f'material {mid}', 'TypicalContainerQty': '', 'TypicalPalletQty': '', 'Notes': ''})
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+
+    lines = []
+    for m in matls:
+        for sloc in rnd.sample(SLocs, rnd.randint(1, 3)):
+            qty = rnd.randint(0, 5000)
+            lines.append({'org_id': m['org_id'], 'Material_id': m['id'], 'MaterialPartNum': m['Material'],
+                'Description': '' if rnd.random() < 0.02 else m['Description'],
+                'Plant': m['Plant'], 'MaterialType': 'ROH', 'StorageLocation': sloc, 'BaseUnitofMeasure': 'EA', 'Currency': 'USD',
+                'SpecialStock': '', 'Batch': '', 'Vendor': '', 'Amount': qty, 'ValueUnrestricted': round(qty * 1.25, 2),
+                'Blocked': rnd.choice([0, 0, 0, 5]), 'ValueBlocked': 0})
+    # endfor m
+    for SAPDate in SAPDates:
+        store_SOH_snapshot(SAPDate, SOH_datflds, [[line[fld] for fld in SOH_datflds] for line in lines])
+        app_db.session.commit()
+        for line in rnd.sample(lines, len(lines) // 50):
+            line['Amount'] = rnd.randint(0, 5000)
+    # endfor SAPDate
+    return matls
+
+def walk(SAPDate:datetime.date, pagesize:int, **kw) -> tuple[list[int], list[float], int]:
+    """every page, in order: (line ids, seconds per page, nRows the first page gave)"""
+    ids, times, after, nRows = [], [], None, None
+    while True:
+        t0 = time.perf_counter()
+        page = fnSAPTablePage(SAPDate, after=after, limit=pagesize, **kw)
+        times.append(time.perf_counter() - t0)
+        if nRows is None:
+            nRows = page['nRows']
+        ids.extend(r['id'] for r in page['rows'])
+        after = page['next']
+        if after is None:
+            return ids, times, nRows
+
+def expected_ids(SAPTable, sort:str, descending:bool, material=None, plant=None, storageloc=None) -> list[int]:
+    """the lines fnSAPList gave, filtered and sorted in Python"""
+    keyfns = {
+        'material': lambda r: (r.Material.org_id, r.Material.Material, r.StorageLocation or ''),
+        'description': lambda r: (r.Description or '', r.Material.Material, r.StorageLocation or ''),
+        'plant': lambda r: (r.Plant or '', r.Material.Material, r.StorageLocation or ''),
+        'storageloc': lambda r: (r.StorageLocation or '', r.Material.org_id, r.Material.Material),
+        'amount': lambda r: (float(r.Amount or 0),),
+        'value': lambda r: (float(r.ValueUnrestricted or 0),),
+        'blocked': lambda r: (float(r.Blocked or 0),),
+    }
+    assert keyfns.keys() == SAPTABLE_SORTS.keys()
+    rows = [r for r in SAPTable
+        if (not material or r.Material.Material.startswith(material))
+        and (not plant or r.Plant == plant) and (not storageloc or r.StorageLocation == storageloc)]
+    rows.sort(key=lambda r: (*keyfns[sort](r), r.id), reverse=descending)
+    return [r.id for r in rows]
+
+def report(kind:str, times:list[float], nBytes:int|None = None):
+    ms = sorted(t * 1000 for t in times)
+    p95 = ms[min(len(ms)-1, int(len(ms) * 0.95))]
+    size = f'  {nBytes / 2**10:9,.0f} KB' if nBytes is not None else ''
+    print(f'  {kind:<28} n={len(ms):4d}  p50 {statistics.median(ms):8.1f} ms  p95 {p95:8.1f} ms{size}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matls', type=int, default=20000)
+    parser.add_argument('--pagesize', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'saptable.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    with flskapp.app_context():
+        t0 = time.perf_counter()
+        matls = build_db(args.matls)
+        SAPDate = SAPDates[-1]
+        SAPTable = fnSAPList(for_date=SAPDate)['SAPTable']
+        print(f'{len(matls)} materials, {len(SAPTable)} SAP lines on {SAPDate}; built in {time.perf_counter() - t0:.1f} s')
+
+        # every sort, both ways, and some filters, page by page
+        m = matls[len(matls) // 3]
+        checks = [dict(sort=sort, descending=desc) for sort in SAPTABLE_SORTS for desc in (False, True)]
+        checks += [dict(sort='material', descending=False, material=m['Material'][:2]),
+            dict(sort='amount', descending=True, plant='1100', storageloc='QC01'),
+            dict(sort='material', descending=False, material=m['Material'])]
+        for kw in checks:
+            ids, _, nRows = walk(SAPDate, args.pagesize, **kw)
+            want = expected_ids(SAPTable, **kw)
+            assert ids == want and nRows == len(want), kw
+        print(f'  results check: ok ({len(checks)} sorts/filters walked page by page)')
+        app_db.session.expunge_all()
+
+        times, nBytes = [], 0
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            html = old_rows_tmpl.render(SAPSet=fnSAPList(for_date=SAPDate)['SAPTable'])
+            times.append(time.perf_counter() - t0)
+            nBytes = len(html.encode('utf-8'))
+            app_db.session.expunge_all()
+        report('whole table (fnSAPList+html)', times, nBytes)
+
+        times, nBytes = [], 0
+        for _ in range(args.repeat * 10):
+            t0 = time.perf_counter()
+            body = json.dumps(fnSAPTablePage(SAPDate, limit=args.pagesize))
+            times.append(time.perf_counter() - t0)
+            nBytes = len(body.encode('utf-8'))
+        report('first page (JSON)', times, nBytes)
+
+        _, pageTimes, _ = walk(SAPDate, args.pagesize)
+        report('every page, in turn', pageTimes)
+        report('  the last tenth of them', pageTimes[-max(1, len(pageTimes) // 10):])
+        _, pageTimes, _ = walk(SAPDate, args.pagesize, sort='amount', descending=True)
+        report('every page, by amount desc', pageTimes)
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
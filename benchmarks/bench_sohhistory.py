@@ -0,0 +1,217 @@
+"""
+Benchmark: SAP stock-on-hand history stored as deltas between snapshots (procs.sohsnapshot) against
+the old full copy per day - table size, fnSAPList, and converting the old history.
+
+    python -m benchmarks.bench_sohhistory
+    python -m benchmarks.bench_sohhistory --days 60 --matls 20000 --churn 0.01
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_materiallist, WICS_unitsofmeasure,
+WICS_sap_sohrecs, WICS_sap_sohsnapshots, WICS_sap_sohtotals) holding --days of MM52 snapshots
+stored the old way, each differing from the day before in about --churn of its lines (a changed
+quantity, a line gone, a new one).  Its size and fnSAPList for a few days are timed, then proc_SOH_CompactHistory converts it and
+they're timed again, as is one Material's SAP total read from WICS_sap_sohtotals (fnSAPTotals) against
+adding up its SAP rows (fnSAPList).  Every day's snapshot, and every Material's total, is checked to
+read back exactly as it was loaded; then a new day is stored, and one in the middle of the history
+replaced, and checked again - and once more after the totals are rebuilt from scratch.
+"""
+import argparse, collections, datetime, math, os, random, tempfile, time
+
+from flask import Flask
+from sqlalchemy import select, func, text
+
+from database import app_db
+from models import Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals
+from procs.sohsnapshot import SOH_datflds, SOH_valid_on, _SOH_key, store_SOH_snapshot, proc_SOH_CompactHistory, proc_SOH_RebuildTotals
+from views.SAP.procs_SAP import fnSAPList, fnSAPTotals
+
+from benchmarks._sqlite import create_tables
+
+
+Plants = {'1000': 1, '1100': 2, '2000': 3}
+UOMs = {'EA': 1, 'BOX': 12}
+FirstDate = datetime.date(2026, 1, 5)
+
+def synthetic_line(m:dict, sloc:str, rnd:random.Random) -> dict:
+    qty = rnd.randint(0, 5000)
+    return {'org_id': m['org_id'], 'Material_id': m['id'], 'MaterialPartNum': m['Material'], 'Description': m['Description'],
+        'Plant': m['Plant'], 'MaterialType': 'ROH', 'StorageLocation': sloc, 'BaseUnitofMeasure': rnd.choice(['EA', 'EA', 'BOX']),
+        'Currency': 'USD', 'SpecialStock': '', 'Batch': '', 'Vendor': '',
+        'Amount': qty, 'ValueUnrestricted': round(qty * 1.25, 2), 'Blocked': rnd.choice([0, 0, 0, 5]), 'ValueBlocked': 0}
+
+def next_day(lines:list[dict], matls:list[dict], churn:float, rnd:random.Random) -> list[dict]:
+    """the day after lines: about churn of them changed, half that gone, and as many new ones"""
+    newLines = []
+    for line in lines:
+        r = rnd.random()
+        if r < churn / 2:
+            continue
+        if r < churn:
+            qty = rnd.randint(0, 5000)
+            line = {**line, 'Amount': qty, 'ValueUnrestricted': round(qty * 1.25, 2)}
+        newLines.append(line)
+    # endfor line
+    for _ in range(len(lines) - len(newLines)):
+        newLines.append(synthetic_line(rnd.choice(matls), rnd.choice(['0001', '0002', '0003', 'QC01', 'SHIP']), rnd))
+    return newLines
+# next_day
+
+def build_db(nMatls:int, nDays:int, churn:float, seed:int = 1) -> tuple[list[dict], dict[datetime.date, list[dict]]]:
+    """the old way: a full copy of every day's snapshot; returns the Materials and each day's lines"""
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, MaterialList, UnitsOfMeasure, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals)
+    app_db.session.execute(Organizations.__table__.insert(), [{'id': o, 'orgname': f'ORG{o}'} for o in sorted(set(Plants.values()))])
+    app_db.session.execute(UnitsOfMeasure.__table__.insert(),
+        [{'UOM': UOM, 'UOMText': UOM.lower(), 'DimensionText': 'count', 'Multiplier1': mult} for UOM, mult in UOMs.items()])
+    matls = []
+    for mid in range(1, nMatls+1):
+        Plant = rnd.choice(list(Plants))
+        matls.append({'id': mid, 'org_id': Plants[Plant], 'Plant': Plant, 'Material': f'{100000 + mid:08d}',
+            'Description': f'material {mid}', 'TypicalContainerQty': '', 'TypicalPalletQty': '', 'Notes': ''})
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+
+    history:dict[datetime.date, list[dict]] = {}
+    lines = [synthetic_line(m, sloc, rnd) for m in matls for sloc in rnd.sample(['0001', '0002', '0003', 'QC01', 'SHIP'], rnd.randint(1, 3))]
+    for d in range(nDays):
+        SAPDate = FirstDate + datetime.timedelta(days=d)
+        if d:
+            lines = next_day(lines, matls, churn, rnd)
+        history[SAPDate] = lines
+        for i in range(0, len(lines), 5000):
+            app_db.session.execute(SAP_SOHRecs.__table__.insert(), [{**line, 'uploaded_at': SAPDate} for line in lines[i:i+5000]])
+    # endfor d
+    app_db.session.commit()
+    return matls, history
+# build_db
+
+def table_size() -> tuple[int, float]:
+    """rows in WICS_sap_sohrecs, and the database's size in MB (vacuumed)"""
+    app_db.session.commit()
+    with app_db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+        nPages = conn.execute(text('PRAGMA page_count')).scalar()
+        pageSize = conn.execute(text('PRAGMA page_size')).scalar()
+    nRows = app_db.session.scalar(select(func.count()).select_from(SAP_SOHRecs))
+    return nRows, nPages * pageSize / 2**20
+
+def legacy_SAPList(SAPDate:datetime.date) -> int:
+    """fnSAPList's query as it was, reading a full copy: uploaded_at == the day"""
+    uom_subquery = (select(UnitsOfMeasure.Multiplier1).where(UnitsOfMeasure.UOM == SAP_SOHRecs.BaseUnitofMeasure)
+        .limit(1).scalar_subquery())
+    stmt = (select(SAP_SOHRecs, uom_subquery.label('mult')).join(SAP_SOHRecs.Material)
+        .where(SAP_SOHRecs.uploaded_at == SAPDate)
+        .order_by(MaterialList.org_id, MaterialList.Material, SAP_SOHRecs.StorageLocation))
+    n = len(app_db.session.execute(stmt).all())
+    app_db.session.expunge_all()
+    return n
+
+def current_SAPList(SAPDate:datetime.date) -> int:
+    n = len(fnSAPList(for_date=SAPDate)['SAPTable'])
+    app_db.session.expunge_all()
+    return n
+
+def time_lists(listfn, dates:list[datetime.date], history:dict[datetime.date, list[dict]], repeat:int) -> float:
+    """mean ms per call of listfn over dates"""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for SAPDate in dates:
+            assert listfn(SAPDate) == len(history[SAPDate]), SAPDate
+    return (time.perf_counter() - t0) * 1000 / (repeat * len(dates))
+
+def time_totals(totalfn, SAPDate:datetime.date, matlIds:list[int]) -> float:
+    """mean ms per call of totalfn(SAPDate, Material_id)"""
+    t0 = time.perf_counter()
+    for mid in matlIds:
+        totalfn(SAPDate, mid)
+    app_db.session.expunge_all()
+    return (time.perf_counter() - t0) * 1000 / len(matlIds)
+
+def total_from_list(SAPDate:datetime.date, mid:int) -> float:
+    SAPMatl = fnSAPList(for_date=SAPDate, matl=mid, byMaterial=True)['SAPByMaterial'].get(mid)
+    return SAPMatl['SAPTotal'] if SAPMatl else 0
+
+def total_from_totals(SAPDate:datetime.date, mid:int) -> float:
+    return fnSAPTotals(for_date=SAPDate, matl=mid)['SAPTotals'].get(mid, 0)
+
+def check_history(history:dict[datetime.date, list[dict]]):
+    """every day's snapshot, and every Material's total, reads back as the lines loaded for it"""
+    stmt = select(SAP_SOHSnapshot.uploaded_at, SAP_SOHSnapshot.nRows).order_by(SAP_SOHSnapshot.uploaded_at)
+    assert app_db.session.execute(stmt).tuples().all() == [(d, len(lines)) for d, lines in sorted(history.items())]
+    for SAPDate, lines in history.items():
+        stored = collections.Counter(_SOH_key(row) for row in app_db.session.execute(
+            select(*[getattr(SAP_SOHRecs, fld) for fld in SOH_datflds]).where(SOH_valid_on(SAPDate))).tuples())
+        assert stored == collections.Counter(_SOH_key([line[fld] for fld in SOH_datflds]) for line in lines), SAPDate
+        expected:dict[int, float] = collections.defaultdict(float)
+        for line in lines:
+            expected[line['Material_id']] += line['Amount'] * UOMs[line['BaseUnitofMeasure']]
+        totals = fnSAPTotals(for_date=SAPDate)['SAPTotals']
+        assert totals.keys() == expected.keys() and all(math.isclose(totals[mid], tot) for mid, tot in expected.items()), SAPDate
+    # endfor SAPDate
+# check_history
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--matls', type=int, default=10000)
+    parser.add_argument('--churn', type=float, default=0.02, help='fraction of the lines that differ from one day to the next')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'sohhistory.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    with flskapp.app_context():
+        t0 = time.perf_counter()
+        matls, history = build_db(args.matls, args.days, args.churn)
+        dates = sorted(history)
+        sample = [dates[0], dates[len(dates) // 2], dates[-1]]
+        print(f'{len(matls)} materials, {args.days} days of ~{len(history[dates[-1]])} lines each, '
+            f'{args.churn:.1%} churn; built in {time.perf_counter() - t0:.1f} s')
+
+        nRows, sizeMB = table_size()
+        msList = time_lists(legacy_SAPList, sample, history, args.repeat)
+        print(f'  full copies: {nRows:9,d} rows, {sizeMB:7.1f} MB; SAP list {msList:6.1f} ms')
+
+        t0 = time.perf_counter()
+        nDays = proc_SOH_CompactHistory()
+        elapsed = time.perf_counter() - t0
+        assert nDays == args.days, nDays
+        nRowsAfter, sizeMBAfter = table_size()
+        msListAfter = time_lists(current_SAPList, sample, history, args.repeat)
+        print(f'  deltas:      {nRowsAfter:9,d} rows, {sizeMBAfter:7.1f} MB; SAP list {msListAfter:6.1f} ms  '
+            f'(converted in {elapsed:.1f} s; {nRowsAfter / nRows:.1%} of the rows, {sizeMBAfter / sizeMB:.1%} of the size)')
+        check_history(history)
+        assert proc_SOH_CompactHistory() == 0
+        nTotals = app_db.session.scalar(select(func.count()).select_from(SAP_SOHTotals))
+        lookupMatls = random.Random(4).sample([m['id'] for m in matls], min(200, len(matls)))
+        msFromList = time_totals(total_from_list, sample[1], lookupMatls)
+        msFromTotals = time_totals(total_from_totals, sample[1], lookupMatls)
+        print(f'  one Material\'s SAP total: adding up its rows {msFromList:.2f} ms, from {nTotals:,d} stored totals {msFromTotals:.2f} ms')
+
+        # a new day, then one in the middle replaced
+        rnd = random.Random(3)
+        for SAPDate, lines in ((dates[-1] + datetime.timedelta(days=1), next_day(history[dates[-1]], matls, args.churn, rnd)),
+                               (sample[1], next_day(history[sample[1]], matls, 5 * args.churn, rnd))):
+            t0 = time.perf_counter()
+            stored = store_SOH_snapshot(SAPDate, SOH_datflds, [[line[fld] for fld in SOH_datflds] for line in lines])
+            app_db.session.commit()
+            elapsed = time.perf_counter() - t0
+            assert stored['nRowsKept'] + stored['nRowsNew'] == len(lines), stored
+            assert stored['nRowsReplaced'] == len(history.get(SAPDate, [])), stored
+            history[SAPDate] = lines
+            check_history(history)
+            print(f'  store {SAPDate}: {elapsed:.2f} s  ({stored["nRowsNew"]} new, {stored["nRowsKept"]} kept, '
+                f'{stored["nRowsRetired"]} retired, {stored["nRowsReplaced"]} replaced; {stored["nTotalsChanged"]} totals changed)')
+        # endfor SAPDate, lines
+
+        t0 = time.perf_counter()
+        assert proc_SOH_RebuildTotals() == len(history)
+        elapsed = time.perf_counter() - t0
+        check_history(history)
+        print(f'  totals rebuilt in {elapsed:.1f} s')
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark: the SAP stock-on-hand (MM52) upload, views.SAP.upldSAP.proc_UpSAPSprsheet_01ReadSheet
+(Plants and Materials resolved up front, then the date's snapshot replaced in one transaction).
+
+    python -m benchmarks.bench_sohupload
+    python -m benchmarks.bench_sohupload --rows 200000 --csv
+
+Builds a synthetic SQLite database (WICS_organizations, WICS_sapplants_org, WICS_materiallist,
+WICS_sap_sohrecs, WICS_sap_sohsnapshots, WICS_sap_sohtotals, WICS_unitsofmeasure, WICS_uploadsapresults,
+WICS_async_comm) holding an older snapshot and one for the upload date, both stored the old way (a full
+copy per day; they're converted first, as `flask wics compact-sap-history` would), and a synthetic MM52: a few storage locations per Material, with some rows
+for Materials WICS doesn't have, some for an unknown Plant and some with no Material.  The upload
+is timed, then checked: the date's old snapshot is gone, the older one is untouched, and a listener
+(as the progress stream does) saw the write progress chunk by chunk.
+"""
+import argparse, csv, datetime, os, random, tempfile, threading, time, uuid
+
+from flask import Flask
+from openpyxl import Workbook
+from sqlalchemy import select, func
+
+from database import app_db
+from models import (Organizations, SAPPlants_org, MaterialList, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals, UnitsOfMeasure,
+    UploadSAPResults, async_comm)
+from procs.sohsnapshot import SOH_valid_on, proc_SOH_CompactHistory
+from async_procs.notifier import progress_notifier
+from views.SAP.upldSAP import proc_UpSAPSprsheet_00InitUpld, proc_UpSAPSprsheet_01ReadSheet
+
+from benchmarks._sqlite import create_tables
+
+
+MM52_header = ['Material', 'Plant', 'Storage location', 'Material description', 'Material type', 'Base Unit of Measure',
+    'Unrestricted', 'Currency', 'Value Unrestricted', 'Special Stock', 'Batch', 'Blocked', 'Value BlockedStock', 'Vendor']
+Plants = {'1000': 1, '1100': 2, '2000': 3}
+UplDate = datetime.date(2026, 10, 1)
+OlderDate = datetime.date(2026, 9, 1)
+
+def build_db(nMatls:int, seed:int = 1) -> list[dict]:
+    rnd = random.Random(seed)
+    create_tables(app_db.engine, Organizations, SAPPlants_org, MaterialList, SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals, UnitsOfMeasure, UploadSAPResults)
+    async_comm.__table__.drop(app_db.engine, checkfirst=True)
+    async_comm.__table__.create(app_db.engine)
+    app_db.session.execute(Organizations.__table__.insert(), [{'id': o, 'orgname': f'ORG{o}'} for o in sorted(set(Plants.values()))])
+    app_db.session.execute(SAPPlants_org.__table__.insert(), [{'SAPPlant': p, 'org_id': o} for p, o in Plants.items()])
+    matls = []
+    for mid in range(1, nMatls+1):
+        Plant = rnd.choice(list(Plants))
+        matls.append({'id': mid, 'org_id': Plants[Plant], 'Plant': Plant, 'Material': f'{100000 + mid:08d}',
+            'Description': f'material {mid}', 'TypicalContainerQty': '', 'TypicalPalletQty': '', 'Notes': ''})
+    app_db.session.execute(MaterialList.__table__.insert(), matls)
+    # an older snapshot, and one for UplDate that the upload replaces
+    for dt in (OlderDate, UplDate):
+        app_db.session.execute(SAP_SOHRecs.__table__.insert(), [{'uploaded_at': dt, 'MaterialPartNum': m['Material'],
+            'org_id': m['org_id'], 'Material_id': m['id'], 'Description': m['Description'], 'Plant': m['Plant'],
+            'StorageLocation': '0001', 'Amount': 1} for m in matls[::4]])
+    app_db.session.commit()
+    return matls
+
+def sheet_rows(nRows:int, matls:list[dict], seed:int = 2) -> tuple[list[list], dict[str, int]]:
+    rnd = random.Random(seed)
+    rows, kinds = [], {'good': 0, 'nomatl': 0, 'badplant': 0, 'blank': 0}
+    while len(rows) < nRows:
+        m = rnd.choice(matls)
+        for sloc in rnd.sample(['0001', '0002', '0003', 'QC01', 'SHIP'], rnd.randint(1, 4)):
+            r = rnd.random()
+            Material, Plant = m['Material'], m['Plant']
+            if r < 0.01:
+                Material, kind = f'X{rnd.randint(1, 10**7):09d}', 'nomatl'
+            elif r < 0.015:
+                Plant, kind = '9999', 'badplant'
+            elif r < 0.02:
+                Material, kind = None, 'blank'
+            else:
+                kind = 'good'
+            kinds[kind] += 1
+            qty = rnd.randint(0, 5000)
+            rows.append([Material, Plant, sloc, m['Description'], 'ROH', 'EA',
+                qty, 'USD', round(qty * 1.25, 2), '', '', rnd.choice([0, 0, 0, 5]), 0, ''])
+            if len(rows) == nRows:
+                break
+    # endwhile
+    return rows, kinds
+
+def write_sheet(fName:str, rows:list[list]):
+    if fName.endswith('.csv'):
+        with open(fName, 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(MM52_header)
+            w.writerows(rows)
+    else:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(MM52_header)
+        for row in rows:
+            ws.append(row)
+        wb.save(fName)
+# write_sheet
+
+def count(*where) -> int:
+    return app_db.session.scalar(select(func.count()).select_from(SAP_SOHRecs).where(*where))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--matls', type=int, default=60000)
+    parser.add_argument('--csv', action='store_true', help='upload a CSV export instead of an .xlsx')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='wics_bench_')
+    dbName = os.path.join(tmpdir, 'sohupload.sqlite')
+    flskapp = Flask(__name__)
+    flskapp.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{dbName}'
+    app_db.init_app(flskapp)
+
+    with flskapp.app_context():
+        matls = build_db(args.matls)
+        proc_SOH_CompactHistory()
+        nOlder = count(SOH_valid_on(OlderDate))
+        fName = os.path.join(tmpdir, 'mm52.csv' if args.csv else 'mm52.xlsx')
+        rows, kinds = sheet_rows(args.rows, matls)
+        t0 = time.perf_counter()
+        write_sheet(fName, rows)
+        print(f'{len(matls)} materials; {args.rows} row MM52 written in {time.perf_counter() - t0:.1f} s')
+
+        reqid = str(uuid.uuid4())
+        proc_UpSAPSprsheet_00InitUpld(reqid)
+        # what a progress stream in this process would show while the snapshot is written
+        seen:list[str] = []
+        def listen():
+            with flskapp.app_context():
+                version = 0
+                while progress_notifier.wait(reqid, version, timeout=60) == 'changed':
+                    rec = async_comm.get_async_comm_record(reqid)
+                    version = rec['version']
+                    if rec['statecode'] == 'wrtng-SAP':
+                        seen.append(rec['statetext'])
+                    elif rec['statecode'] == 'done-rdng-sprsht':
+                        return
+        listener = threading.Thread(target=listen, daemon=True)
+        listener.start()
+        t0 = time.perf_counter()
+        proc_UpSAPSprsheet_01ReadSheet(reqid, fName, UplDate)
+        elapsed = time.perf_counter() - t0
+        listener.join(timeout=60)
+
+        totals = dict(app_db.session.execute(
+            select(UploadSAPResults.errState, UploadSAPResults.rowNum).where(UploadSAPResults.errState.like('nRows%'))
+            ).tuples().all())
+        assert totals['nRowsTotal'] == args.rows + 1, totals
+        assert totals['nRowsAdded'] == kinds['good'] == count(SOH_valid_on(UplDate)), (totals, kinds)
+        assert totals['nRowsErrors'] == kinds['nomatl'] + kinds['badplant'], (totals, kinds)
+        assert totals['nRowsIgnored'] == kinds['blank'], (totals, kinds)
+        assert totals['nRowsReplaced'] == nOlder, totals
+        assert count(SOH_valid_on(OlderDate)) == nOlder
+        assert count(SOH_valid_on(UplDate), SAP_SOHRecs.Material_id.is_(None)) == 0
+        assert any('<progress' in text for text in seen), seen
+        nStored = app_db.session.scalar(select(func.count()).select_from(SAP_SOHRecs))
+        print(f'  upload: {elapsed:.1f} s  ({args.rows / elapsed:,.0f} rows/s; {kinds["good"]} added, '
+            f'{totals["nRowsErrors"]} errors, {kinds["blank"]} blank, {nOlder} replaced; {nStored} rows stored for both days)')
+        print(f'  write progress seen by a listener: {sum("<progress" in text for text in seen)} updates')
+        async_comm.delete_async_comm(reqid)
+    os.remove(dbName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: procs.sprsht_ingest.SprshtIngest vs. the openpyxl read_only path the
+MM60 reader used before (load_workbook + ws.max_row + iter_rows(values_only=True)).
+
+    python -m benchmarks.bench_sprsht_ingest
+    python -m benchmarks.bench_sprsht_ingest --sizes 10000 100000 500000 --keep
+
+Synthetic MM60-shaped workbooks (and a CSV of the same data) are written to a temp
+directory; generating the 500k-row workbook takes a while by itself.
+"""
+import argparse, csv, os, random, tempfile, time
+
+from openpyxl import Workbook, load_workbook
+
+from procs.sprsht_ingest import SprshtIngest
+from views.Material.updtMatlList import SAP_SSName_TableName_map
+
+
+MM60_header = [
+    'Plant', 'Material', 'Material description', 'Material type', 'Matl Group',
+    'Manufact.', 'MPN', 'ABC', 'Price', 'per', 'Currency',
+    # columns SAP exports that WICS does not map
+    'Created by', 'Created on', 'Last change', 'Valuation Class', 'Profit Center',
+    ]
+
+def synthetic_row(n:int, rnd:random.Random) -> list:
+    return [
+        rnd.choice(['1000', '1100', '2000']),
+        f'{100000 + n:08d}',
+        f'Synthetic material number {n} {rnd.choice(["BOLT", "NUT", "PANEL", "CABLE", "LABEL"])}',
+        rnd.choice(['ROH', 'HALB', 'FERT']),
+        f'MG{rnd.randint(1, 40):03d}',
+        rnd.choice(['ACME', 'GLOBEX', 'INITECH', None]),
+        f'MPN-{rnd.randint(1, 999999)}',
+        rnd.choice(['A', 'B', 'C']),
+        round(rnd.uniform(0.01, 2500), 2),
+        rnd.choice([1, 10, 100]),
+        'USD',
+        'SAPUSER', '2019-04-01', '2025-11-30', '3000', 'PC100',
+        ]
+
+def write_workbook(fName:str, nrows:int):
+    rnd = random.Random(nrows)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(MM60_header)
+    for n in range(nrows):
+        ws.append(synthetic_row(n, rnd))
+    wb.save(fName)
+
+def write_csv(fName:str, nrows:int):
+    rnd = random.Random(nrows)
+    with open(fName, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(MM60_header)
+        for n in range(nrows):
+            w.writerow(synthetic_row(n, rnd))
+
+
+def read_openpyxl(fName:str) -> int:
+    """what proc_MatlListSAPSprsheet_01ReadSpreadsheet did before SprshtIngest"""
+    wb = load_workbook(filename=fName, read_only=True)
+    ws = wb.active
+    assert ws is not None
+    SAPcol = {}
+    for col in ws[1]:
+        if col.value in SAP_SSName_TableName_map:
+            SAPcol[SAP_SSName_TableName_map[str(col.value)]] = col.column - 1  # type: ignore[operator]
+    if ws.max_row is None:
+        # no <dimension> in the sheet XML: openpyxl has to parse the whole sheet to find max_row
+        ws.calculate_dimension(force=True)
+    numrows = ws.max_row
+    n = 0
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        rec = {dbColName: row[ssColNum] for dbColName, ssColNum in SAPcol.items()}
+        n += 1
+    wb.close()
+    assert numrows - 1 == n, (numrows, n)
+    return n
+
+def read_ingest(fName:str) -> int:
+    n = 0
+    with SprshtIngest(fName, SAP_SSName_TableName_map) as SS:
+        for batch in SS.batches():
+            n += len(batch)
+    return n
+
+
+def timed(fn, fName:str) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    n = fn(fName)
+    return time.perf_counter() - t0, n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--dir', default=None, help='where to write the synthetic files (default: a temp dir)')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic files')
+    args = parser.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix='wics_bench_')
+    print(f'{"rows":>8} | {"openpyxl xlsx":>14} | {"ingest xlsx":>12} | {"speedup":>7} | {"ingest csv":>11}')
+    print('-'*66)
+    for nrows in args.sizes:
+        xlsxName = os.path.join(workdir, f'mm60_{nrows}.xlsx')
+        csvName = os.path.join(workdir, f'mm60_{nrows}.csv')
+        if not os.path.exists(xlsxName): write_workbook(xlsxName, nrows)
+        if not os.path.exists(csvName): write_csv(csvName, nrows)
+
+        t_old, n_old = timed(read_openpyxl, xlsxName)
+        t_new, n_new = timed(read_ingest, xlsxName)
+        t_csv, n_csv = timed(read_ingest, csvName)
+        assert n_old == n_new == n_csv == nrows, (n_old, n_new, n_csv)
+        print(f'{nrows:>8} | {t_old:>13.2f}s | {t_new:>11.2f}s | {t_old/t_new:>6.1f}x | {t_csv:>10.2f}s')
+
+        if not args.keep:
+            os.remove(xlsxName)
+            os.remove(csvName)
+    # endfor nrows
+
+if __name__ == '__main__':
+    main()
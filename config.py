@@ -39,6 +39,34 @@ class Config:
     COUNTLIST_RECLIMIT = 500
     LOCRPT_COUNTDAYS_IFNOSAP = 30
 
+    MM60_INSERT_CHUNKSIZE = 5000    # rows per bulk INSERT (and per transaction) when loading an MM60 spreadsheet
+    MM60_STAGING_MAXAGE_SECS = 6*3600   # an MM60 update whose async_comm record and ledger haven't been touched in this long is abandoned, and purged
+    MM60_RESUME_IDLE_SECS = 300     # an unfinished MM60 update can be resumed once it has reported no progress for this long (its job is taken to have died)
+    MATLCHOICE_RECHECK_SECS = 30    # the Material search index is checked against the DB (for changes made by other processes) at most this often
+    MATLSEARCH_LIMIT = 25           # matches returned by /WICS/api/materials/search (at most MATLSEARCH_MAXLIMIT, if the caller asks)
+    MATLSEARCH_MAXLIMIT = 200
+    MATLSEARCH_MIN_SUBSTR = 2       # shorter queries only match the start of Material numbers and MfrPNs
+    SAPUPLOAD_CHUNKSIZE = 5000      # MM52 rows per batch read and per bulk INSERT when uploading SAP stock on hand (all in one transaction)
+    SAPDATES_RECHECK_SECS = 5       # the cached list of SAP snapshot dates is checked against the DB (for an upload by another process) at most this often
+    SAPLIST_STREAM_CHUNKSIZE = 2000 # SAP rows fetched at a time by fnSAPListIter
+    SAPTABLE_PAGESIZE = 200         # SAP table lines per page loaded as the table is scrolled (at most SAPTABLE_MAXPAGESIZE, if the caller asks)
+    SAPTABLE_MAXPAGESIZE = 1000
+    SAP_SOH_DELTA_STORAGE = True    # an SAP upload stores only the lines that changed since the snapshot before it (procs.sohsnapshot); False stores them all
+    COUNTUPLOAD_CHUNKSIZE = 1000    # Counts spreadsheet rows per bulk write (and per transaction) when uploading counts
+    UPLOAD_VALIDATE_MAXLIST = 500   # a validate-only upload lists at most this many would-be adds/updates/removals/errors (each); the counts are complete
+    RPTEXPORT_TTL_SECS = 600        # a report download (in SAP_FILELOC/tmpdl) is sent again for the same report/date/variation until it is this old; older ones are purged
+    CTDQTY_BACKFILL_CHUNKSIZE = 5000    # ActualCounts rows per UPDATE batch (and per transaction) for `flask wics backfill-ctdqty`
+
+    # background jobs (async_procs.jobrunner): 'thread', 'huey' or 'inline'
+    JOB_RUNNER = os.environ.get('JOB_RUNNER') or getattr(app_secrets, 'job_runner', 'thread')
+    JOB_RUNNER_THREADS = 2          # worker threads per process for JOB_RUNNER = 'thread'
+    HUEY_SQLITE_FILE = getattr(app_secrets, 'HUEY_SQLITE_FILE', os.path.join(os.getcwd(), 'huey_jobs.db'))    # queue storage for JOB_RUNNER = 'huey'
+    # SSE progress streams are pushed in-process; the DB is polled only as a fallback (job in another process),
+    # starting at MIN seconds and backing off to MAX while nothing changes
+    SSE_FALLBACKPOLL_MIN_SECS = 1.0
+    SSE_FALLBACKPOLL_MAX_SECS = 15.0
+    ASYNC_COMM_FLUSH_SECS = 0.25    # repeated progress updates (same statecode) are written to WICS_async_comm at most this often
+
     DEFAULT_DATEFORMAT = '%Y-%m-%d'  # default date format for displaying dates in the app
 
     # this is a default value for new user password,
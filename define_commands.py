@@ -0,0 +1,70 @@
+import click
+from flask.cli import AppGroup
+
+
+def define_commands(flskapp):
+    # WICS maintenance commands:  flask wics <command>
+    wics_cli = AppGroup('wics', help='WICS maintenance commands.')
+
+    @wics_cli.command('backfill-ctdqty')
+    @click.option('--chunksize', type=int, default=None, help='rows per batch (default: CTDQTY_BACKFILL_CHUNKSIZE)')
+    @click.option('--recompute', is_flag=True, help='re-evaluate rows already evaluated, too')
+    @click.option('--from-id', type=int, default=0, help='start after this ActualCounts id (to resume a --recompute run)')
+    def backfill_ctdqty(chunksize, recompute, from_id):
+        """Evaluate CTD_QTY_Expr into CTD_QTY_Eval / CTD_QTY_Invalid for existing ActualCounts rows.
+
+        Safe to interrupt; run it again to carry on.
+        """
+        from procs.ctdqty_backfill import proc_CTDQTY_Backfill, fnCTDQTY_BackfillRemaining
+
+        click.echo(f'{fnCTDQTY_BackfillRemaining()} ActualCounts rows not yet evaluated')
+        def progress(rows_done, last_id):
+            click.echo(f'  {rows_done} rows done, through id {last_id}')
+        rows_done = proc_CTDQTY_Backfill(chunksize=chunksize, recompute=recompute, from_id=from_id, progress=progress)
+        click.echo(f'{rows_done} rows evaluated; {fnCTDQTY_BackfillRemaining()} remaining')
+    # backfill_ctdqty
+
+    @wics_cli.command('purge-mm60-staging')
+    @click.option('--max-age', type=float, default=None, help='seconds since an update last reported progress (default: MM60_STAGING_MAXAGE_SECS)')
+    def purge_mm60_staging(max_age):
+        """Remove the staging rows of MM60 Material List updates that were abandoned part way."""
+        from views.Material.updtMatlList import proc_MatlListSAPSprsheet_99_PurgeAbandoned
+
+        purged = proc_MatlListSAPSprsheet_99_PurgeAbandoned(max_age)
+        click.echo(f'{len(purged)} abandoned MM60 updates purged')
+        for reqid in purged:
+            click.echo(f'  {reqid}')
+    # purge_mm60_staging
+
+    @wics_cli.command('compact-sap-history')
+    @click.option('--chunksize', type=int, default=None, help='rows per bulk statement (default: SAPUPLOAD_CHUNKSIZE)')
+    def compact_sap_history(chunksize):
+        """Convert SAP stock-on-hand history stored a full copy per day to delta storage, oldest day first.
+
+        Safe to interrupt; run it again to carry on.
+        """
+        from procs.sohsnapshot import proc_SOH_CompactHistory, fnSOH_LegacyDates, SOHLegacyHistoryError
+
+        click.echo(f'{len(fnSOH_LegacyDates())} SAP days to convert')
+        def progress(SAPDate, counts):
+            click.echo(f"  {SAPDate}: {counts['nRowsKept']} lines kept from the day before, {counts['nRowsNew']} stored, {counts['nRowsRetired']} retired")
+        try:
+            nDays = proc_SOH_CompactHistory(chunkSize=chunksize, progress=progress)
+        except SOHLegacyHistoryError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{nDays} SAP days converted')
+    # compact_sap_history
+
+    @wics_cli.command('rebuild-sap-totals')
+    @click.option('--chunksize', type=int, default=None, help='Materials per bulk statement (default: SAPUPLOAD_CHUNKSIZE)')
+    def rebuild_sap_totals(chunksize):
+        """Rebuild the per-Material SAP stock-on-hand totals for every snapshot (e.g., after a UOM multiplier changes)."""
+        from procs.sohsnapshot import proc_SOH_RebuildTotals
+
+        def progress(SAPDate, nChanged):
+            click.echo(f'  {SAPDate}: {nChanged} Material totals')
+        nDays = proc_SOH_RebuildTotals(chunkSize=chunksize, progress=progress)
+        click.echo(f'SAP totals rebuilt for {nDays} SAP days')
+    # rebuild_sap_totals
+
+    flskapp.cli.add_command(wics_cli)
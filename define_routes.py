@@ -106,6 +106,14 @@ def define_routes(flskapp):
         endpoint='MaterialFormCopyCount'
         )
 
+    # the Material goto boxes' typeahead
+    from views.Material.matlchoices import fnMaterialSearch_json
+    WICS_bp.add_url_rule('/api/materials/search',
+        view_func=fnMaterialSearch_json,
+        methods=['GET'],
+        endpoint='MaterialSearch'
+        )
+
     # this will start the huey pipeline
     ### UpdateMatlListfromSAP routes
     ###################################
@@ -144,6 +152,17 @@ def define_routes(flskapp):
         methods=['GET'], 
         endpoint='CountSummaryReport-dt',
         )
+    # the report's spreadsheet, built (or taken from SAP_FILELOC/tmpdl) when it's downloaded
+    WICS_bp.add_url_rule('/CountSummaryRpt/export/<string:passedCountDate>',
+        view_func=rptCountSummary.fnCountSummaryExport, 
+        methods=['GET'], 
+        endpoint='CountSummaryExport-dt',
+        )
+    WICS_bp.add_url_rule('/CountSummaryRpt/export/v/<string:Rptvariation>/<string:passedCountDate>',
+        view_func=rptCountSummary.fnCountSummaryExport, 
+        methods=['GET'], 
+        endpoint='CountSummaryExport-v-dt',
+        )
 
     ### SAP Table routes
     #########################
@@ -158,11 +177,24 @@ def define_routes(flskapp):
         methods=['GET'], 
         endpoint='showtable-SAP-dt',
         )
+    WICS_bp.add_url_rule('/api/SAP/<string:reqDate>/rows',
+        view_func=procs_SAP.fnSAPTable_json, 
+        methods=['GET'], 
+        endpoint='SAPTableRows',
+        )
     WICS_bp.add_url_rule('/SAP/exst/<string:reqDate>',
         view_func=procs_SAP.fnajaxSAPExists, 
         methods=['GET'], 
         endpoint='SAPajaxExists',
         )
+
+    # this queues the MM52 upload on the job runner
+    from views.SAP.upldSAP import fnUploadSAP
+    WICS_bp.add_url_rule('/UploadSAPSprSht',
+        view_func=fnUploadSAP,      #type: ignore
+        methods=['GET', 'POST'],
+        endpoint='UploadSAPSprSht'
+        )
     
 
     flskapp.register_blueprint(WICS_bp)
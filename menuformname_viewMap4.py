@@ -24,7 +24,7 @@ FormNameToURL_Map['frmcountentry'.lower()] = ('WICS.CountEntryForm', views.Actua
 FormNameToURL_Map['frmUploadCountEntry'.lower()] = ('WICS.UploadActualCounts', views.ActualCounts.upldActCounts.fnUploadActCountSprsht_init)
 FormNameToURL_Map['frmcountsummarypreview'.lower()] = ('WICS.CountSummaryReport', None)
 FormNameToURL_Map['frmrequestedcountsummary'.lower()] = ('WICS.CountSummaryReport-v-init', None)
-# FormNameToURL_Map['frmimportsap'.lower()] = ('UploadSAPSprSht', None)
+FormNameToURL_Map['frmimportsap'.lower()] = ('WICS.UploadSAPSprSht', views.SAP.upldSAP.fnUploadSAP_init)
 FormNameToURL_Map['frmmaterial'.lower()] = ('WICS.MaterialForm', None)   # make me work!
 # FormNameToURL_Map['frmmpnlookup'.lower()] = ('MPNLookup', None)
 # FormNameToURL_Map['frmParts-By-Type-with-LastCounts'.lower()] = ('MatlByPartType', None)
@@ -1,5 +1,5 @@
 
-import datetime
+import contextlib, datetime, threading, time
 from typing import Any
 import decimal
 
@@ -9,8 +9,9 @@ from sqlalchemy import (
     String,
     Date, DateTime,
     ForeignKeyConstraint, Index, UniqueConstraint,
-    select,
+    select, update, insert,
     inspect, 
+    event,
     )
 
 from sqlalchemy.dialects.mysql import DATETIME, INTEGER, LONGTEXT, SMALLINT, TINYINT
@@ -18,9 +19,12 @@ from sqlalchemy.dialects.mysql import DATETIME, INTEGER, LONGTEXT, SMALLINT, TIN
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped, mapped_column, relationship, 
+    sessionmaker,
     )
 
 from database import app_db
+from async_procs.notifier import progress_notifier
+from procs.ctdqty import ctdqty_fields
 
 # ============================================================================
 # LEGACY MODELS (for cMenu, cParameters, cGreetings, and User)
@@ -226,6 +230,7 @@ class MaterialList(Base):
     SAPABC: Mapped[str|None] = mapped_column(String(5))
     SAPMPN: Mapped[str|None] = mapped_column(String(100))
     SAPManuf: Mapped[str|None] = mapped_column(String(100))
+    MM60RowHash: Mapped[str|None] = mapped_column(String(32))      # the MM60 row (and update choices) this record was last brought in line with; see updtMatlList
 
     PartType: Mapped['WhsePartTypes|None'] = relationship('WhsePartTypes', back_populates='materiallist')
     org: Mapped['Organizations'] = relationship('Organizations', back_populates='materiallist')
@@ -236,6 +241,13 @@ class MaterialList(Base):
     sap_sohrecs: Mapped[list['SAP_SOHRecs']] = relationship('SAP_SOHRecs', back_populates='Material')
     tmpmateriallistupdate: Mapped[list['tmpMaterialListUpdate']] = relationship('tmpMaterialListUpdate', back_populates='MaterialLink')
 
+@event.listens_for(MaterialList, 'before_update')
+def _clear_MM60RowHash(mapper, connection, target:MaterialList):
+    # edited in WICS, so no longer known to match its MM60 row; the next MM60 update looks at it again
+    state = inspect(target)
+    if any(state.attrs[col.key].history.has_changes() for col in mapper.column_attrs if col.key != 'MM60RowHash'):
+        target.MM60RowHash = None
+
 class tmpMaterialListUpdate(Base):
     __tablename__ = 'WICS_tmpmateriallistupdate'
     __table_args__ = (
@@ -244,7 +256,8 @@ class tmpMaterialListUpdate(Base):
         Index('WICS_tmpmat_delMate_ea54b5_idx', 'delMaterialLink'),
         Index('WICS_tmpmat_org_id_77875e_idx', 'org_id', 'Material'),
         Index('WICS_tmpmat_recStat_af0cc4_idx', 'recStatus'),
-        Index('WICS_tmpmateriallist_MaterialLink_id_84b18d1a_fk_WICS_mate', 'MaterialLink_id')
+        Index('WICS_tmpmateriallist_MaterialLink_id_84b18d1a_fk_WICS_mate', 'MaterialLink_id'),
+        Index('WICS_tmpmat_reqid_idx', 'reqid', 'recStatus'),
     )
 
     Material: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -264,10 +277,50 @@ class tmpMaterialListUpdate(Base):
     SAPABC: Mapped[str|None] = mapped_column(String(5))
     SAPMPN: Mapped[str|None] = mapped_column(String(100))
     SAPManuf: Mapped[str|None] = mapped_column(String(100))
+    reqid: Mapped[str|None] = mapped_column(String(255))       # the MM60 update these rows are staged for (its async_comm reqid)
+    RowHash: Mapped[str|None] = mapped_column(String(32))      # _MM60_rowhash of the spreadsheet row
 
     MaterialLink: Mapped['MaterialList|None'] = relationship('MaterialList', back_populates='tmpmateriallistupdate')
     org: Mapped['Organizations|None'] = relationship('Organizations', back_populates='tmpmateriallistupdate')
 
+class MaterialListChangeLog(Base):
+    """one field of a MaterialList record changed by an MM60 update (proc_MatlListSAPSprsheet_03_UpdateExistingRecs)"""
+    __tablename__ = 'WICS_materiallistchangelog'
+    __table_args__ = (
+        Index('WICS_matlchglog_reqid_idx', 'reqid'),
+        Index('WICS_matlchglog_Material_idx', 'Material_id'),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    reqid: Mapped[str] = mapped_column(String(255), nullable=False)
+    ChangedAt: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    # no FK: the log outlives a Material removed later
+    Material_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    org_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    Material: Mapped[str] = mapped_column(String(100), nullable=False)
+    FieldName: Mapped[str] = mapped_column(String(100), nullable=False)
+    OldValue: Mapped[str|None] = mapped_column(String(250))
+    NewValue: Mapped[str|None] = mapped_column(String(250))
+
+class MM60UpdateLedger(Base):
+    """
+    the durable checkpoint of one MM60 update: its settings, the last phase it finished (a PhaseEnum value
+    in views.Material.updtMatlList) and, while 01ReadSpreadsheet runs, the last spreadsheet row staged.
+    Each phase moves it on in the same transaction as the phase's own writes, so an interrupted update
+    can be resumed by reqid from where it stopped
+    """
+    __tablename__ = 'WICS_mm60updateledger'
+
+    reqid: Mapped[str] = mapped_column(String(255), primary_key=True)
+    UpdateExistFldList: Mapped[str] = mapped_column(String(512), nullable=False)
+    RmvMissingMaterial: Mapped[int] = mapped_column(TINYINT(1), nullable=False)
+    fName: Mapped[str|None] = mapped_column(String(512))
+    CleanupFile: Mapped[int|None] = mapped_column(TINYINT(1))
+    PhaseDone: Mapped[str] = mapped_column(String(32), nullable=False)
+    LastRowNum: Mapped[int] = mapped_column(Integer, nullable=False)
+    StartedAt: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    UpdatedAt: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
 class MaterialPhotos(Base):
     __tablename__ = 'WICS_materialphotos'
     __table_args__ = (
@@ -379,13 +432,28 @@ class ActualCounts(Base):
     PKGID_Desc: Mapped[str|None] = mapped_column(String(250))
     TAGQTY: Mapped[str|None] = mapped_column(String(250))
     Notes: Mapped[str|None] = mapped_column(String(250))
+    # CTD_QTY_Expr, evaluated; set on every ORM insert/update (see _set_CTD_QTY_Eval).  NULL if empty or invalid
+    CTD_QTY_Eval: Mapped[float|None] = mapped_column(Double)
+    # 1 if CTD_QTY_Expr is given but invalid, 0 if not; NULL until the row has been evaluated (flask wics backfill-ctdqty)
+    CTD_QTY_Invalid: Mapped[int|None] = mapped_column(TINYINT(1))
 
     Material: Mapped['MaterialList'] = relationship('MaterialList', back_populates='actualcounts')
 
+@event.listens_for(ActualCounts, 'before_insert')
+@event.listens_for(ActualCounts, 'before_update')
+def _set_CTD_QTY_Eval(mapper, connection, target:ActualCounts):
+    for fld, val in ctdqty_fields(target.CTD_QTY_Expr).items():
+        setattr(target, fld, val)
+
 
 ##########  SAP
 
 class SAP_SOHRecs(Base):
+    """
+    one SAP stock-on-hand (MM52) line, valid in the snapshots from uploaded_at (the first one it's in) up to,
+    not including, retired_at (the first one it isn't in; NULL while it's in the latest).  A line that doesn't
+    change from one upload to the next is stored once - see procs.sohsnapshot
+    """
     __tablename__ = 'WICS_sap_sohrecs'
     __table_args__ = (
         ForeignKeyConstraint(['Material_id'], ['WICS_materiallist.id'], name='WICS_sap_sohrecs_Material_id_f253c0f8_fk_WICS_materiallist_id'),
@@ -393,11 +461,13 @@ class SAP_SOHRecs(Base):
         Index('WICS_sap_so_Plant_48325a_idx', 'Plant'),
         Index('WICS_sap_so_uploade_25ea7d_idx', 'uploaded_at', 'org_id', 'MaterialPartNum'),
         Index('WICS_sap_sohrecs_Material_id_f253c0f8_fk_WICS_materiallist_id', 'Material_id'),
-        Index('WICS_sap_sohrecs_org_id_7ac7fec9_fk_WICS_organizations_id', 'org_id')
+        Index('WICS_sap_sohrecs_org_id_7ac7fec9_fk_WICS_organizations_id', 'org_id'),
+        Index('WICS_sap_so_retired_idx', 'retired_at', 'uploaded_at'),
     )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     uploaded_at: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    retired_at: Mapped[datetime.date|None] = mapped_column(Date)
     MaterialPartNum: Mapped[str] = mapped_column(String(100), nullable=False)
     org_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     Description: Mapped[str] = mapped_column(String(250))
@@ -418,6 +488,32 @@ class SAP_SOHRecs(Base):
     Material: Mapped['MaterialList|None'] = relationship('MaterialList', back_populates='sap_sohrecs')
     org: Mapped['Organizations'] = relationship('Organizations', back_populates='sap_sohrecs')
 
+class SAP_SOHSnapshot(Base):
+    """one SAP stock-on-hand snapshot (upload date); nRows lines in all, nRowsNew of them stored for it"""
+    __tablename__ = 'WICS_sap_sohsnapshots'
+
+    uploaded_at: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    nRows: Mapped[int] = mapped_column(Integer, nullable=False)
+    nRowsNew: Mapped[int] = mapped_column(Integer, nullable=False)
+    LoadedAt: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
+class SAP_SOHTotals(Base):
+    """
+    a Material's SAP stock-on-hand total (sum of Amount * UOM Multiplier1) in the snapshots from uploaded_at up to,
+    not including, retired_at - kept with SAP_SOHRecs by procs.sohsnapshot
+    """
+    __tablename__ = 'WICS_sap_sohtotals'
+    __table_args__ = (
+        Index('WICS_sap_sohtotals_matl_idx', 'Material_id', 'uploaded_at'),
+        Index('WICS_sap_sohtotals_retired_idx', 'retired_at', 'uploaded_at'),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    Material_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    uploaded_at: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    retired_at: Mapped[datetime.date|None] = mapped_column(Date)
+    SAPTotal: Mapped[float] = mapped_column(Double, nullable=False)
+
 class SAPPlants_org(Base):
     __tablename__ = 'WICS_sapplants_org'
     __table_args__ = (
@@ -453,16 +549,39 @@ class UnitsOfMeasure(Base):
 
 ##########  ASYNC COMM
 
-# from database import HueySession
-def HueySession():
-    """Create a new SQLAlchemy session for Huey background tasks."""
-    from sqlalchemy.orm import sessionmaker
-    Session = sessionmaker(bind=app_db.engine)
-    return Session()
+# one session factory for async_comm; bound to the app's engine per session (background threads pass the engine in)
+_HueySessionmaker = sessionmaker()
+def HueySession(engine=None):
+    """Create a new SQLAlchemy session for async_comm and background tasks."""
+    return _HueySessionmaker(bind=engine if engine is not None else app_db.engine)
 
 class HueyBase(DeclarativeBase):
     """Base class for Huey background task models, using SQLAlchemy's DeclarativeBase."""
     pass
+
+# async_comm keeps the latest state of every reqid written in this process in memory, and the
+# writer trusts it: the DB copy is only read when a reqid is new here, or hasn't been read or
+# written here in _ASYNC_COMM_RESYNC_SECS (another process - a job worker - may have written it since).
+# An update is written to WICS_async_comm at once if the statecode changed or is terminal;
+# repeats of the same statecode (the every-N-rows progress reports) are coalesced and written
+# at most every ASYNC_COMM_FLUSH_SECS, by a timer if nothing else comes along.
+# The writes are made outside _acomm_lock (each entry's flush_lock keeps one reqid's writes in order).
+ASYNC_COMM_TERMINAL_STATECODES = ('done', 'fatalerr')
+_ASYNC_COMM_RESYNC_SECS = 60        # re-read a clean entry not read or written for this long before changing it
+_ASYNC_COMM_IDLE_SECS = 3600        # forget clean entries not touched for this long
+_acomm_fields = ('reqid', 'version', 'timestamp', 'processname', 'statecode', 'statetext', 'result', 'extra1')
+_acomm_lock = threading.RLock()
+class _async_comm_entry:
+    def __init__(self, engine, rec:dict, now:float):
+        self.engine = engine
+        self.rec = rec
+        self.dirty = False
+        self.flushed_statecode = rec['statecode']
+        self.synced_at = now        # last read from / write to the DB
+        self.timer:threading.Timer|None = None
+        self.flush_lock = threading.Lock()
+_acomm_entries:dict[str, _async_comm_entry] = {}
+
 class async_comm(HueyBase):
     __tablename__ = 'WICS_async_comm'
 
@@ -477,14 +596,67 @@ class async_comm(HueyBase):
     
 
     @classmethod
-    def get_async_comm_state(cls, reqid):
-        session = HueySession()
-        retval = session.get(cls, reqid)
+    def _read_async_comm_record(cls, reqid, engine=None) -> dict|None:
+        session = HueySession(engine)
+        acomm = session.get(cls, reqid)
+        retval = None if acomm is None else {f: getattr(acomm, f) for f in _acomm_fields}
         session.close()
         return retval
+
+    @classmethod
+    def _flush_async_comm(cls, reqid) -> None:
+        """write reqid's entry to WICS_async_comm if it has changes; never called holding _acomm_lock"""
+        with _acomm_lock:
+            entry = _acomm_entries.get(reqid)
+        if entry is None:
+            return
+        with entry.flush_lock:
+            with _acomm_lock:
+                if not entry.dirty or _acomm_entries.get(reqid) is not entry:
+                    return
+                if entry.timer is not None:
+                    entry.timer.cancel()
+                    entry.timer = None
+                rec = dict(entry.rec)
+            # endwith _acomm_lock
+
+            # the entry stays dirty (readers get it from memory) until this is in the DB
+            # an UPDATE (an INSERT the first time) - no SELECT first, as merge() would
+            session = HueySession(entry.engine)
+            try:
+                tbl = cls.__table__
+                if session.execute(update(tbl).where(tbl.c.reqid == reqid).values(**rec)).rowcount == 0:
+                    session.execute(insert(tbl).values(**rec))
+                session.commit()
+            finally:
+                session.close()
+
+            with _acomm_lock:
+                if entry.rec['version'] == rec['version']:
+                    entry.dirty = False
+                entry.flushed_statecode = rec['statecode']
+                entry.synced_at = time.monotonic()
+            # endwith _acomm_lock
+        # endwith flush_lock
+    # _flush_async_comm
+
+    @classmethod
+    def get_async_comm_record(cls, reqid) -> dict|None:
+        """the whole async_comm record for reqid as a dict (None if there is none), in one call"""
+        reqid = str(reqid)
+        with _acomm_lock:
+            entry = _acomm_entries.get(reqid)
+            if entry is not None and entry.dirty:
+                # newer than the DB
+                return dict(entry.rec)
+        return cls._read_async_comm_record(reqid)
+    @classmethod
+    def get_async_comm_state(cls, reqid):
+        rec = cls.get_async_comm_record(reqid)
+        return None if rec is None else cls(**rec)
     @classmethod
     def async_comm_exists(cls, reqid):
-        return cls.get_async_comm_state(reqid=reqid) is not None
+        return cls.get_async_comm_record(reqid) is not None
     
     @classmethod
     def set_async_comm_state(cls,
@@ -493,53 +665,100 @@ class async_comm(HueyBase):
             statetext,
             processname = None,
             result = None,
-            extra1 = None
+            extra1 = None,
+            deferwrite = False
         ):
+        """
+        deferwrite keeps the change in memory (readers in this process, and its progress streams, get it)
+        and leaves it for the next state set without it to write - for a caller in a transaction whose
+        locks async_comm's own connection would wait on
+        """
+        from flask import current_app
         
-        session = HueySession()
-        acomm = session.get(cls, reqid)
-        
-        if not acomm:
-            acomm = cls(reqid=reqid, version=0)
-
-        # has anything really changed?
-        if all([acomm.statecode == statecode,
-            acomm.statetext == statetext,
-            acomm.result == result,
-            ]):
-            session.close()
-            return acomm        
-
-        # do the change!
-        acomm.statecode = statecode
-        acomm.statetext = statetext
-        acomm.result = result
-        acomm.extra1 = extra1
-        if processname is not None: acomm.processname = processname
-        acomm.version += 1
-        acomm.timestamp = datetime.datetime.now()
-        
-        session.add(acomm)
-        session.commit()
-        session.close()
-        
-        return acomm
+        reqid = str(reqid)
+        flushSecs = float(current_app.config.get('ASYNC_COMM_FLUSH_SECS', 0.25))
+        now = time.monotonic()
+
+        with _acomm_lock:
+            entry = _acomm_entries.get(reqid)
+            if entry is None or (not entry.dirty and now - entry.synced_at >= _ASYNC_COMM_RESYNC_SECS):
+                # new here, or another process may have written it since we last looked
+                engine = app_db.engine
+                rec = cls._read_async_comm_record(reqid, engine) or dict.fromkeys(_acomm_fields) | {'reqid': reqid, 'version': 0}
+                if entry is None:
+                    for r in [r for r, e in _acomm_entries.items() if not e.dirty and now - e.synced_at > _ASYNC_COMM_IDLE_SECS]:
+                        del _acomm_entries[r]
+                    entry = _acomm_entries[reqid] = _async_comm_entry(engine, rec, now)
+                else:
+                    entry.rec, entry.flushed_statecode, entry.synced_at = rec, rec['statecode'], now
+            # endif need the DB copy
+            acomm = entry.rec
+
+            # has anything really changed?
+            if all([acomm['statecode'] == statecode,
+                acomm['statetext'] == statetext,
+                acomm['result'] == result,
+                ]):
+                return cls(**acomm)
+
+            # do the change!
+            acomm['statecode'] = statecode
+            acomm['statetext'] = statetext
+            acomm['result'] = result
+            acomm['extra1'] = extra1
+            if processname is not None: acomm['processname'] = processname
+            acomm['version'] = (acomm['version'] or 0) + 1
+            acomm['timestamp'] = datetime.datetime.now()
+            entry.dirty = True
+
+            flushNow = not deferwrite and (statecode != entry.flushed_statecode
+              or statecode in ASYNC_COMM_TERMINAL_STATECODES
+              or now - entry.synced_at >= flushSecs)
+            if deferwrite and entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            elif not flushNow and not deferwrite and entry.timer is None:
+                entry.timer = threading.Timer(flushSecs - (now - entry.synced_at), cls._flush_async_comm, args=(reqid,))
+                entry.timer.daemon = True
+                entry.timer.start()
+            # endif write now
+
+            newversion = acomm['version']
+            retval = cls(**acomm)
+        # endwith _acomm_lock
+
+        if flushNow:
+            cls._flush_async_comm(reqid)
+        progress_notifier.publish(reqid, newversion, terminal=statecode in ASYNC_COMM_TERMINAL_STATECODES)
+        return retval
     # set_async_comm_state
 
     @classmethod
     def delete_async_comm(cls, reqid):
-        session = HueySession()
-        
-        acomm = session.get(cls, reqid)
-        if acomm:
-            session.delete(acomm)
-            session.commit()
-            retval = True
-        else:
-            retval = False
-        #endif acomm
-        
-        session.close()
+        reqid = str(reqid)
+        with _acomm_lock:
+            entry = _acomm_entries.pop(reqid, None)
+            if entry is not None and entry.timer is not None:
+                entry.timer.cancel()
+        # endwith _acomm_lock
+
+        # wait out a flush in progress, so it can't write the record back after it's deleted
+        with (entry.flush_lock if entry is not None else contextlib.nullcontext()):
+            session = HueySession()
+            
+            acomm = session.get(cls, reqid)
+            if acomm:
+                session.delete(acomm)
+                session.commit()
+                retval = True
+            else:
+                retval = False
+            #endif acomm
+            
+            session.close()
+        # endwith flush_lock
+        if retval or entry is not None:
+            progress_notifier.publish_deleted(reqid)
         return retval
     # delete_async_comm
     
@@ -0,0 +1,5 @@
+-- ActualCounts.CTD_QTY_Eval: CTD_QTY_Expr, evaluated (NULL if empty or invalid).
+-- Filled by the ORM on every insert/update of an ActualCounts record; rows written before
+-- this column existed are filled by `flask wics backfill-ctdqty` (see ActualCounts_CTD_QTY_Invalid.sql).
+-- Until then, reports evaluate CTD_QTY_Expr for those.
+ALTER TABLE WICS_actualcounts ADD COLUMN CTD_QTY_Eval DOUBLE NULL;
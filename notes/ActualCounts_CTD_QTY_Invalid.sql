@@ -0,0 +1,11 @@
+-- ActualCounts.CTD_QTY_Invalid: 1 if CTD_QTY_Expr is given but does not evaluate to a number, else 0.
+-- Set by the ORM together with CTD_QTY_Eval on every insert/update of an ActualCounts record.
+-- NULL marks a row that has not been evaluated yet; after adding the column, fill the existing rows with
+--     flask wics backfill-ctdqty
+-- (chunked, one transaction per chunk; if it is interrupted, run it again and it carries on).
+ALTER TABLE WICS_actualcounts ADD COLUMN CTD_QTY_Invalid TINYINT(1) NULL;
+
+-- per material/date count totals are then a plain aggregate, e.g.
+--     SELECT Material_id, CountDate, SUM(CTD_QTY_Eval) FROM WICS_actualcounts
+--     WHERE NOT LocationOnly GROUP BY Material_id, CountDate;
+-- the existing (CountDate, Material_id) index serves it.
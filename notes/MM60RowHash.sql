@@ -0,0 +1,9 @@
+-- MM60 updates skip spreadsheet rows that would change nothing.
+-- WICS_materiallist.MM60RowHash: the hash (views.Material.updtMatlList._MM60_rowhash) of the MM60 row - and the
+-- update choices - the Material was last brought in line with, set by 03UpdateExisting and 04Add.  01ReadSpreadsheet
+-- doesn't stage a row whose hash is its Material's MM60RowHash, so 02..04 only work through what changed.
+-- Editing a Material in WICS clears it (models._clear_MM60RowHash).  NULL - as every row is after this change -
+-- just means "look at it": the first update after adding the columns stages every row, as before, and fills them in.
+-- WICS_tmpmateriallistupdate.RowHash: the staged row's hash.
+ALTER TABLE WICS_materiallist ADD COLUMN MM60RowHash VARCHAR(32) NULL;
+ALTER TABLE WICS_tmpmateriallistupdate ADD COLUMN RowHash VARCHAR(32) NULL;
@@ -0,0 +1,19 @@
+-- WICS_mm60updateledger: one row per MM60 update (Update Material List from SAP) in progress - its choices,
+-- the last phase it finished (PhaseDone: init-upl, 01ReadSpreadsheet, 02IdentifyExist, 03UpdateExisting,
+-- 04Remove, 04Add) and, while the spreadsheet is being staged, the last spreadsheet row staged (LastRowNum).
+-- Each phase moves it on in the same transaction as its own writes, so an interrupted update can be resumed
+-- by reqid from its last checkpoint (the phase0 page lists the unfinished ones).  The row goes when the
+-- update is cleaned up, or purged with the update's staging rows once abandoned (MM60_STAGING_MAXAGE_SECS).
+-- Replaces the MatlX<reqid> ".03D."/".03A." and <reqid>-UpdExstFldList / <reqid>-RmvMissingMatl async_comm records.
+CREATE TABLE WICS_mm60updateledger (
+    reqid VARCHAR(255) NOT NULL,
+    UpdateExistFldList VARCHAR(512) NOT NULL,
+    RmvMissingMaterial TINYINT(1) NOT NULL,
+    fName VARCHAR(512) NULL,
+    CleanupFile TINYINT(1) NULL,
+    PhaseDone VARCHAR(32) NOT NULL,
+    LastRowNum INT NOT NULL,
+    StartedAt DATETIME NOT NULL,
+    UpdatedAt DATETIME NOT NULL,
+    PRIMARY KEY (reqid)
+);
@@ -0,0 +1,22 @@
+-- WICS_materiallistchangelog: what each MM60 update (Update Material List from SAP) changed in existing
+-- Material records, one row per Material per field, old and new values as text.
+-- Written by proc_MatlListSAPSprsheet_03_UpdateExistingRecs in the same transaction as the update itself,
+-- and shown on the update's "done" page.  Rows are kept (it is an audit log); reqid ties them to one update.
+CREATE TABLE WICS_materiallistchangelog (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    reqid VARCHAR(255) NOT NULL,
+    ChangedAt DATETIME NOT NULL,
+    Material_id BIGINT NOT NULL,
+    org_id BIGINT NOT NULL,
+    Material VARCHAR(100) NOT NULL,
+    FieldName VARCHAR(100) NOT NULL,
+    OldValue VARCHAR(250) NULL,
+    NewValue VARCHAR(250) NULL,
+    PRIMARY KEY (id),
+    KEY WICS_matlchglog_reqid_idx (reqid),
+    KEY WICS_matlchglog_Material_idx (Material_id)
+);
+
+-- e.g. the history of one Material
+--     SELECT ChangedAt, FieldName, OldValue, NewValue FROM WICS_materiallistchangelog
+--     WHERE Material_id = ? ORDER BY id;
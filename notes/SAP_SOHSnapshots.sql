@@ -0,0 +1,18 @@
+-- Delta storage for SAP stock-on-hand history (procs.sohsnapshot).
+-- WICS_sap_sohrecs.retired_at: a line is in the snapshots from its uploaded_at (the first one it's in) up to, not
+-- including, its retired_at (the first one it isn't in); NULL while it's in the latest.  An upload stores only the
+-- lines that changed since the snapshot before it, and retires the ones that are gone.
+-- WICS_sap_sohsnapshots: one row per snapshot (upload date) - nRows lines in all, nRowsNew of them stored for it.
+-- nearestSAPDate and the SAP date lists read this instead of scanning WICS_sap_sohrecs.
+-- After adding these, convert the existing history (every row of it is a full copy for its day):
+--     flask wics compact-sap-history
+-- The SAP screens show no snapshots until it has run, and an SAP upload fails (fatalerr) until it has.
+ALTER TABLE WICS_sap_sohrecs ADD COLUMN retired_at DATE NULL;
+CREATE INDEX WICS_sap_so_retired_idx ON WICS_sap_sohrecs (retired_at, uploaded_at);
+CREATE TABLE WICS_sap_sohsnapshots (
+    uploaded_at DATE NOT NULL,
+    nRows INT NOT NULL,
+    nRowsNew INT NOT NULL,
+    LoadedAt DATETIME NOT NULL,
+    PRIMARY KEY (uploaded_at)
+);
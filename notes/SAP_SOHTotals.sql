@@ -0,0 +1,16 @@
+-- Per-Material SAP stock-on-hand totals (procs.sohsnapshot), so "SAP qty for Material X as of date D" is an
+-- indexed lookup instead of adding up WICS_sap_sohrecs.  SAPTotal is sum(Amount * UOM Multiplier1), a line with
+-- no UOM counting as 1.  Like WICS_sap_sohrecs, a total is in the snapshots from uploaded_at up to, not including,
+-- retired_at; an SAP upload rewrites only the totals of the Materials whose lines changed.
+-- After adding this, and whenever a UOM multiplier changes, build them from the stored snapshots:
+--     flask wics rebuild-sap-totals
+CREATE TABLE WICS_sap_sohtotals (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    Material_id BIGINT NOT NULL,
+    uploaded_at DATE NOT NULL,
+    retired_at DATE NULL,
+    SAPTotal DOUBLE NOT NULL,
+    PRIMARY KEY (id),
+    KEY WICS_sap_sohtotals_matl_idx (Material_id, uploaded_at),
+    KEY WICS_sap_sohtotals_retired_idx (retired_at, uploaded_at)
+);
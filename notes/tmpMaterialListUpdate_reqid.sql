@@ -0,0 +1,8 @@
+-- WICS_tmpmateriallistupdate.reqid: the MM60 update (Update Material List from SAP) a staging row belongs to -
+-- its async_comm reqid.  Every phase of an update reads, writes and clears only its own rows, so two
+-- updates (or a re-run after a browser refresh) no longer wipe out each other's staging data.
+-- Rows left by updates that never finished are purged when the next update starts (see
+-- proc_MatlListSAPSprsheet_99_PurgeAbandoned and MM60_STAGING_MAXAGE_SECS); rows from before this
+-- column existed have reqid NULL and go with the first purge.
+ALTER TABLE WICS_tmpmateriallistupdate ADD COLUMN reqid VARCHAR(255) NULL;
+CREATE INDEX WICS_tmpmat_reqid_idx ON WICS_tmpmateriallistupdate (reqid, recStatus);
@@ -0,0 +1,4 @@
+"""Shared (non-view) procs used by several WICS views.
+
+Each module here is imported directly, e.g. ``from procs.sprsht_ingest import SprshtIngest``.
+"""
@@ -0,0 +1,193 @@
+"""
+Count Summary report engine.
+
+The day's counts and the day's schedule (each joined to VIEW_materials) are read with one
+query apiece; the Scheduled+Counted / UnScheduled / Scheduled-not-Counted sections for every
+org are then built in Python.  The raw rows carry the same fields, under the same names, as the
+per-org raw SQL fnCountSummaryRpt used to run, so CreateOutputRows is unchanged.
+
+fnCountTotals gives a material's counted total per CountDate, SUMmed by the database from
+the persisted ActualCounts.CTD_QTY_Eval.
+"""
+from types import SimpleNamespace
+
+from sqlalchemy import select, table, column, not_, func, case
+
+from database import app_db
+from models import Organizations, ActualCounts, CountSchedule
+from procs.ctdqty import ctdqty_value, ctdqty_from_persisted
+
+
+# the VIEW_materials columns the report uses
+VIEW_materials = table('VIEW_materials',
+    column('id'), column('org_id'), column('OrgName'),
+    column('Material_org'), column('PartType'), column('Description'),
+    column('TypicalContainerQty'), column('TypicalPalletQty'), column('Notes'),
+    )
+
+def _mtl_fields():
+    mtl = VIEW_materials.c
+    return [
+        mtl.id.label('matl_id'), mtl.org_id, mtl.OrgName,
+        mtl.Material_org.label('Matl_PartNum'), mtl.PartType,
+        mtl.Description, mtl.TypicalContainerQty, mtl.TypicalPalletQty, mtl.Notes.label('mtl_Notes'),
+        ]
+
+_cs_fields = ('cs_id', 'cs_CountDate', 'cs_Counter', 'cs_Priority', 'cs_ReasonScheduled', 'Requestor', 'RequestFilled', 'cs_Notes')
+_ac_fields = ('ac_id', 'ac_CountDate', 'ac_CycCtID', 'ac_Counter', 'ac_LocationOnly', 'ac_CTD_QTY_Expr', 'ac_CTD_QTY_Eval',
+    'ac_LOCATION', 'ac_PKGID_Desc', 'ac_TAGQTY', 'FLAG_PossiblyNotRecieved', 'FLAG_MovementDuringCount', 'ac_Notes')
+
+def fnCountSummaryCounts(CountDate) -> list[dict]:
+    """the day's (not LocationOnly) ActualCounts, with their VIEW_materials fields"""
+    stmt = (
+        select(
+            ActualCounts.id.label('ac_id'), ActualCounts.CountDate.label('ac_CountDate'),
+            ActualCounts.CycCtID.label('ac_CycCtID'), ActualCounts.Counter.label('ac_Counter'),
+            ActualCounts.LocationOnly.label('ac_LocationOnly'), ActualCounts.CTD_QTY_Expr.label('ac_CTD_QTY_Expr'),
+            ActualCounts.CTD_QTY_Eval.label('ac_CTD_QTY_Eval'),
+            ActualCounts.LOCATION.label('ac_LOCATION'), ActualCounts.PKGID_Desc.label('ac_PKGID_Desc'),
+            ActualCounts.TAGQTY.label('ac_TAGQTY'),
+            ActualCounts.FLAG_PossiblyNotRecieved, ActualCounts.FLAG_MovementDuringCount,
+            ActualCounts.Notes.label('ac_Notes'),
+            *_mtl_fields(),
+            )
+        .join(VIEW_materials, ActualCounts.Material_id == VIEW_materials.c.id)
+        .where(ActualCounts.CountDate == CountDate, not_(ActualCounts.LocationOnly))
+        .order_by(ActualCounts.id)
+        )
+    return [dict(r) for r in app_db.session.execute(stmt).mappings()]
+
+def fnCountSummarySchedule(CountDate) -> list[dict]:
+    """the day's CountSchedule, with their VIEW_materials fields"""
+    stmt = (
+        select(
+            CountSchedule.id.label('cs_id'), CountSchedule.CountDate.label('cs_CountDate'),
+            CountSchedule.Counter.label('cs_Counter'), CountSchedule.Priority.label('cs_Priority'),
+            CountSchedule.ReasonScheduled.label('cs_ReasonScheduled'),
+            CountSchedule.Requestor, CountSchedule.RequestFilled,
+            CountSchedule.Notes.label('cs_Notes'),
+            *_mtl_fields(),
+            )
+        .join(VIEW_materials, CountSchedule.Material_id == VIEW_materials.c.id)
+        .where(CountSchedule.CountDate == CountDate)
+        .order_by(CountSchedule.id)
+        )
+    return [dict(r) for r in app_db.session.execute(stmt).mappings()]
+
+def _rawrow(cs:dict|None, ac:dict|None) -> SimpleNamespace:
+    rec = dict(cs or ac)    # type: ignore[arg-type]    # the VIEW_materials fields are the same in both
+    if cs is None: rec.update(dict.fromkeys(_cs_fields))
+    if ac is None: rec.update(dict.fromkeys(_ac_fields))
+    if ac is not None: rec.update({f: ac[f] for f in _ac_fields})
+    return SimpleNamespace(**rec)
+
+def _matl_order(rawrow):
+    # ORDER BY Matl_PartNum (MySQL compares case-insensitively); matl_id keeps each material's rows together
+    return ((rawrow.Matl_PartNum or '').casefold(), rawrow.matl_id)
+
+def fnCountSummarySections(CountDate, Rptvariation=None) -> list[dict]:
+    """
+    the Count Summary sections, in report order:
+        [{'org': Organizations, 'Title': str, 'rawrows': [...], 'Eval_CTDQTY': bool}, ...]
+    for each org (by orgname): Scheduled and Counted, UnScheduled (not for Rptvariation 'REQ'),
+    Scheduled but Not Counted.  For 'REQ', only schedule records with a Requestor are used.
+    rawrows are ordered by Matl_PartNum, as before
+    """
+    counts = fnCountSummaryCounts(CountDate)
+    schedule = fnCountSummarySchedule(CountDate)
+    if Rptvariation == 'REQ':
+        reqschedule = [cs for cs in schedule if cs['Requestor'] is not None]
+    else:
+        reqschedule = schedule
+
+    counts_by_matl:dict[int, list[dict]] = {}
+    for ac in counts:
+        counts_by_matl.setdefault(ac['matl_id'], []).append(ac)
+    scheduled_matls = {cs['matl_id'] for cs in schedule}
+
+    # (org_id, section) -> rawrows
+    A_Sched_Ctd, B_UnSched_Ctd, C_Sched_NotCtd = 'A', 'B', 'C'
+    buckets:dict[tuple[int, str], list] = {}
+    for cs in reqschedule:
+        matlcounts = counts_by_matl.get(cs['matl_id'])
+        if matlcounts:
+            for ac in matlcounts:
+                buckets.setdefault((cs['org_id'], A_Sched_Ctd), []).append(_rawrow(cs, ac))
+        else:
+            buckets.setdefault((cs['org_id'], C_Sched_NotCtd), []).append(_rawrow(cs, None))
+    # endfor cs
+    if Rptvariation is None:
+        for ac in counts:
+            if ac['matl_id'] not in scheduled_matls:
+                buckets.setdefault((ac['org_id'], B_UnSched_Ctd), []).append(_rawrow(None, ac))
+    # endif Rptvariation
+    for rawrows in buckets.values():
+        rawrows.sort(key=_matl_order)
+
+    sections = []
+    stmt = select(Organizations).order_by(Organizations.orgname)
+    for org in app_db.session.execute(stmt).scalars():
+        sections.append({
+            'org': org,
+            'Title': 'Requested and Counted' if Rptvariation == 'REQ' else 'Scheduled and Counted',
+            'rawrows': buckets.get((org.id, A_Sched_Ctd), []),
+            'Eval_CTDQTY': True,
+            })
+        if Rptvariation is None:
+            sections.append({
+                'org': org,
+                'Title': 'UnScheduled',
+                'rawrows': buckets.get((org.id, B_UnSched_Ctd), []),
+                'Eval_CTDQTY': True,
+                })
+        sections.append({
+            'org': org,
+            'Title': 'Requested but Not Counted' if Rptvariation == 'REQ' else 'Scheduled but Not Counted',
+            'rawrows': buckets.get((org.id, C_Sched_NotCtd), []),
+            'Eval_CTDQTY': False,
+            })
+    # endfor org
+
+    return sections
+# fnCountSummarySections
+
+
+def fnCountTotals(Material_id:int, CountDate=None) -> list[dict]:
+    """
+    a material's counted total for each CountDate (LocationOnly counts left out), by CountDate:
+        [{'CountDate': date, 'CountQTY_Eval': number, 'nCounts': int}, ...]
+    The database SUMs CTD_QTY_Eval; only rows not evaluated yet (CTD_QTY_Invalid NULL - see
+    flask wics backfill-ctdqty) are read and evaluated here.  Invalid expressions count as 0
+    """
+    ac = ActualCounts
+    evaluated = ac.CTD_QTY_Invalid.is_not(None)
+    conds = [ac.Material_id == Material_id, not_(ac.LocationOnly)]
+    if CountDate is not None:
+        conds.append(ac.CountDate == CountDate)
+    stmt = (
+        select(
+            ac.CountDate,
+            func.sum(case((evaluated, ac.CTD_QTY_Eval))).label('CountQTY_Eval'),
+            func.count().label('nCounts'),
+            func.sum(case((evaluated, 0), else_=1)).label('nUnevaluated'),
+            )
+        .where(*conds)
+        .group_by(ac.CountDate)
+        .order_by(ac.CountDate)
+        )
+    totals = [dict(r) for r in app_db.session.execute(stmt).mappings()]
+
+    if any(t['nUnevaluated'] for t in totals):
+        stmt = select(ac.CountDate, ac.CTD_QTY_Expr).where(*conds, ac.CTD_QTY_Invalid.is_(None))
+        unevaluated:dict = {}
+        for r in app_db.session.execute(stmt):
+            unevaluated[r.CountDate] = unevaluated.get(r.CountDate, 0) + (ctdqty_value(r.CTD_QTY_Expr) or 0)
+        for t in totals:
+            t['CountQTY_Eval'] = (t['CountQTY_Eval'] or 0) + unevaluated.get(t['CountDate'], 0)
+    # endif unevaluated rows
+
+    for t in totals:
+        t['CountQTY_Eval'] = ctdqty_from_persisted(t['CountQTY_Eval'] or 0)
+        del t['nUnevaluated']
+    return totals
+# fnCountTotals
@@ -0,0 +1,85 @@
+"""
+CTD_QTY_Expr evaluation for WICS.
+
+Counted quantities are stored as arithmetic expressions ("48*12+7"), and the same strings
+turn up again and again.  Results are memoized in a bounded LRU cache keyed on the
+expression string.  An invalid expression is cached too (as its error's class and args),
+and raises a new error like it each time; any other exception is not cached.
+
+    evaluate(expr)          drop-in for calvincTools.mathexpr_parser.evaluate (raises on a bad expression)
+    eval_arith(expr)        drop-in for calvincTools.mathexpr_parser.eval_arith ("-- INVALID --" on a bad expression)
+    evaluate_many(exprs)    a list of results; invalid (or empty) expressions give `invalid`
+    ctdqty_value(expr)      the number to persist in ActualCounts.CTD_QTY_Eval (None if empty or invalid)
+    ctdqty_fields(expr)     {'CTD_QTY_Eval': ..., 'CTD_QTY_Invalid': ...} to persist for an expression
+    ctdqty_from_persisted(v)    a persisted CTD_QTY_Eval back as the number evaluate would give
+    cache_stats()           hits, misses, currsize, maxsize
+"""
+from functools import lru_cache
+from typing import Any, Iterable
+
+from calvincTools.mathexpr_parser import evaluate as _parse_and_evaluate
+
+
+CTDQTY_CACHE_MAXSIZE = 8192
+CTDQTY_INVALID = "-- INVALID --"
+# what eval_arith has always treated as "not a valid expression"
+_invalid_expr_errors = (SyntaxError, NameError, TypeError, ZeroDivisionError)
+
+@lru_cache(maxsize=CTDQTY_CACHE_MAXSIZE)
+def _evaluate_cached(expr:str) -> tuple[bool, Any]:
+    """(True, value), or (False, (error class, args)) for an invalid expression; anything else raises, uncached"""
+    try:
+        return True, _parse_and_evaluate(expr)
+    except _invalid_expr_errors as e:
+        return False, (type(e), e.args)
+# _evaluate_cached
+
+def evaluate(expr) -> Any:
+    ok, val = _evaluate_cached(str(expr))
+    if not ok:
+        errclass, args = val
+        raise errclass(*args)
+    return val
+
+def eval_arith(expr) -> Any:
+    ok, val = _evaluate_cached(str(expr))
+    return val if ok else CTDQTY_INVALID
+
+def evaluate_many(exprs:Iterable, invalid:Any = None) -> list:
+    """evaluate a batch of expressions; each distinct string is parsed at most once"""
+    results = []
+    for expr in exprs:
+        if expr is None or str(expr).strip() == '':
+            results.append(invalid)
+            continue
+        ok, val = _evaluate_cached(str(expr))
+        results.append(val if ok else invalid)
+    # endfor expr
+    return results
+
+def ctdqty_value(expr) -> float|None:
+    """the numeric value of a CTD_QTY_Expr, or None if it is empty or does not evaluate to a number"""
+    val = evaluate_many([expr])[0]
+    if val is None or isinstance(val, (bool, str)):
+        return None
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+def ctdqty_fields(expr) -> dict[str, Any]:
+    """the persisted evaluation of a CTD_QTY_Expr: CTD_QTY_Invalid is 1 when there is an expression but it has no numeric value"""
+    val = ctdqty_value(expr)
+    blank = expr is None or str(expr).strip() == ''
+    return {'CTD_QTY_Eval': val, 'CTD_QTY_Invalid': int(val is None and not blank)}
+
+def ctdqty_from_persisted(val:float) -> int|float:
+    """a persisted CTD_QTY_Eval as the number to show/total (whole numbers come back as int, as evaluate gives them)"""
+    return int(val) if float(val).is_integer() else val
+
+def cache_stats() -> dict[str, int]:
+    info = _evaluate_cached.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'currsize': info.currsize, 'maxsize': info.maxsize or 0}
+
+def cache_clear() -> None:
+    _evaluate_cached.cache_clear()
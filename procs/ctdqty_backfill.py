@@ -0,0 +1,63 @@
+"""
+Backfill of ActualCounts.CTD_QTY_Eval / CTD_QTY_Invalid for rows written before those columns existed.
+
+Rows are taken in id order, a chunk at a time, and each chunk is written with one executemany
+UPDATE and committed on its own.  A row still to do has CTD_QTY_Invalid NULL, so an interrupted
+run simply picks up where it stopped when it is run again.  recompute=True re-evaluates every row
+(e.g. after a change to the expression parser); restart that from the last id it reported with from_id.
+
+    flask wics backfill-ctdqty [--chunksize N] [--recompute] [--from-id ID]
+"""
+from typing import Callable
+
+from flask import current_app
+from sqlalchemy import select, update, func
+
+from database import app_db
+from models import ActualCounts
+from procs.ctdqty import ctdqty_fields
+
+
+def fnCTDQTY_BackfillRemaining() -> int:
+    """ActualCounts rows not evaluated yet"""
+    stmt = select(func.count()).select_from(ActualCounts).where(ActualCounts.CTD_QTY_Invalid.is_(None))
+    return app_db.session.execute(stmt).scalar_one()
+
+def proc_CTDQTY_Backfill(chunksize:int|None = None, recompute:bool = False, from_id:int = 0,
+        progress:Callable[[int, int], None]|None = None) -> int:
+    """
+    evaluate and store CTD_QTY_Eval / CTD_QTY_Invalid, chunksize rows per transaction.
+    progress(rows_done, last_id) is called after each chunk is committed.  Returns rows_done
+    """
+    if chunksize is None:
+        chunksize = int(current_app.config.get('CTDQTY_BACKFILL_CHUNKSIZE', 5000))
+    chunksize = max(1, int(chunksize))
+
+    rows_done = 0
+    last_id = from_id
+    while True:
+        stmt = (
+            select(ActualCounts.id, ActualCounts.CTD_QTY_Expr)
+            .where(ActualCounts.id > last_id)
+            .order_by(ActualCounts.id)
+            .limit(chunksize)
+            )
+        if not recompute:
+            stmt = stmt.where(ActualCounts.CTD_QTY_Invalid.is_(None))
+        chunk = app_db.session.execute(stmt).all()
+        if not chunk:
+            break
+
+        updts = [{'id': r.id, **ctdqty_fields(r.CTD_QTY_Expr)} for r in chunk]
+        # bulk UPDATE by primary key - bypasses the ORM events, which would compute the same values
+        app_db.session.execute(update(ActualCounts), updts)
+        app_db.session.commit()
+
+        rows_done += len(chunk)
+        last_id = chunk[-1].id
+        if progress:
+            progress(rows_done, last_id)
+    # endwhile chunk
+
+    return rows_done
+# proc_CTDQTY_Backfill
@@ -0,0 +1,98 @@
+"""
+Commit-time notice of Material changes, for the in-memory Material search index (procs.matlsearch).
+
+Session events note which materials a transaction touched - MaterialList rows, and the materials
+whose MfrPNtoMaterial rows changed - and, once it commits, every subscriber is called with those
+Material ids.  It is called with None ("anything may have changed") when:
+    - Organizations rows change (every label carries the orgname)
+    - bulk INSERT/UPDATE/DELETE statements on these tables run through the session (except an ORM bulk
+      UPDATE of MaterialList by primary key - update(MaterialList) with a list of {'id': ..., ...} - which names its ids)
+    - notify_material_changes(None) is called - e.g. by the MM60 update pipeline, whose raw SQL no event sees
+
+Changes made in another process are not seen here at all; subscribers compare
+material_tables_signature() now and then to catch those.
+"""
+from typing import Callable
+
+from sqlalchemy import select, func, event, inspect
+from sqlalchemy.orm import Session
+
+from database import app_db
+from models import MaterialList, Organizations, MfrPNtoMaterial
+
+
+_subscribers:list[Callable[[set[int]|None], None]] = []
+
+def on_material_changes(fn:Callable[[set[int]|None], None]):
+    """decorator: fn(ids) is called after each commit that changed materials (ids is None if it can't say which)"""
+    _subscribers.append(fn)
+    return fn
+
+def notify_material_changes(ids:set[int]|None = None) -> None:
+    for fn in _subscribers:
+        fn(ids)
+
+def material_tables_signature() -> tuple:
+    """(COUNT, MAX(id)) of MaterialList, Organizations and MfrPNtoMaterial - changes when rows are added or removed"""
+    cols = []
+    for model in (MaterialList, Organizations, MfrPNtoMaterial):
+        cols.append(select(func.count()).select_from(model).scalar_subquery())
+        cols.append(select(func.max(model.id)).scalar_subquery())
+    return tuple(app_db.session.execute(select(*cols)).one())
+
+
+##########  session events
+
+_INFOKEY = 'material_changes'       # session.info[_INFOKEY]: set of Material ids, or None for "everything"
+_watched_tablenames = {MaterialList.__tablename__, Organizations.__tablename__, MfrPNtoMaterial.__tablename__}
+
+def _note_changes(session, ids:set[int]|None) -> None:
+    if ids is None:
+        session.info[_INFOKEY] = None
+    elif session.info.get(_INFOKEY, set()) is not None:
+        session.info.setdefault(_INFOKEY, set()).update(ids)
+
+@event.listens_for(Session, 'after_flush')
+def _matlchanges_after_flush(session, flush_context):
+    ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Organizations):
+            _note_changes(session, None)
+            return
+        elif isinstance(obj, MaterialList):
+            ids.add(obj.id)
+        elif isinstance(obj, MfrPNtoMaterial):
+            ids.add(obj.Material_id)
+            # an MfrPN moved to another material changes the old one, too
+            ids.update(inspect(obj).attrs.Material_id.history.deleted or ())
+    # endfor obj
+    ids.discard(None)
+    if ids:
+        _note_changes(session, ids)
+
+def _bulk_update_ids(orm_execute_state) -> set[int]|None:
+    """the ids of an ORM bulk UPDATE of MaterialList by primary key; None for any other statement"""
+    stmt = orm_execute_state.statement
+    params = orm_execute_state.parameters
+    if not (orm_execute_state.is_update and stmt.table.name == MaterialList.__tablename__ and stmt.whereclause is None):
+        return None
+    if not isinstance(params, list) or not params or not all('id' in p for p in params):
+        return None
+    return {p['id'] for p in params}
+
+@event.listens_for(Session, 'do_orm_execute')
+def _matlchanges_orm_execute(orm_execute_state):
+    # bulk INSERT/UPDATE/DELETE statements run through the session (ORM or Core table) never reach after_flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        tbl = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(tbl, 'name', None) in _watched_tablenames:
+            _note_changes(orm_execute_state.session, _bulk_update_ids(orm_execute_state))
+
+@event.listens_for(Session, 'after_commit')
+def _matlchanges_after_commit(session):
+    if _INFOKEY in session.info:
+        notify_material_changes(session.info.pop(_INFOKEY))
+
+@event.listens_for(Session, 'after_rollback')
+def _matlchanges_after_rollback(session):
+    session.info.pop(_INFOKEY, None)
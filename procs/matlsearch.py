@@ -0,0 +1,224 @@
+"""
+In-memory typeahead index over MaterialList.Material, Description and MfrPNtoMaterial.MfrPN.
+
+    search_materials(q, limit)      the best `limit` matches for q, as [{'id', 'Material_org', 'Description'}, ...]
+
+Matches are ranked:
+    0   q is the whole "Material:orgname" label, or the whole Material number
+    1   Material number starts with q
+    2   an MfrPN starts with q
+    3   q appears anywhere in the label, the Description or an MfrPN
+and by Material number within a rank.  Ranks 0-2 are bisects into sorted key lists.  Rank 3 runs
+str.find over one lowercased "haystack" string, a line per material; it is only done for q of
+at least MATLSEARCH_MIN_SUBSTR characters, and stops as soon as it has enough matches.
+
+The index is built with two column queries.  After a commit that changed some materials
+(procs.matlchanges), only those are re-read and patched in; the haystack is re-joined on the
+next substring search.  A change it can't attribute to particular materials - and, checked at
+most every MATLCHOICE_RECHECK_SECS, a change in the material tables' signature (another
+process) - rebuilds the whole index.
+"""
+import bisect, threading, time
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import app_db
+from models import MaterialList, Organizations, MfrPNtoMaterial
+from procs.matlchanges import on_material_changes, material_tables_signature
+
+
+RANK_EXACT, RANK_MATLPREFIX, RANK_MFRPNPREFIX, RANK_SUBSTR = 0, 1, 2, 3
+
+class _MatlEntry:
+    __slots__ = ('id', 'Material', 'Material_org', 'Description', 'MfrPNs', 'hay')
+
+    def __init__(self, id:int, Material:str, orgname:str, Description:str|None):
+        self.id = id
+        self.Material = Material
+        self.Material_org = f'{Material}:{orgname}'
+        self.Description = Description or ''
+        self.MfrPNs:list[str] = []
+        self.hay = ''
+
+    def set_hay(self) -> None:
+        # this material's haystack line; tab-separated, so a match can't run from one field into the next
+        self.hay = '\t'.join(_searchkey(f) for f in (self.Material_org, self.Description, *self.MfrPNs))
+
+    def as_result(self) -> dict:
+        return {'id': self.id, 'Material_org': self.Material_org, 'Description': self.Description}
+# _MatlEntry
+
+def _searchkey(s:str) -> str:
+    # lowercase, runs of whitespace as one space
+    s = s.lower().strip()
+    if '  ' in s or '\t' in s or '\n' in s or '\r' in s:
+        s = ' '.join(s.split())
+    return s
+
+def _read_entries(ids:set[int]|None = None) -> dict[int, _MatlEntry]:
+    """the _MatlEntry's of materials ids (None: all of them)"""
+    stmt = (
+        select(MaterialList.id, MaterialList.Material, Organizations.orgname, MaterialList.Description)
+        .join(Organizations, MaterialList.org_id == Organizations.id)
+        )
+    mfrstmt = select(MfrPNtoMaterial.Material_id, MfrPNtoMaterial.MfrPN).order_by(MfrPNtoMaterial.MfrPN)
+    if ids is not None:
+        stmt = stmt.where(MaterialList.id.in_(ids))
+        mfrstmt = mfrstmt.where(MfrPNtoMaterial.Material_id.in_(ids))
+    entries = {id: _MatlEntry(id, Material, orgname, Description) for id, Material, orgname, Description in app_db.session.execute(stmt)}
+    for Material_id, MfrPN in app_db.session.execute(mfrstmt):
+        if Material_id in entries:
+            entries[Material_id].MfrPNs.append(MfrPN)
+    for e in entries.values():
+        e.set_hay()
+    return entries
+
+
+class MaterialSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries:dict[int, _MatlEntry] = {}
+        self._labels:dict[str, int] = {}                # search key of Material_org -> id
+        self._matlkeys:list[tuple[str, int]] = []       # (lowercased Material, id), sorted
+        self._mfrkeys:list[tuple[str, int]] = []        # (lowercased MfrPN, id), sorted
+        self._haystack:str|None = None                  # one hay line per material, Material order; None = join before use
+        self._linestarts:list[int] = []
+        self._lineids:list[int] = []
+        self._built = False
+        self._pending:set[int]|None = set()             # Material ids changed since the last update; None = rebuild
+        self._signature:tuple = ()
+        self._checked_at = 0.0
+
+    def changed(self, ids:set[int]|None) -> None:
+        with self._lock:
+            if ids is None or self._pending is None:
+                self._pending = None
+            else:
+                self._pending.update(ids)
+
+    def _rebuild(self) -> None:
+        self._signature = material_tables_signature()
+        self._entries = _read_entries()
+        self._labels = {_searchkey(e.Material_org): e.id for e in self._entries.values()}
+        self._matlkeys = sorted((_searchkey(e.Material), e.id) for e in self._entries.values())
+        self._mfrkeys = sorted((_searchkey(p), e.id) for e in self._entries.values() for p in e.MfrPNs)
+        self._haystack = None
+        self._built = True
+        self._pending = set()
+
+    def _patch(self, ids:set[int]) -> None:
+        """re-read materials ids, and put them back in the key lists"""
+        def unlist(keys, key):
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+        fresh = _read_entries(ids)
+        for id in ids:
+            old = self._entries.pop(id, None)
+            if old is None:
+                continue
+            if self._labels.get(_searchkey(old.Material_org)) == id:
+                del self._labels[_searchkey(old.Material_org)]
+            unlist(self._matlkeys, (_searchkey(old.Material), id))
+            for p in old.MfrPNs:
+                unlist(self._mfrkeys, (_searchkey(p), id))
+        # endfor id
+        for e in fresh.values():
+            self._entries[e.id] = e
+            self._labels[_searchkey(e.Material_org)] = e.id
+            bisect.insort(self._matlkeys, (_searchkey(e.Material), e.id))
+            for p in e.MfrPNs:
+                bisect.insort(self._mfrkeys, (_searchkey(p), e.id))
+        # endfor e
+        self._haystack = None
+        self._pending = set()
+
+    def _current(self) -> None:
+        """bring the index up to date (caller holds the lock)"""
+        recheck = float(current_app.config.get('MATLCHOICE_RECHECK_SECS', 30))
+        now = time.monotonic()
+        if self._built and self._pending is not None and now - self._checked_at >= recheck:
+            if material_tables_signature() != self._signature:
+                self._pending = None
+            self._checked_at = now
+        if not self._built or self._pending is None:
+            self._rebuild()
+            self._checked_at = now
+        elif self._pending:
+            self._patch(self._pending)
+    # _current
+
+    def _join_haystack(self) -> None:
+        ordered = [self._entries[id] for _, id in self._matlkeys]
+        lines = [e.hay for e in ordered]
+        self._haystack = '\n'.join(lines)
+        self._linestarts = list(accumulate((len(line) + 1 for line in lines), initial=0))[:-1]
+        self._lineids = [e.id for e in ordered]
+
+    def search(self, q:str, limit:int = 25, min_substr:int = 2) -> list[dict]:
+        qk = _searchkey(q or '')
+        if not qk or limit <= 0:
+            return []
+
+        found:dict[int, int] = {}       # id -> rank
+        def add(id, rank) -> bool:
+            if id not in found:
+                found[id] = rank
+            return len(found) >= limit
+
+        # a search takes a few ms; holding the lock for it keeps every structure from the same state
+        with self._lock:
+            self._current()
+            self._search(qk, add, min_substr)
+            return self._results(found)
+    # search
+
+    def _search(self, qk:str, add, min_substr:int) -> bool:
+        """add() matches, best first; True once add() says there are enough"""
+        if qk in self._labels and add(self._labels[qk], RANK_EXACT):
+            return True
+        for rank, keys, exact_too in ((RANK_MATLPREFIX, self._matlkeys, True), (RANK_MFRPNPREFIX, self._mfrkeys, False)):
+            i = bisect.bisect_left(keys, (qk,))
+            while i < len(keys) and keys[i][0].startswith(qk):
+                key, id = keys[i]
+                if add(id, RANK_EXACT if exact_too and key == qk else rank):
+                    return True
+                i += 1
+        # endfor prefix lists
+
+        if len(qk) >= min_substr:
+            if self._haystack is None:
+                self._join_haystack()
+            haystack, linestarts, lineids = self._haystack, self._linestarts, self._lineids
+            pos = haystack.find(qk)
+            while pos >= 0:
+                line = bisect.bisect_right(linestarts, pos) - 1
+                if add(lineids[line], RANK_SUBSTR):
+                    return True
+                if line + 1 >= len(linestarts):
+                    break
+                pos = haystack.find(qk, linestarts[line + 1])
+        # endif substring search
+        return False
+    # _search
+
+    def _results(self, found:dict[int, int]) -> list[dict]:
+        # ids went in rank by rank, in Material order - except exact Material matches, which turn up
+        # during the prefix walk; a stable sort on rank moves those to the front
+        ordered = sorted(found.items(), key=lambda f: f[1])
+        return [self._entries[id].as_result() for id, _ in ordered]
+# MaterialSearchIndex
+
+_matlsearch_index = MaterialSearchIndex()
+
+def search_materials(q:str, limit:int|None = None) -> list[dict]:
+    if limit is None:
+        limit = int(current_app.config.get('MATLSEARCH_LIMIT', 25))
+    min_substr = int(current_app.config.get('MATLSEARCH_MIN_SUBSTR', 2))
+    return _matlsearch_index.search(q, limit=limit, min_substr=min_substr)
+
+@on_material_changes
+def _matlsearch_changed(ids):
+    _matlsearch_index.changed(ids)
@@ -0,0 +1,131 @@
+"""
+Report downloads (spreadsheets), built when they're asked for, from a row generator, and kept a while in
+SAP_FILELOC/tmpdl.
+
+Rows are written as they're produced - openpyxl's write-only workbook for xlsx, csv.writer for csv - so
+memory doesn't grow with the report.  A csv is sent while it's written; an xlsx (a zip) once it's saved.
+The finished file is kept as tmpdl/<report> <key ...>.<fmt>, and sent again for the same report, key and
+format until it is RPTEXPORT_TTL_SECS old.  Each export purges tmpdl of files older than that.
+
+    fnReportExport(report, key, header, rows_fn, fmt)   the download (a Response); rows_fn() is only called if there's no cached file
+    report_export_dir()                                 SAP_FILELOC/tmpdl, created if need be
+    purge_report_exports(maxAge=None)                   delete tmpdl files older than maxAge (default RPTEXPORT_TTL_SECS) secs; returns how many
+"""
+import csv, io, os, re as regex, tempfile, time
+from itertools import chain
+from typing import Any, Callable, Iterable, Sequence
+
+from flask import current_app, Response, send_file, stream_with_context
+from openpyxl import Workbook
+
+
+REPORT_EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    }
+_CSV_CHUNK = 64 * 1024      # csv characters per piece sent
+
+def report_export_dir() -> str:
+    svdir = os.path.join(current_app.config.get('SAP_FILELOC', os.getcwd()), 'tmpdl')
+    os.makedirs(svdir, exist_ok=True)
+    return svdir
+
+def _export_ttl() -> float:
+    return float(current_app.config.get('RPTEXPORT_TTL_SECS', 600))
+
+def purge_report_exports(maxAge:float|None = None) -> int:
+    cutoff = time.time() - (_export_ttl() if maxAge is None else maxAge)
+    nDeleted = 0
+    with os.scandir(report_export_dir()) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    nDeleted += 1
+            except OSError:
+                pass        # gone already (another request purged it), or still open (Windows)
+        # endfor entry
+    return nDeleted
+# purge_report_exports
+
+def report_export_name(report:str, key:Sequence, fmt:str) -> str:
+    """the file name for (report, key, fmt): report and the key's parts (None and '' left out), space-separated"""
+    name = ' '.join([report, *(str(k) for k in key if k not in (None, ''))])
+    return regex.sub(r'[^\w\-. ]', '_', name, flags=regex.ASCII) + '.' + fmt
+
+def _write_xlsx(fName:str, header:Sequence[str], rows:Iterable[Sequence[Any]]) -> None:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    wb.save(fName)
+
+def _stream_csv(partName:str, fName:str, header:Sequence[str], rows:Iterable[Sequence[Any]]):
+    """yield the csv a piece at a time, writing it to partName as well; it becomes fName once it's all sent"""
+    buf = io.StringIO()
+    buf.write('\ufeff')     # the BOM tells Excel it's UTF-8
+    wrtr = csv.writer(buf)
+    try:
+        with open(partName, 'w', encoding='utf-8', newline='') as f:
+            for row in chain([header], rows):
+                wrtr.writerow(row)
+                if buf.tell() >= _CSV_CHUNK:
+                    piece = buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+                    f.write(piece)
+                    yield piece
+            # endfor row
+            piece = buf.getvalue()
+            f.write(piece)
+        # endwith f
+        os.replace(partName, fName)
+    except BaseException:
+        # the client went away, or the rows failed - don't keep half a file
+        if os.path.exists(partName):
+            os.remove(partName)
+        raise
+    yield piece
+# _stream_csv
+
+def fnReportExport(report:str, key:Sequence, header:Sequence[str], rows_fn:Callable[[], Iterable[Sequence[Any]]],
+        fmt:str = 'xlsx') -> Response:
+    """
+    the download of report (for key, e.g. (date, variation)) as fmt, one of REPORT_EXPORT_FORMATS.
+    header is the first row; rows_fn() gives the rest.  Raises ValueError for an unknown format
+    """
+    if fmt not in REPORT_EXPORT_FORMATS:
+        raise ValueError(f'unknown format {fmt!r}; one of {", ".join(REPORT_EXPORT_FORMATS)}')
+    mimetype = REPORT_EXPORT_FORMATS[fmt]
+
+    purge_report_exports()
+    svdir = report_export_dir()
+    dlName = report_export_name(report, key, fmt)
+    fName = os.path.join(svdir, dlName)
+    try:
+        # opened before it's sent, so a purge by another request can't pull it away
+        cached = open(fName, 'rb') if os.stat(fName).st_mtime >= time.time() - _export_ttl() else None
+    except FileNotFoundError:
+        cached = None
+    if cached is not None:
+        return send_file(cached, mimetype=mimetype, as_attachment=True, download_name=dlName, max_age=0)
+
+    # built under a temporary name, so a request for the same file meanwhile doesn't see half of it
+    fd, partName = tempfile.mkstemp(dir=svdir, prefix='.', suffix=f'.{fmt}.part')
+    os.close(fd)
+    if fmt == 'csv':
+        resp = Response(stream_with_context(_stream_csv(partName, fName, header, rows_fn())), mimetype=mimetype)
+        resp.headers['Content-Disposition'] = f'attachment; filename="{dlName}"'
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+
+    try:
+        _write_xlsx(partName, header, rows_fn())
+        os.replace(partName, fName)
+    except BaseException:
+        if os.path.exists(partName):
+            os.remove(partName)
+        raise
+    return send_file(fName, mimetype=mimetype, as_attachment=True, download_name=dlName, max_age=0)
+# fnReportExport
@@ -0,0 +1,108 @@
+"""
+App-wide cache of the SAP stock-on-hand snapshot dates (WICS_sap_sohsnapshots), oldest first, so "the SAP
+snapshot for date D" is a bisect instead of a query.
+
+The list is read with one column query, and kept until it is invalidated:
+    - after a commit that added or removed snapshots (session events, below - an SAP upload, the history conversion)
+    - when the snapshots' (COUNT, MAX(uploaded_at)) signature changes - checked at most every SAPDATES_RECHECK_SECS,
+      which catches an upload committed by another process (e.g. a huey worker)
+
+    SAP_dates()                 the snapshot dates, oldest first (a tuple)
+    nearest_SAP_date(D)         the last snapshot date <= D; the first one if D is before them all, None if there are none
+    SAP_date_exists(D)          whether there's a snapshot for D
+    invalidate_SAP_dates()      drop the cached list; it is read again on next use
+"""
+import bisect, datetime, threading, time
+
+from flask import current_app
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+
+from database import app_db
+from models import SAP_SOHSnapshot
+
+
+def SAP_dates_signature() -> tuple:
+    """(COUNT, MAX(uploaded_at)) of the snapshots - changes when one is added or removed"""
+    return tuple(app_db.session.execute(select(func.count(), func.max(SAP_SOHSnapshot.uploaded_at))).one())
+
+class SAPDateCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0           # bumped by invalidate()
+        self._built_version = -1
+        self._dates:tuple[datetime.date, ...] = ()
+        self._signature:tuple = ()
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+
+    def get(self) -> tuple[datetime.date, ...]:
+        recheck = float(current_app.config.get('SAPDATES_RECHECK_SECS', 5))
+        with self._lock:
+            now = time.monotonic()
+            if self._built_version == self._version:
+                if now - self._checked_at < recheck:
+                    return self._dates
+                signature = SAP_dates_signature()
+                self._checked_at = now
+                if signature == self._signature:
+                    return self._dates
+            else:
+                signature = SAP_dates_signature()
+            # endif list current
+
+            self._dates = tuple(app_db.session.scalars(select(SAP_SOHSnapshot.uploaded_at).order_by(SAP_SOHSnapshot.uploaded_at)))
+            self._signature, self._built_version, self._checked_at = signature, self._version, now
+            return self._dates
+    # get
+# SAPDateCache
+
+_SAPdate_cache = SAPDateCache()
+
+def SAP_dates() -> tuple[datetime.date, ...]:
+    return _SAPdate_cache.get()
+
+def nearest_SAP_date(for_date:datetime.date) -> datetime.date|None:
+    dates = _SAPdate_cache.get()
+    if not dates:
+        return None
+    i = bisect.bisect_right(dates, for_date)
+    return dates[i-1] if i else dates[0]
+
+def SAP_date_exists(for_date:datetime.date) -> bool:
+    dates = _SAPdate_cache.get()
+    i = bisect.bisect_left(dates, for_date)
+    return i < len(dates) and dates[i] == for_date
+
+def invalidate_SAP_dates() -> None:
+    _SAPdate_cache.invalidate()
+
+
+##########  session events
+
+_INFOKEY = 'SAP_dates_changed'      # session.info[_INFOKEY]: set once a transaction adds or removes a snapshot
+
+@event.listens_for(Session, 'after_flush')
+def _sapdates_after_flush(session, flush_context):
+    if any(isinstance(obj, SAP_SOHSnapshot) for obj in (*session.new, *session.deleted)):
+        session.info[_INFOKEY] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _sapdates_orm_execute(orm_execute_state):
+    # bulk statements run through the session never reach after_flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        tbl = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(tbl, 'name', None) == SAP_SOHSnapshot.__tablename__:
+            orm_execute_state.session.info[_INFOKEY] = True
+
+@event.listens_for(Session, 'after_commit')
+def _sapdates_after_commit(session):
+    if session.info.pop(_INFOKEY, False):
+        invalidate_SAP_dates()
+
+@event.listens_for(Session, 'after_rollback')
+def _sapdates_after_rollback(session):
+    session.info.pop(_INFOKEY, None)
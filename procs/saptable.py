@@ -0,0 +1,104 @@
+"""
+Pages of an SAP stock-on-hand snapshot for the SAP table screen (views.SAP.procs_SAP.fnSAPTable_json).
+
+Rows are read with a column query (no ORM entities), filtered by Material (prefix), Plant and
+StorageLocation, sorted by one of SAPTABLE_SORTS, and paged by keyset: each page ends with a cursor
+holding its last row's sort key, and the next page starts after it - so page n costs the same as
+page 1, and lines don't shift between pages if the sort key ties (the line id breaks ties).
+
+    fnSAPTablePage(SAPDate, ...)    {'rows': [...], 'next': cursor or None[, 'nRows': lines matching the filters]}
+"""
+import base64, datetime, decimal, json
+from typing import Any
+
+from sqlalchemy import select, func, tuple_
+
+from database import app_db
+from models import SAP_SOHRecs, MaterialList, Organizations
+from procs.sohsnapshot import SOH_valid_on
+
+
+# sort name -> key columns (NULLs read as '' or 0, so a key compares cleanly); the line id is always added last
+_sloc = func.coalesce(SAP_SOHRecs.StorageLocation, '')
+SAPTABLE_SORTS = {
+    'material': (MaterialList.org_id, MaterialList.Material, _sloc),
+    'description': (func.coalesce(SAP_SOHRecs.Description, ''), MaterialList.Material, _sloc),
+    'plant': (func.coalesce(SAP_SOHRecs.Plant, ''), MaterialList.Material, _sloc),
+    'storageloc': (_sloc, MaterialList.org_id, MaterialList.Material),
+    'amount': (func.coalesce(SAP_SOHRecs.Amount, 0),),
+    'value': (func.coalesce(SAP_SOHRecs.ValueUnrestricted, 0),),
+    'blocked': (func.coalesce(SAP_SOHRecs.Blocked, 0),),
+}
+
+# the fields of a row, in the order they're sent
+SAPTABLE_FIELDS = ('id', 'orgname', 'Material', 'Description', 'Plant', 'StorageLocation',
+    'Amount', 'BaseUnitofMeasure', 'Currency', 'ValueUnrestricted', 'SpecialStock', 'Batch', 'Vendor',
+    'Blocked', 'ValueBlocked')
+
+def _jsonval(v:Any) -> Any:
+    return float(v) if isinstance(v, decimal.Decimal) else v.isoformat() if isinstance(v, datetime.date) else v
+
+def _encode_cursor(key:tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps([_jsonval(v) for v in key], separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor:str, nKeys:int) -> list:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError as e:
+        raise ValueError(f'bad cursor: {e}') from e
+    if not isinstance(key, list) or len(key) != nKeys:
+        raise ValueError('bad cursor: it is for another sort')
+    return key
+
+def _SAPTable_filters(SAPDate:datetime.date, material:str|None, plant:str|None, storageloc:str|None) -> list:
+    conds = [SOH_valid_on(SAPDate)]
+    if material:
+        conds.append(MaterialList.Material.startswith(material, autoescape=True))
+    if plant:
+        conds.append(SAP_SOHRecs.Plant == plant)
+    if storageloc:
+        conds.append(SAP_SOHRecs.StorageLocation == storageloc)
+    return conds
+
+def fnSAPTablePage(SAPDate:datetime.date, sort:str = 'material', descending:bool = False, after:str|None = None,
+        limit:int = 200, material:str|None = None, plant:str|None = None, storageloc:str|None = None) -> dict:
+    """
+    one page (limit lines) of SAPDate's snapshot, after the cursor `after` (None: the first page).
+    Each row is a dict of SAPTABLE_FIELDS, numbers as floats.  The first page also says how many lines match
+    the filters.  Raises ValueError for an unknown sort, or a cursor that isn't one of these
+    """
+    if sort not in SAPTABLE_SORTS:
+        raise ValueError(f'unknown sort {sort!r}; one of {", ".join(SAPTABLE_SORTS)}')
+    keycols = (*SAPTABLE_SORTS[sort], SAP_SOHRecs.id)
+    conds = _SAPTable_filters(SAPDate, material, plant, storageloc)
+
+    stmt = (
+        select(
+            SAP_SOHRecs.id, Organizations.orgname, MaterialList.Material, SAP_SOHRecs.Description, SAP_SOHRecs.Plant,
+            SAP_SOHRecs.StorageLocation, SAP_SOHRecs.Amount, SAP_SOHRecs.BaseUnitofMeasure, SAP_SOHRecs.Currency,
+            SAP_SOHRecs.ValueUnrestricted, SAP_SOHRecs.SpecialStock, SAP_SOHRecs.Batch, SAP_SOHRecs.Vendor,
+            SAP_SOHRecs.Blocked, SAP_SOHRecs.ValueBlocked,
+            *[col.label(f'_k{i}') for i, col in enumerate(keycols)],
+            )
+        .join(MaterialList, SAP_SOHRecs.Material_id == MaterialList.id)
+        .join(Organizations, MaterialList.org_id == Organizations.id)
+        .where(*conds)
+        .order_by(*[col.desc() if descending else col for col in keycols])
+        .limit(limit + 1)
+        )
+    if after:
+        afterKey = tuple_(*keycols)
+        afterVals = tuple_(*_decode_cursor(after, len(keycols)))
+        stmt = stmt.where(afterKey < afterVals if descending else afterKey > afterVals)
+
+    rows = app_db.session.execute(stmt).all()
+    nFlds = len(SAPTABLE_FIELDS)
+    page = {
+        'rows': [{fld: _jsonval(v) for fld, v in zip(SAPTABLE_FIELDS, row[:nFlds])} for row in rows[:limit]],
+        'next': _encode_cursor(tuple(rows[limit-1][nFlds:])) if len(rows) > limit else None,
+        }
+    if not after:
+        page['nRows'] = app_db.session.scalar(
+            select(func.count()).select_from(SAP_SOHRecs).join(MaterialList, SAP_SOHRecs.Material_id == MaterialList.id).where(*conds))
+    return page
+# fnSAPTablePage
@@ -0,0 +1,331 @@
+"""
+Delta storage for the SAP stock-on-hand snapshots in WICS_sap_sohrecs.
+
+An SAP_SOHRecs row is valid from its uploaded_at (the first snapshot it's in) up to, not including, its
+retired_at (the first snapshot it isn't in; NULL while it's in the latest one).  Storing a snapshot
+writes only the lines that changed since the snapshot before it, and retires the ones that are gone;
+SOH_valid_on(date) picks out the full snapshot again.  WICS_sap_sohsnapshots lists the snapshot dates,
+so finding one no longer scans WICS_sap_sohrecs.  WICS_sap_sohtotals holds each Material's total (UOM
+multiplier applied) the same way, for the Materials a snapshot changed; SOH_valid_on(date, SAP_SOHTotals)
+gives every Material's total on that date.
+
+SAP_SOH_DELTA_STORAGE = False stores every line of every snapshot again (the rows still carry their
+validity dates, so they're read the same way).
+
+History loaded a full copy per day, before retired_at, is converted, oldest day first, by
+
+    flask wics compact-sap-history
+
+Until it has been, store_SOH_snapshot refuses (SOHLegacyHistoryError): every unconverted row is still
+"valid" from its day on, so a snapshot stored over them would read them all back, and retire some.
+
+and the totals are built from scratch (after a UOM multiplier changes, say) by
+
+    flask wics rebuild-sap-totals
+"""
+import datetime, math
+from typing import Any, Callable, Sequence
+
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, func, and_, or_
+
+from database import app_db
+from models import SAP_SOHRecs, SAP_SOHSnapshot, SAP_SOHTotals, UnitsOfMeasure
+
+
+# the fields that say whether a line changed - all but id and the validity dates
+SOH_datflds = ('org_id', 'Material_id', 'MaterialPartNum', 'Description', 'Plant', 'MaterialType', 'StorageLocation',
+    'BaseUnitofMeasure', 'Currency', 'SpecialStock', 'Batch', 'Vendor',
+    'Amount', 'ValueUnrestricted', 'Blocked', 'ValueBlocked')
+SOH_numflds = ('Amount', 'ValueUnrestricted', 'Blocked', 'ValueBlocked')
+_SOH_isnum = tuple(fld in SOH_numflds for fld in SOH_datflds)
+_SOH_isstr = tuple(fld not in SOH_numflds and fld not in ('org_id', 'Material_id') for fld in SOH_datflds)
+
+class SOHLegacyHistoryError(Exception):
+    pass
+
+def SOH_valid_on(SAPDate, SAP=SAP_SOHRecs):
+    """the SAP_SOHRecs (or an alias of it) rows in the snapshot for SAPDate, which may be a column"""
+    return and_(SAP.uploaded_at <= SAPDate, or_(SAP.retired_at.is_(None), SAP.retired_at > SAPDate))
+
+def _SOH_key(vals:Sequence[Any]) -> tuple:
+    # vals in SOH_datflds order, as read from the sheet or the DB (Decimal) - compared as stored
+    return tuple(
+        (None if v is None else float(v)) if isnum else ('' if v is None else str(v)) if isstr else v
+        for v, isnum, isstr in zip(vals, _SOH_isnum, _SOH_isstr))
+
+def _next_snapshot(SAPDate:datetime.date) -> datetime.date|None:
+    return app_db.session.scalar(select(func.min(SAP_SOHSnapshot.uploaded_at)).where(SAP_SOHSnapshot.uploaded_at > SAPDate))
+
+def _SOH_rows_valid_on(SAPDate:datetime.date, startedBefore:bool = False) -> dict[tuple, list[tuple]]:
+    """the rows in SAPDate's snapshot (with startedBefore, only those from an earlier one): key -> [(id, uploaded_at, retired_at), ...]"""
+    stmt = select(SAP_SOHRecs.id, SAP_SOHRecs.uploaded_at, SAP_SOHRecs.retired_at, *[getattr(SAP_SOHRecs, fld) for fld in SOH_datflds])
+    stmt = stmt.where(SOH_valid_on(SAPDate))
+    if startedBefore:
+        stmt = stmt.where(SAP_SOHRecs.uploaded_at < SAPDate)
+    current:dict[tuple, list[tuple]] = {}
+    for row in app_db.session.execute(stmt).tuples():
+        current.setdefault(_SOH_key(row[3:]), []).append(row[:3])
+    return current
+# _SOH_rows_valid_on
+
+def _SOH_retire(SAPDate:datetime.date, nextDate:datetime.date|None, unmatched:dict[tuple, list[tuple]], chunkSize:int) -> int:
+    """
+    take the unmatched rows out of SAPDate's snapshot (up to nextDate's): a row from an earlier snapshot is retired;
+    one starting at SAPDate (the snapshot being replaced) goes.  A row that was also in nextDate's snapshot stays there:
+    it's restarted at nextDate.  Returns the number of rows taken out
+    """
+    retireIds:list[int] = []
+    restartIds:list[int] = []
+    deleteIds:list[int] = []
+    restartCopies:list[dict[str, Any]] = []
+    for key, rows in unmatched.items():
+        for id, uploaded_at, retired_at in rows:
+            inNext = nextDate is not None and (retired_at is None or retired_at > nextDate)
+            if uploaded_at < SAPDate:
+                retireIds.append(id)
+                if inNext:
+                    restartCopies.append({**dict(zip(SOH_datflds, key)), 'uploaded_at': nextDate, 'retired_at': retired_at})
+            elif inNext:
+                restartIds.append(id)
+            else:
+                deleteIds.append(id)
+        # endfor id
+    # endfor key, rows
+
+    for i in range(0, max(len(retireIds), len(restartIds), len(deleteIds)), chunkSize):
+        if retireIds[i:i+chunkSize]:
+            app_db.session.execute(update(SAP_SOHRecs).where(SAP_SOHRecs.id.in_(retireIds[i:i+chunkSize]))
+                .values(retired_at = SAPDate).execution_options(synchronize_session=False))
+        if restartIds[i:i+chunkSize]:
+            app_db.session.execute(update(SAP_SOHRecs).where(SAP_SOHRecs.id.in_(restartIds[i:i+chunkSize]))
+                .values(uploaded_at = nextDate).execution_options(synchronize_session=False))
+        if deleteIds[i:i+chunkSize]:
+            app_db.session.execute(delete(SAP_SOHRecs).where(SAP_SOHRecs.id.in_(deleteIds[i:i+chunkSize]))
+                .execution_options(synchronize_session=False))
+    # endfor i
+    for i in range(0, len(restartCopies), chunkSize):
+        app_db.session.execute(insert(SAP_SOHRecs.__table__), restartCopies[i:i+chunkSize])
+    return len(retireIds) + len(restartIds) + len(deleteIds)
+# _SOH_retire
+
+def _SOH_totals_on(SAPDate:datetime.date, matlIds:list[int]|None, chunkSize:int) -> dict[int, float]:
+    """each Material's total (Amount * UOM multiplier; no UOM counts as 1) in SAPDate's snapshot; matlIds None is all of them"""
+    stmt = (
+        select(SAP_SOHRecs.Material_id, func.sum(func.coalesce(SAP_SOHRecs.Amount, 0) * func.coalesce(UnitsOfMeasure.Multiplier1, 1)))
+        .outerjoin(UnitsOfMeasure, UnitsOfMeasure.UOM == SAP_SOHRecs.BaseUnitofMeasure)
+        .where(SOH_valid_on(SAPDate), SAP_SOHRecs.Material_id.is_not(None))
+        .group_by(SAP_SOHRecs.Material_id)
+        )
+    if matlIds is None:
+        return {mid: float(tot) for mid, tot in app_db.session.execute(stmt).tuples()}
+    totals:dict[int, float] = {}
+    for i in range(0, len(matlIds), chunkSize):
+        totals.update((mid, float(tot)) for mid, tot in
+            app_db.session.execute(stmt.where(SAP_SOHRecs.Material_id.in_(matlIds[i:i+chunkSize]))).tuples())
+    return totals
+# _SOH_totals_on
+
+def _SOH_refresh_totals(SAPDate:datetime.date, nextDate:datetime.date|None, matlIds:set[int]|None, chunkSize:int) -> int:
+    """
+    bring the SAP_SOHTotals for matlIds (None: every Material) in line with SAPDate's snapshot, up to nextDate's.
+    Totals that didn't change are left as they are; the rest are taken out of SAPDate's snapshot as _SOH_retire
+    does lines, and the new ones stored.  Returns the number of Materials whose total changed
+    """
+    ids = None if matlIds is None else sorted(mid for mid in matlIds if mid is not None)
+    newTotals = _SOH_totals_on(SAPDate, ids, chunkSize)
+
+    stmt = select(SAP_SOHTotals.id, SAP_SOHTotals.Material_id, SAP_SOHTotals.uploaded_at, SAP_SOHTotals.retired_at,
+        SAP_SOHTotals.SAPTotal).where(SOH_valid_on(SAPDate, SAP_SOHTotals))
+    oldTotals:dict[int, tuple] = {}
+    for chunk in ([None] if ids is None else [ids[i:i+chunkSize] for i in range(0, len(ids), chunkSize)]):
+        chunkStmt = stmt if chunk is None else stmt.where(SAP_SOHTotals.Material_id.in_(chunk))
+        oldTotals.update((row[1], row) for row in app_db.session.execute(chunkStmt).tuples())
+
+    retireIds:list[int] = []
+    restartIds:list[int] = []
+    deleteIds:list[int] = []
+    newRecs:list[dict[str, Any]] = []
+    nChanged = 0
+    for mid in set(newTotals) | set(oldTotals):
+        old, new = oldTotals.get(mid), newTotals.get(mid)
+        if old is not None and new is not None and math.isclose(old[4], new, rel_tol=1e-12, abs_tol=1e-9):
+            continue
+        nChanged += 1
+        if old is not None:
+            id, _, uploaded_at, retired_at, oldTotal = old
+            inNext = nextDate is not None and (retired_at is None or retired_at > nextDate)
+            if uploaded_at < SAPDate:
+                retireIds.append(id)
+                if inNext:
+                    newRecs.append({'Material_id': mid, 'uploaded_at': nextDate, 'retired_at': retired_at, 'SAPTotal': oldTotal})
+            elif inNext:
+                restartIds.append(id)
+            else:
+                deleteIds.append(id)
+        # endif old
+        if new is not None:
+            newRecs.append({'Material_id': mid, 'uploaded_at': SAPDate, 'retired_at': nextDate, 'SAPTotal': new})
+    # endfor mid
+
+    for i in range(0, max(len(retireIds), len(restartIds), len(deleteIds)), chunkSize):
+        if retireIds[i:i+chunkSize]:
+            app_db.session.execute(update(SAP_SOHTotals).where(SAP_SOHTotals.id.in_(retireIds[i:i+chunkSize]))
+                .values(retired_at = SAPDate).execution_options(synchronize_session=False))
+        if restartIds[i:i+chunkSize]:
+            app_db.session.execute(update(SAP_SOHTotals).where(SAP_SOHTotals.id.in_(restartIds[i:i+chunkSize]))
+                .values(uploaded_at = nextDate).execution_options(synchronize_session=False))
+        if deleteIds[i:i+chunkSize]:
+            app_db.session.execute(delete(SAP_SOHTotals).where(SAP_SOHTotals.id.in_(deleteIds[i:i+chunkSize]))
+                .execution_options(synchronize_session=False))
+    # endfor i
+    for i in range(0, len(newRecs), chunkSize):
+        app_db.session.execute(insert(SAP_SOHTotals.__table__), newRecs[i:i+chunkSize])
+    return nChanged
+# _SOH_refresh_totals
+
+def _SOH_mark_snapshot(SAPDate:datetime.date, nRows:int, nRowsNew:int) -> int:
+    """record SAPDate's snapshot; returns the nRows it replaces (0 if it's a new date)"""
+    snap = app_db.session.get(SAP_SOHSnapshot, SAPDate)
+    nRowsReplaced = snap.nRows if snap is not None else 0
+    if snap is None:
+        snap = SAP_SOHSnapshot(uploaded_at = SAPDate)
+        app_db.session.add(snap)
+    snap.nRows, snap.nRowsNew, snap.LoadedAt = nRows, nRowsNew, datetime.datetime.now()
+    return nRowsReplaced
+# _SOH_mark_snapshot
+
+def store_SOH_snapshot(SAPDate:datetime.date, flds:Sequence[str], rows:Sequence[Sequence[Any]], chunkSize:int = 5000,
+        progress:Callable[[int, int], None]|None = None) -> dict[str, int]:
+    """
+    make rows (tuples in flds order; flds covers SOH_datflds) the SAP_SOHRecs snapshot for SAPDate, replacing
+    any snapshot already there for that date.  Lines unchanged from the snapshot before are kept as they
+    are; only the rest are written.  Nothing is committed - it all goes in the caller's transaction.
+    progress(nWritten, nRowsNew) is called after each chunk of new lines is written.  The totals of the
+    Materials with new or retired lines are brought up to date.
+    Raises SOHLegacyHistoryError while any history is still stored a full copy per day (fnSOH_LegacyDates).
+    Returns {'nRowsKept', 'nRowsNew', 'nRowsRetired', 'nRowsReplaced', 'nTotalsChanged'}
+    """
+    legacyDates = fnSOH_LegacyDates()
+    if legacyDates:
+        raise SOHLegacyHistoryError(f'SAP history for {len(legacyDates)} day(s) from {legacyDates[0]} on is still stored a full copy per day.  '
+            'Run `flask wics compact-sap-history` first.')
+    delta = bool(current_app.config.get('SAP_SOH_DELTA_STORAGE', True))
+    nextDate = _next_snapshot(SAPDate)
+    fldpos = [list(flds).index(fld) for fld in SOH_datflds]
+
+    current = _SOH_rows_valid_on(SAPDate)
+    newRows:list[Sequence[Any]] = []
+    for row in rows:
+        matches = current.get(_SOH_key([row[p] for p in fldpos])) if delta else None
+        if matches:
+            matches.pop()
+        else:
+            newRows.append(row)
+    # endfor row
+    matlPos = list(flds).index('Material_id')
+    changedMatls = {key[1] for key, matches in current.items() if matches} | {row[matlPos] for row in newRows}
+    nRowsRetired = _SOH_retire(SAPDate, nextDate, current, chunkSize)
+
+    # through the Core table: an ORM bulk INSERT would split the chunk up by which columns are None
+    for i in range(0, len(newRows), chunkSize):
+        app_db.session.execute(insert(SAP_SOHRecs.__table__),
+            [{**dict(zip(flds, row)), 'uploaded_at': SAPDate, 'retired_at': nextDate} for row in newRows[i:i+chunkSize]])
+        if progress:
+            progress(min(i+chunkSize, len(newRows)), len(newRows))
+    nTotalsChanged = _SOH_refresh_totals(SAPDate, nextDate, changedMatls, chunkSize)
+    nRowsReplaced = _SOH_mark_snapshot(SAPDate, len(rows), len(newRows))
+
+    return {'nRowsKept': len(rows) - len(newRows), 'nRowsNew': len(newRows), 'nRowsRetired': nRowsRetired,
+        'nRowsReplaced': nRowsReplaced, 'nTotalsChanged': nTotalsChanged}
+# store_SOH_snapshot
+
+def fnSOH_LegacyDates() -> list[datetime.date]:
+    """the days still stored as a full copy (no WICS_sap_sohsnapshots row), oldest first"""
+    stmt = (
+        select(SAP_SOHRecs.uploaded_at).distinct()
+        .where(SAP_SOHRecs.retired_at.is_(None), SAP_SOHRecs.uploaded_at.not_in(select(SAP_SOHSnapshot.uploaded_at)))
+        .order_by(SAP_SOHRecs.uploaded_at)
+        )
+    return list(app_db.session.scalars(stmt))
+
+def proc_SOH_CompactHistory(chunkSize:int|None = None, progress:Callable[[datetime.date, dict[str, int]], None]|None = None) -> int:
+    """
+    convert the days stored as a full copy, oldest first, one transaction per day: a day's lines that are
+    in the (already converted) snapshot before it are dropped in favour of those, and that snapshot's lines
+    that it hasn't got are retired.  Safe to interrupt; run it again to carry on.
+    progress(day, counts) is called after each day is committed.  Returns the number of days converted.
+    Raises SOHLegacyHistoryError, converting nothing, if a snapshot newer than the oldest unconverted day
+    has already been stored - it was stored against unconverted history, and converting would lose its lines
+    """
+    if chunkSize is None:
+        chunkSize = int(current_app.config.get('SAPUPLOAD_CHUNKSIZE', 5000))
+    chunkSize = max(1, int(chunkSize))
+    delta = bool(current_app.config.get('SAP_SOH_DELTA_STORAGE', True))
+
+    legacyDates = fnSOH_LegacyDates()
+    if legacyDates:
+        newer = _next_snapshot(legacyDates[0])
+        if newer is not None:
+            raise SOHLegacyHistoryError(f'the SAP snapshot for {newer} was stored over history not yet converted (from {legacyDates[0]} on); '
+                'converting it now would lose lines.  Restore WICS_sap_sohrecs from a backup taken before that upload.')
+
+    nDays = 0
+    for SAPDate in legacyDates:
+        nextDate = _next_snapshot(SAPDate)
+        current = _SOH_rows_valid_on(SAPDate, startedBefore=True)
+        stmt = select(SAP_SOHRecs.id, *[getattr(SAP_SOHRecs, fld) for fld in SOH_datflds]).where(SAP_SOHRecs.uploaded_at == SAPDate)
+        dupIds:list[int] = []
+        keepIds:list[int] = []
+        changedMatls:set[int] = set()
+        for row in app_db.session.execute(stmt).tuples():
+            matches = current.get(_SOH_key(row[1:])) if delta else None
+            if matches:
+                matches.pop()
+                dupIds.append(row[0])
+            else:
+                keepIds.append(row[0])
+                changedMatls.add(row[2])
+        # endfor row
+        changedMatls.update(key[1] for key, matches in current.items() if matches)
+
+        for i in range(0, len(dupIds), chunkSize):
+            app_db.session.execute(delete(SAP_SOHRecs).where(SAP_SOHRecs.id.in_(dupIds[i:i+chunkSize])).execution_options(synchronize_session=False))
+        if nextDate is not None:
+            for i in range(0, len(keepIds), chunkSize):
+                app_db.session.execute(update(SAP_SOHRecs).where(SAP_SOHRecs.id.in_(keepIds[i:i+chunkSize]))
+                    .values(retired_at = nextDate).execution_options(synchronize_session=False))
+        nRowsRetired = _SOH_retire(SAPDate, nextDate, current, chunkSize)
+        _SOH_refresh_totals(SAPDate, nextDate, changedMatls, chunkSize)
+        _SOH_mark_snapshot(SAPDate, len(dupIds) + len(keepIds), len(keepIds))
+        app_db.session.commit()
+
+        nDays += 1
+        if progress:
+            progress(SAPDate, {'nRowsKept': len(dupIds), 'nRowsNew': len(keepIds), 'nRowsRetired': nRowsRetired})
+    # endfor SAPDate
+
+    return nDays
+# proc_SOH_CompactHistory
+
+def proc_SOH_RebuildTotals(chunkSize:int|None = None, progress:Callable[[datetime.date, int], None]|None = None) -> int:
+    """
+    build WICS_sap_sohtotals from scratch, oldest snapshot first, in one transaction.
+    progress(day, nTotalsChanged) is called after each snapshot.  Returns the number of snapshots
+    """
+    if chunkSize is None:
+        chunkSize = int(current_app.config.get('SAPUPLOAD_CHUNKSIZE', 5000))
+    chunkSize = max(1, int(chunkSize))
+
+    app_db.session.execute(delete(SAP_SOHTotals).execution_options(synchronize_session=False))
+    SAPDates = list(app_db.session.scalars(select(SAP_SOHSnapshot.uploaded_at).order_by(SAP_SOHSnapshot.uploaded_at)))
+    for SAPDate in SAPDates:
+        # the later snapshots have no totals yet, so each day's are built as if it were the latest
+        nChanged = _SOH_refresh_totals(SAPDate, None, None, chunkSize)
+        if progress:
+            progress(SAPDate, nChanged)
+    # endfor SAPDate
+    app_db.session.commit()
+
+    return len(SAPDates)
+# proc_SOH_RebuildTotals
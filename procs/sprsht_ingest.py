@@ -0,0 +1,406 @@
+"""
+Streaming spreadsheet ingest for the WICS upload procs (MM60, Counts, ...).
+
+Reads the sheet XML of an .xlsx straight into column batches, without building
+openpyxl workbook/cell objects and without a separate pass for ws.max_row.
+Only the columns named in the caller's SSName -> TableName map are kept.
+CSV/TSV exports of the same reports are accepted as well.
+
+    with SprshtIngest(fName, SAP_SSName_TableName_map) as SS:
+        for rowNum, row in SS.rows():
+            Material = row[SS.colmap['Material']]
+"""
+import csv, datetime, os, posixpath, zipfile
+from typing import Any, Iterator
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel, WINDOWS_EPOCH, MAC_EPOCH
+
+from calvincTools.utils import ExcelWorkbook_fileext
+
+
+CSV_fileexts = ('.csv', '.tsv', '.txt')
+Sprsht_fileexts = (ExcelWorkbook_fileext.lower(),) + CSV_fileexts
+
+_ns_main = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_ns_docrel = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_ns_pkgrel = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_TAG_row = _ns_main + 'row'
+_TAG_c = _ns_main + 'c'
+_TAG_v = _ns_main + 'v'
+_TAG_is = _ns_main + 'is'
+_TAG_t = _ns_main + 't'
+_TAG_r = _ns_main + 'r'
+_TAG_si = _ns_main + 'si'
+_TAG_dimension = _ns_main + 'dimension'
+_TAG_sheetData = _ns_main + 'sheetData'
+
+
+class SprshtIngestError(Exception):
+    pass
+
+
+_colletter_cache:dict[str, int] = {}
+def _colnum(cellref:str) -> int:
+    """'AB12' -> 28 (1-based column number)"""
+    letters = cellref.rstrip('0123456789')
+    n = _colletter_cache.get(letters)
+    if n is None:
+        n = 0
+        for ch in letters:
+            n = n*26 + (ord(ch) - 64)
+        _colletter_cache[letters] = n
+    return n
+
+def _rownum(cellref:str) -> int:
+    return int(cellref[len(cellref.rstrip('0123456789')):] or 0)
+
+def _cast_number(v:str) -> int|float:
+    # same rule openpyxl uses: integral unless it looks like a float
+    if '.' in v or 'E' in v or 'e' in v:
+        return float(v)
+    return int(v)
+
+
+class SprshtBatch:
+    """
+    one batch of spreadsheet rows, held column-wise
+        rowNums[i] is the spreadsheet row number of the i-th row in the batch
+        columns[TableName][i] is that row's (typed) value for the column
+    """
+    __slots__ = ('rowNums', 'columns', '_order')
+
+    def __init__(self, colnames:list[str]):
+        self.rowNums:list[int] = []
+        self.columns:dict[str, list[Any]] = {cn: [] for cn in colnames}
+        self._order = [self.columns[cn] for cn in colnames]
+
+    def __len__(self):
+        return len(self.rowNums)
+
+    def row(self, i:int) -> tuple:
+        """the i-th row as a tuple in SprshtIngest.colmap order"""
+        return tuple(col[i] for col in self._order)
+# SprshtBatch
+
+
+class SprshtIngest:
+    """
+    fName                   .xlsx, .csv, .tsv or .txt (tab or comma delimited) file
+    SSName_TableName_map    spreadsheet header -> table column name; other columns are ignored
+    sheetname               worksheet to read (xlsx only); None means the active sheet
+    batchsize               rows per SprshtBatch
+
+    after open (done by the constructor):
+        colmap          TableName -> position in each row tuple (and in SprshtBatch.row())
+        duplicatecols   header names whose TableName was already mapped by an earlier column
+        blankheadercols column numbers (1-based) with a blank header, between mapped/named columns
+        numrows         number of spreadsheet rows including the header (from <dimension>), or None if unknown
+        epoch           the workbook date epoch, for callers that still get raw Excel serial dates
+    """
+
+    def __init__(self, fName:str, SSName_TableName_map:dict[str, str], sheetname:str|None = None, batchsize:int = 5000):
+        self.fName = fName
+        self.SSName_TableName_map = SSName_TableName_map
+        self.sheetname = sheetname
+        self.batchsize = max(1, batchsize)
+
+        self.colmap:dict[str, int] = {}
+        self.duplicatecols:list[str] = []
+        self.blankheadercols:list[int] = []
+        self.numrows:int|None = None
+        self.epoch = WINDOWS_EPOCH
+
+        self._zip:zipfile.ZipFile|None = None
+        self._csvfile = None
+        self._rowiter:Iterator[tuple[int, dict[int, Any]]]|None = None
+        self._wantcols:dict[int, int] = {}      # spreadsheet column number -> position in row tuple
+
+        ext = os.path.splitext(fName)[1].lower()
+        if ext in CSV_fileexts:
+            self._open_csv(ext)
+        elif ext == ExcelWorkbook_fileext.lower():
+            self._open_xlsx()
+        else:
+            raise SprshtIngestError(f'{os.path.basename(fName)} is not a supported spreadsheet type ({", ".join(Sprsht_fileexts)})')
+        # endif ext
+    # __init__
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self._rowiter = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._csvfile is not None:
+            self._csvfile.close()
+            self._csvfile = None
+    # close
+
+    ###########################################################
+    # header
+
+    def _map_header(self, header:dict[int, Any]):
+        positions:dict[str, int] = {}
+        colnums:dict[str, int] = {}
+        lastnamed = max((cn for cn, v in header.items() if v not in (None, '')), default=0)
+        for cn in range(1, lastnamed+1):
+            hdr = header.get(cn)
+            if hdr in (None, ''):
+                self.blankheadercols.append(cn)
+                continue
+            hdr = str(hdr)
+            if hdr not in self.SSName_TableName_map:
+                continue
+            tblname = self.SSName_TableName_map[hdr]
+            if tblname in colnums:
+                # later column wins (the MM60 reader always worked this way); callers that care check duplicatecols
+                self.duplicatecols.append(hdr)
+            colnums[tblname] = cn
+        # endfor cn
+        for pos, (tblname, cn) in enumerate(colnums.items()):
+            positions[tblname] = pos
+        self.colmap = positions
+        self._wantcols = {cn: positions[tblname] for tblname, cn in colnums.items()}
+    # _map_header
+
+    ###########################################################
+    # xlsx
+
+    def _open_xlsx(self):
+        try:
+            self._zip = zipfile.ZipFile(self.fName)
+        except (zipfile.BadZipFile, OSError) as e:
+            raise SprshtIngestError(f'{os.path.basename(self.fName)} is not a readable {ExcelWorkbook_fileext} workbook: {e}')
+        zf = self._zip
+        names = set(zf.namelist())
+
+        def rels_for(part:str) -> dict[str, tuple[str, str]]:
+            relpart = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+            if relpart not in names:
+                return {}
+            rels = {}
+            for rel in ET.fromstring(zf.read(relpart)).iter(_ns_pkgrel + 'Relationship'):
+                target = rel.get('Target', '')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+                rels[rel.get('Id', '')] = (rel.get('Type', ''), target)
+            return rels
+        # rels_for
+
+        wbpart = next((tgt for typ, tgt in rels_for('').values() if typ.endswith('/officeDocument')), 'xl/workbook.xml')
+        if wbpart not in names:
+            raise SprshtIngestError(f'{os.path.basename(self.fName)} has no workbook part')
+        wbrels = rels_for(wbpart)
+        wbxml = ET.fromstring(zf.read(wbpart))
+
+        wbPr = wbxml.find(_ns_main + 'workbookPr')
+        if wbPr is not None and wbPr.get('date1904') in ('1', 'true'):
+            self.epoch = MAC_EPOCH
+
+        sheets = [(sh.get('name'), sh.get(_ns_docrel + 'id')) for sh in wbxml.iter(_ns_main + 'sheet')]
+        if not sheets:
+            raise SprshtIngestError(f'{os.path.basename(self.fName)} has no worksheets')
+        if self.sheetname is None:
+            view = wbxml.find(f'{_ns_main}bookViews/{_ns_main}workbookView')
+            activeTab = int(view.get('activeTab', 0)) if view is not None else 0
+            _, rId = sheets[activeTab if activeTab < len(sheets) else 0]
+        else:
+            rId = next((rid for nm, rid in sheets if nm == self.sheetname), None)
+            if rId is None:
+                raise SprshtIngestError(f'This workbook does not contain a sheet named {self.sheetname}')
+        sheetpart = wbrels.get(rId or '', ('', ''))[1]
+        if sheetpart not in names:
+            raise SprshtIngestError(f'{os.path.basename(self.fName)}: worksheet part {sheetpart} is missing')
+
+        sstpart = next((tgt for typ, tgt in wbrels.values() if typ.endswith('/sharedStrings')), None)
+        self._sharedStrings = self._read_sharedStrings(sstpart) if sstpart in names else []
+        stylepart = next((tgt for typ, tgt in wbrels.values() if typ.endswith('/styles')), None)
+        self._dateStyles = self._read_dateStyles(stylepart) if stylepart in names else set()
+
+        self._sheetpart = sheetpart
+        self._rowiter = self._iter_xlsx_rows()
+        header = self._first_row()
+        self._map_header(header)
+    # _open_xlsx
+
+    def _read_sharedStrings(self, part:str) -> list[str]:
+        assert self._zip is not None
+        sst:list[str] = []
+        with self._zip.open(part) as f:
+            for _, el in ET.iterparse(f, events=('end',)):
+                if el.tag == _TAG_si:
+                    # plain <t>, or rich text runs <r><t>; skip phonetic <rPh> runs
+                    txt = [ch.text or '' for ch in el if ch.tag == _TAG_t]
+                    txt += [t.text or '' for r in el if r.tag == _TAG_r for t in r if t.tag == _TAG_t]
+                    sst.append(''.join(txt))
+                    el.clear()
+        return sst
+    # _read_sharedStrings
+
+    def _read_dateStyles(self, part:str) -> set[int]:
+        """indexes into cellXfs whose number format is a date format"""
+        assert self._zip is not None
+        stylexml = ET.fromstring(self._zip.read(part))
+        numFmts = {int(nf.get('numFmtId', -1)): nf.get('formatCode', '') for nf in stylexml.iter(_ns_main + 'numFmt')}
+        cellXfs = stylexml.find(_ns_main + 'cellXfs')
+        dateStyles = set()
+        if cellXfs is not None:
+            for idx, xf in enumerate(cellXfs.iter(_ns_main + 'xf')):
+                fmtId = int(xf.get('numFmtId', 0))
+                fmt = numFmts.get(fmtId, BUILTIN_FORMATS.get(fmtId))
+                if fmt and is_date_format(fmt):
+                    dateStyles.add(idx)
+        return dateStyles
+    # _read_dateStyles
+
+    def _iter_xlsx_rows(self) -> Iterator[tuple[int, dict[int, Any]]]:
+        assert self._zip is not None
+        sst = self._sharedStrings
+        dateStyles = self._dateStyles
+        epoch = self.epoch
+        sheetData = None
+        rowNum = 0
+        with self._zip.open(self._sheetpart) as f:
+            for event, el in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if el.tag == _TAG_sheetData:
+                        sheetData = el
+                    continue
+                if el.tag == _TAG_dimension:
+                    ref = el.get('ref', '')
+                    if ':' in ref:
+                        self.numrows = _rownum(ref.split(':')[1])
+                    continue
+                if el.tag != _TAG_row:
+                    continue
+
+                r = el.get('r')
+                rowNum = int(r) if r else rowNum + 1
+                # before the header is mapped every column is wanted
+                wantcols = self._wantcols if self.colmap or rowNum > 1 else None
+                vals:dict[int, Any] = {}
+                nextcol = 1
+                for c in el:
+                    if c.tag != _TAG_c:
+                        continue
+                    ref = c.get('r')
+                    colnum = _colnum(ref) if ref else nextcol
+                    nextcol = colnum + 1
+                    if wantcols is not None and colnum not in wantcols:
+                        continue
+                    typ = c.get('t', 'n')
+                    if typ == 'inlineStr':
+                        isel = c.find(_TAG_is)
+                        val = ''.join(t.text or '' for t in isel.iter(_TAG_t)) if isel is not None else None
+                    else:
+                        v = c.find(_TAG_v)
+                        txt = v.text if v is not None else None
+                        if txt is None:
+                            val = None
+                        elif typ == 's':
+                            val = sst[int(txt)]
+                        elif typ == 'n':
+                            val = _cast_number(txt)
+                            if dateStyles and int(c.get('s', 0)) in dateStyles:
+                                val = from_excel(val, epoch)
+                        elif typ == 'b':
+                            val = txt == '1'
+                        elif typ == 'd':
+                            val = datetime.datetime.fromisoformat(txt)
+                        else:   # 'str' (formula result) and 'e' (error) come through as text
+                            val = txt
+                    # endif typ
+                    vals[colnum] = val
+                # endfor c in el
+                yield rowNum, vals
+                if sheetData is not None:
+                    sheetData.clear()
+                else:
+                    el.clear()
+            # endfor event, el
+    # _iter_xlsx_rows
+
+    ###########################################################
+    # csv/tsv
+
+    def _open_csv(self, ext:str):
+        self._csvfile = open(self.fName, newline='', encoding='utf-8-sig')
+        if ext == '.tsv':
+            delim = '\t'
+        else:
+            sample = self._csvfile.read(64*1024)
+            self._csvfile.seek(0)
+            delim = '\t' if sample.count('\t') > sample.count(',') else ','
+        reader = csv.reader(self._csvfile, delimiter=delim)
+
+        def csvrows():
+            for rowNum, rec in enumerate(reader, start=1):
+                yield rowNum, {cn: (v if v != '' else None) for cn, v in enumerate(rec, start=1)}
+        # csvrows
+        self._rowiter = csvrows()
+        header = self._first_row()
+        self._map_header(header)
+    # _open_csv
+
+    ###########################################################
+    # rows and batches
+
+    def _first_row(self) -> dict[int, Any]:
+        assert self._rowiter is not None
+        for rowNum, vals in self._rowiter:
+            if rowNum == 1:
+                return vals
+            # no row 1 at all means no header
+            break
+        raise SprshtIngestError(f'{os.path.basename(self.fName)} appears to be blank (no header row)')
+    # _first_row
+
+    def batches(self) -> Iterator[SprshtBatch]:
+        """the data rows (row 2 on), batchsize rows at a time; rows missing from the sheet XML come back as all-None rows"""
+        if self._rowiter is None:
+            return
+        colnames = list(self.colmap)
+        wanted = sorted(self._wantcols.items(), key=lambda cp: cp[1])
+        batch = SprshtBatch(colnames)
+        cols = batch._order
+        lastRowNum = 1
+        for rowNum, vals in self._rowiter:
+            # keep row numbering faithful to the spreadsheet; openpyxl yielded empty rows as all-None too
+            while lastRowNum + 1 < rowNum:
+                lastRowNum += 1
+                batch.rowNums.append(lastRowNum)
+                for col in cols:
+                    col.append(None)
+            lastRowNum = rowNum
+            batch.rowNums.append(rowNum)
+            for cn, pos in wanted:
+                cols[pos].append(vals.get(cn))
+            if len(batch.rowNums) >= self.batchsize:
+                yield batch
+                batch = SprshtBatch(colnames)
+                cols = batch._order
+        # endfor rowNum, vals
+        if batch.rowNums:
+            yield batch
+        self._rowiter = None
+        if self.numrows is None or self.numrows < lastRowNum:
+            self.numrows = lastRowNum
+    # batches
+
+    def rows(self) -> Iterator[tuple[int, tuple]]:
+        """(spreadsheet row number, row tuple in colmap order) for each data row"""
+        for batch in self.batches():
+            for i, rowNum in enumerate(batch.rowNums):
+                yield rowNum, batch.row(i)
+    # rows
+# SprshtIngest
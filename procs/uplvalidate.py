@@ -0,0 +1,43 @@
+"""
+Validate-only uploads: what a Counts or MM60 upload would do, collected in memory instead of written.
+
+    v = UploadValidation()
+    v.add('inserts', rowNum, text)      # likewise 'updates', 'deletes', 'errors'
+    v.as_dict(nRowsRead=...)            # the summary returned to the browser (assets/uplvalidate.js shows it)
+
+Every kind is counted in full; only the first UPLOAD_VALIDATE_MAXLIST of each are listed.
+"""
+from typing import Any
+
+from flask import current_app
+
+
+UPLOAD_VALIDATE_KINDS = ('inserts', 'updates', 'deletes', 'errors')
+
+class UploadValidation:
+    def __init__(self, maxlist:int|None = None):
+        if maxlist is None:
+            maxlist = int(current_app.config.get('UPLOAD_VALIDATE_MAXLIST', 500))
+        self.maxlist = max(0, maxlist)
+        self.counts = {kind: 0 for kind in UPLOAD_VALIDATE_KINDS}
+        self.lists:dict[str, list[dict[str, Any]]] = {kind: [] for kind in UPLOAD_VALIDATE_KINDS}
+
+    def add(self, kind:str, rowNum:int|None, text:str) -> None:
+        self.counts[kind] += 1
+        if len(self.lists[kind]) < self.maxlist:
+            self.lists[kind].append({'rowNum': rowNum, 'text': text})
+
+    @property
+    def ok(self) -> bool:
+        return self.counts['errors'] == 0
+
+    def as_dict(self, **stats) -> dict[str, Any]:
+        return {
+            'validateOnly': True,
+            'ok': self.ok,
+            'stats': stats,
+            'counts': self.counts,
+            'lists': self.lists,
+            'truncated': {kind: self.counts[kind] > len(self.lists[kind]) for kind in UPLOAD_VALIDATE_KINDS},
+            }
+# UploadValidation
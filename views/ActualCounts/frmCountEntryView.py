@@ -15,7 +15,7 @@ from calvincTools.utils import (
     )
 
 from forms.ActualCounts.CountEntryForm import CountEntryForm, RelatedMaterialInfo, RelatedScheduleInfo
-from models import ActualCounts, MaterialList, WhsePartTypes
+from models import ActualCounts, WhsePartTypes
 
 from database import app_db
 
@@ -222,10 +222,12 @@ def fnCountEntryView(
         assert matlRec is not None, "matlRec should not be None when MatlNum is provided"
         # matlchoiceForm['gotoItem'] = matlRec        # the template pulls Material from this record
         matlchoiceForm['gotoItem'] = f'{matlRec.Material}:{matlRec.org.orgname}'
+        matlchoiceForm['gotoID'] = matlRec.id
     else:
         ## matlchoiceForm['gotoItem'] = {'Material':MatlNum}
         matlchoiceForm['gotoItem'] = ''
-    matlchoiceForm['choicelist'] = [{'id': rec.id, 'Material_org': f'{rec.Material}:{rec.org.orgname}'} for rec in  MaterialList.query.all()]
+        matlchoiceForm['gotoID'] = 0
+    # the rest of the Material list comes from the typeahead (WICS.MaterialSearch)
 
     # display the form
     cntext = {'frmMain': mainFm,
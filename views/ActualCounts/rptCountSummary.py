@@ -1,23 +1,23 @@
-import os
+from functools import partial
 from typing import cast, Any
 
-from flask import current_app
+from flask import current_app, request, make_response, url_for
 from flask_login import login_required
 
-from sqlalchemy import select, text
+from sqlalchemy import select
 
-from calvincTools.mathexpr_parser import evaluate
 from calvincTools.utils import (
     coerce_date, IsDateString, 
-    WrapInQuotes, 
-    Excelfile_fromqs, ExcelWorkbook_fileext,
     checkTemplate_and_render,    
     )
 
 from database import app_db
-from models import Organizations, ActualCounts, CountSchedule
+from models import ActualCounts
+from procs.countsummary import fnCountSummarySections
+from procs.ctdqty import evaluate, ctdqty_from_persisted
+from procs.rptexport import fnReportExport, REPORT_EXPORT_FORMATS
 
-from views.SAP import fnSAPList
+from views.SAP import fnSAPList, SAP_QTY_FIELDS
 
 
 #####################################################################
@@ -33,15 +33,175 @@ def coerce_float(x) -> float:
 
     return 0.0
 
+# the Count Summary spreadsheet: a row per Material (its Summary line), these fields
+CountSummaryExportFields = ('OrgName','Material','PartType','Description','CountTotal','SAPTotal','Diff','Accuracy','Counters')
+
+def CountSummaryLines(raw_qs, SAPByMaterial, Eval_CTDQTY=True):
+    """
+    a Count Summary section's lines, in order: each Material's Detail lines, then its Summary line.
+    raw_qs is a section's rawrows (procs.countsummary.fnCountSummarySections); SAPByMaterial is as fnSAPByMaterial gives
+    """
+    def SummaryLine(lastrow):
+        # summarize last Matl
+        # total SAP Numbers
+        SAPMatl = SAPByMaterial.get(lastrow['Material_id'])
+        SAPTot = SAPMatl['SAPTotal'] if SAPMatl else 0
+        outputline = dict()
+        outputline['type'] = 'Summary'
+        outputline['SAPNum'] = []
+        for SAProw in (SAPMatl['SAPRows'] if SAPMatl else []):
+            outputline['SAPNum'].append((SAProw.StorageLocation, format(SAProw.Amount,".2f"), SAProw.BaseUnitofMeasure))
+        outputline['TypicalContainerQty'] = lastrow['TypicalContainerQty']
+        outputline['TypicalPalletQty'] = lastrow['TypicalPalletQty']
+        outputline['OrgName'] = lastrow['OrgName']
+        outputline['Material'] = lastrow['Material']
+        outputline['Material_id'] = lastrow['Material_id']
+        outputline['Description'] = lastrow['Description']
+        outputline['SchedCounter'] = lastrow['SchedCounter']
+        outputline['Counters'] = lastrow['Counters']
+        outputline['Requestor'] = lastrow['Requestor']
+        outputline['RequestFilled'] = lastrow['RequestFilled']
+        outputline['PartType'] = lastrow['PartType']
+        outputline['CountTotal'] = lastrow['TotalCounted']
+        outputline['SAPTotal'] = int(SAPTot)
+        outputline['Diff'] = int(lastrow['TotalCounted'] - SAPTot)
+        divsr = 1
+        if lastrow['TotalCounted']!=0 or SAPTot!=0: divsr = max(lastrow['TotalCounted'], SAPTot)
+        outputline['Accuracy'] = min(lastrow['TotalCounted'], SAPTot) / divsr * 100
+        outputline['ReasonScheduled'] = lastrow['ReasonScheduled']
+        outputline['SchedNotes'] = lastrow['SchedNotes']
+        outputline['MatlNotes'] = lastrow['MatlNotes']
+        #outputrows.append(outputline)
+
+        return outputline
+    # end def SummaryLine
+
+    def CreateLastrow(rawrow):
+        lastrow = dict()
+        lastrow['OrgName'] = rawrow.OrgName
+        lastrow['Material'] = rawrow.Matl_PartNum
+        lastrow['Material_id'] = rawrow.matl_id
+        lastrow['Description'] = rawrow.Description
+        lastrow['SchedCounter'] = rawrow.cs_Counter
+        lastrow['Counters'] = rawrow.ac_Counter if rawrow.ac_Counter is not None else ''
+        lastrow['Requestor'] = rawrow.Requestor
+        lastrow['RequestFilled'] = rawrow.RequestFilled
+        lastrow['PartType'] = rawrow.PartType
+        lastrow['TotalCounted'] = 0
+        lastrow['SchedNotes'] = rawrow.cs_Notes
+        lastrow['TypicalContainerQty'] = rawrow.TypicalContainerQty
+        lastrow['TypicalPalletQty'] = rawrow.TypicalPalletQty
+        lastrow['MatlNotes'] = rawrow.mtl_Notes
+        lastrow['ReasonScheduled'] = rawrow.cs_ReasonScheduled
+
+        return lastrow
+    # end def CreateLastRow
+
+    def DetailLine(rawrow, Eval_CTDQTY=True):
+        outputline = dict()
+        outputline['type'] = 'Detail'
+        outputline['CycCtID'] = rawrow.ac_CycCtID
+        outputline['Material'] = rawrow.Matl_PartNum
+        outputline['Material_id'] = rawrow.matl_id
+        outputline['org_id'] = rawrow.org_id
+        outputline['orgName'] = rawrow.OrgName
+        outputline['ActCounter'] = rawrow.ac_Counter
+        if rawrow.ac_Counter is not None and rawrow.ac_Counter not in lastrow['Counters']:
+            lastrow['Counters'] += ', ' + rawrow.ac_Counter
+        outputline['LOCATION'] = rawrow.ac_LOCATION
+        outputline['PKGID'] = rawrow.ac_PKGID_Desc
+        outputline['TAGQTY'] = rawrow.ac_TAGQTY
+        outputline['PossNotRec'] = rawrow.FLAG_PossiblyNotRecieved
+        outputline['MovDurCt'] = rawrow.FLAG_MovementDuringCount
+        outputline['CTD_QTY_Expr'] = rawrow.ac_CTD_QTY_Expr
+        if Eval_CTDQTY and rawrow.ac_CTD_QTY_Eval is not None:
+            outputline['CTD_QTY_Eval'] = ctdqty_from_persisted(rawrow.ac_CTD_QTY_Eval)
+        elif Eval_CTDQTY:
+            try:
+                outputline['CTD_QTY_Eval'] = evaluate(rawrow.ac_CTD_QTY_Expr)
+                # do next line at caller
+                # lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
+            except:
+                # Exception('bad expression:'+rawrow.ac_CTD_QTY_Expr)
+                outputline['CTD_QTY_Eval'] = "????"
+        else:
+            outputline['CTD_QTY_Eval'] = "----"
+        outputline['ActCountNotes'] = rawrow.ac_Notes
+        # outputrows.append(outputline)
+
+        return outputline
+    #end def DetailLine
+
+    lastrow:dict[str, Any] = {'Material_id': None}
+    for rawrow in raw_qs:
+        if rawrow.matl_id != lastrow['Material_id']:     # new Matl
+            if lastrow['Material_id'] is not None:
+                yield SummaryLine(lastrow)
+            # no else -  if there's no lastrow yet, this is the first row, so keep going
+
+            # this new material is now the "old" one; save values for when it switches, and we do the above block
+            # this whole block becomes
+            lastrow = CreateLastrow(rawrow)
+        #endif
+
+        # process this row
+        outputline = DetailLine(rawrow, Eval_CTDQTY)
+        if isinstance(outputline['CTD_QTY_Eval'],(int,float)): 
+            lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
+        yield outputline
+    # endfor
+    # need to do the summary on the last row
+    if lastrow['Material_id'] is not None:
+        # summarize last Matl
+        yield SummaryLine(lastrow)
+#end def CountSummaryLines
+
+def fnCountSummaryReport(dtobj_pDate, Rptvariation=None, SAPForDate=None) -> tuple[dict, list[dict]]:
+    """
+    the Count Summary for dtobj_pDate: (the SAP stock on hand it's compared against - the snapshot nearest
+    SAPForDate, or dtobj_pDate - and [{'org', 'Title', 'outputrows': [Detail and Summary lines]}, ...])
+    """
+    # get the SAP data
+    SAP_SOH = fnSAPList(SAPForDate or dtobj_pDate, byMaterial=True, fields=SAP_QTY_FIELDS)
+
+    ### main body of fnCountSummaryReport
+
+    SummaryReport = []
+
+    # the day's schedule and counts are read once for all orgs, then split into org/section buckets
+    for section in fnCountSummarySections(dtobj_pDate, Rptvariation):
+        SummaryReport.append({
+                    'org':section['org'],
+                    'Title':section['Title'],
+                    'outputrows': list(CountSummaryLines(section['rawrows'], SAP_SOH['SAPByMaterial'], Eval_CTDQTY=section['Eval_CTDQTY']))
+                    })
+
+    return SAP_SOH, SummaryReport
+# fnCountSummaryReport
+
+def fnCountSummaryExportRows(dtobj_pDate, Rptvariation=None, SAPForDate=None):
+    """
+    the Count Summary spreadsheet's rows (CountSummaryExportFields), one Material at a time - the report isn't
+    built first, and only the SAP rows of the report's Materials are read
+    """
+    sections = fnCountSummarySections(dtobj_pDate, Rptvariation)
+    matlIds = sorted({rawrow.matl_id for section in sections for rawrow in section['rawrows']})
+    SAPByMaterial = fnSAPList(SAPForDate or dtobj_pDate, matl=matlIds, byMaterial=True, fields=SAP_QTY_FIELDS)['SAPByMaterial'] if matlIds else {}
+    for section in sections:
+        for outputline in CountSummaryLines(section['rawrows'], SAPByMaterial, Eval_CTDQTY=section['Eval_CTDQTY']):
+            if outputline['type'] == 'Summary':
+                yield [outputline[key] for key in CountSummaryExportFields]
+# fnCountSummaryExportRows
+
 @login_required
 def fnCountSummaryReqRpt(passedCountDate='CURRENT_DATE'):
     return fnCountSummaryRpt(passedCountDate, Rptvariation='REQ')
 @login_required
 def fnCountSummaryRpt (passedCountDate='CURRENT_DATE', Rptvariation=None):
 
-    # get the SAP data
     dtobj_pDate = coerce_date(passedCountDate)
-    SAP_SOH = fnSAPList(dtobj_pDate)
+    # the SAP data is for the date asked for, even if it's corrected to a count date below
+    dtobj_SAPDate = dtobj_pDate
 
     ## construct list of dates counts actually occurred, for use in the dropdown on the report page, and to find the most recent date if passedCountDate is 'CURRENT_DATE'
     stmt = select(ActualCounts.CountDate).distinct().order_by(ActualCounts.CountDate.desc())
@@ -51,229 +211,7 @@ def fnCountSummaryRpt (passedCountDate='CURRENT_DATE', Rptvariation=None):
     # correct dtobj_pDate to the most recent date in countDatesRaw <= passedCountDate
     dtobj_pDate = [D for D in countDatesRaw if D <= dtobj_pDate][0] if countDatesRaw else dtobj_pDate
 
-    # prep Excel_qdict.  It's up here so that the functions below have access to it
-    Excel_qdict = []
-
-    def CreateOutputRows(raw_qs, Eval_CTDQTY=True):
-        def SummaryLine(lastrow):
-            # summarize last Matl
-            # total SAP Numbers
-            SAPTot = 0
-            outputline = dict()
-            outputline['type'] = 'Summary'
-            outputline['SAPNum'] = []
-            for SAProw in [saprow for saprow in SAP_SOH['SAPTable'] if saprow.Material_id==lastrow['Material_id']]:
-                outputline['SAPNum'].append((SAProw.StorageLocation, format(SAProw.Amount,".2f"), SAProw.BaseUnitofMeasure))
-                SAPTot += SAProw.Amount*SAProw.mult
-            outputline['TypicalContainerQty'] = lastrow['TypicalContainerQty']
-            outputline['TypicalPalletQty'] = lastrow['TypicalPalletQty']
-            outputline['OrgName'] = lastrow['OrgName']
-            outputline['Material'] = lastrow['Material']
-            outputline['Material_id'] = lastrow['Material_id']
-            outputline['Description'] = lastrow['Description']
-            outputline['SchedCounter'] = lastrow['SchedCounter']
-            outputline['Counters'] = lastrow['Counters']
-            outputline['Requestor'] = lastrow['Requestor']
-            outputline['RequestFilled'] = lastrow['RequestFilled']
-            outputline['PartType'] = lastrow['PartType']
-            outputline['CountTotal'] = lastrow['TotalCounted']
-            outputline['SAPTotal'] = int(SAPTot)
-            outputline['Diff'] = int(lastrow['TotalCounted'] - SAPTot)
-            divsr = 1
-            if lastrow['TotalCounted']!=0 or SAPTot!=0: divsr = max(lastrow['TotalCounted'], SAPTot)
-            outputline['Accuracy'] = min(lastrow['TotalCounted'], SAPTot) / divsr * 100
-            outputline['ReasonScheduled'] = lastrow['ReasonScheduled']
-            outputline['SchedNotes'] = lastrow['SchedNotes']
-            outputline['MatlNotes'] = lastrow['MatlNotes']
-            #outputrows.append(outputline)
-
-            return outputline
-        # end def SummaryLine
-
-        def CreateLastrow(rawrow):
-            lastrow = dict()
-            lastrow['OrgName'] = rawrow.OrgName
-            lastrow['Material'] = rawrow.Matl_PartNum
-            lastrow['Material_id'] = rawrow.matl_id
-            lastrow['Description'] = rawrow.Description
-            lastrow['SchedCounter'] = rawrow.cs_Counter
-            lastrow['Counters'] = rawrow.ac_Counter if rawrow.ac_Counter is not None else ''
-            lastrow['Requestor'] = rawrow.Requestor
-            lastrow['RequestFilled'] = rawrow.RequestFilled
-            lastrow['PartType'] = rawrow.PartType
-            lastrow['TotalCounted'] = 0
-            lastrow['SchedNotes'] = rawrow.cs_Notes
-            lastrow['TypicalContainerQty'] = rawrow.TypicalContainerQty
-            lastrow['TypicalPalletQty'] = rawrow.TypicalPalletQty
-            lastrow['MatlNotes'] = rawrow.mtl_Notes
-            lastrow['ReasonScheduled'] = rawrow.cs_ReasonScheduled
-
-            return lastrow
-        # end def CreateLastRow
-
-        def DetailLine(rawrow, Eval_CTDQTY=True):
-            outputline = dict()
-            outputline['type'] = 'Detail'
-            outputline['CycCtID'] = rawrow.ac_CycCtID
-            outputline['Material'] = rawrow.Matl_PartNum
-            outputline['Material_id'] = rawrow.matl_id
-            outputline['org_id'] = rawrow.org_id
-            outputline['orgName'] = rawrow.OrgName
-            outputline['ActCounter'] = rawrow.ac_Counter
-            if rawrow.ac_Counter is not None and rawrow.ac_Counter not in lastrow['Counters']:
-                lastrow['Counters'] += ', ' + rawrow.ac_Counter
-            outputline['LOCATION'] = rawrow.ac_LOCATION
-            outputline['PKGID'] = rawrow.ac_PKGID_Desc
-            outputline['TAGQTY'] = rawrow.ac_TAGQTY
-            outputline['PossNotRec'] = rawrow.FLAG_PossiblyNotRecieved
-            outputline['MovDurCt'] = rawrow.FLAG_MovementDuringCount
-            outputline['CTD_QTY_Expr'] = rawrow.ac_CTD_QTY_Expr
-            if Eval_CTDQTY:
-                try:
-                    outputline['CTD_QTY_Eval'] = evaluate(rawrow.ac_CTD_QTY_Expr)
-                    # do next line at caller
-                    # lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
-                except:
-                    # Exception('bad expression:'+rawrow.ac_CTD_QTY_Expr)
-                    outputline['CTD_QTY_Eval'] = "????"
-            else:
-                outputline['CTD_QTY_Eval'] = "----"
-            outputline['ActCountNotes'] = rawrow.ac_Notes
-            # outputrows.append(outputline)
-
-            return outputline
-        #end def DetailLine
-
-        outputrows = []
-        lastrow:dict[str, Any] = {'Material_id': None}
-        for rawrow in raw_qs:
-            if rawrow.matl_id != lastrow['Material_id']:     # new Matl
-                if outputrows:
-                    SmLine = SummaryLine(lastrow)
-                    outputrows.append(SmLine)
-                    Excel_qdict.append(
-                        {key:SmLine[key]
-                          for key in ['OrgName','Material','PartType','Description','CountTotal','SAPTotal','Diff','Accuracy','Counters']
-                        })
-                # no else -  if outputrows is empty, this is the first row, so keep going
-
-                # this new material is now the "old" one; save values for when it switches, and we do the above block
-                # this whole block becomes
-                lastrow = CreateLastrow(rawrow)
-            #endif
-
-            # process this row
-            outputline = DetailLine(rawrow, Eval_CTDQTY)
-            outputrows.append(outputline)
-            if isinstance(outputline['CTD_QTY_Eval'],(int,float)): 
-                lastrow['TotalCounted'] += outputline['CTD_QTY_Eval']
-        # endfor
-        # need to do the summary on the last row
-        if outputrows:
-            # summarize last Matl
-            SmLine = SummaryLine(lastrow)
-            outputrows.append(SmLine)
-            Excel_qdict.append(
-                {key:SmLine[key]
-                    for key in ['OrgName','Material','PartType','Description','CountTotal','SAPTotal','Diff','Accuracy','Counters']
-                })
-
-        return outputrows
-    #end def CreateOutputRows
-
-    ### main body of fnCountSummaryRpt
-
-    SummaryReport = []
-
-    fldlist = "0 as id, cs.id as cs_id, cs.CountDate as cs_CountDate , cs.Counter as cs_Counter" \
-        ", cs.Priority as cs_Priority, cs.ReasonScheduled as cs_ReasonScheduled" \
-        ", cs.Requestor, cs.RequestFilled" \
-        ", cs.Notes as cs_Notes" \
-        ", ac.id as ac_id, ac.CountDate as ac_CountDate, ac.CycCtID as ac_CycCtID, ac.Counter as ac_Counter" \
-        ", ac.LocationOnly as ac_LocationOnly, ac.CTD_QTY_Expr as ac_CTD_QTY_Expr" \
-        ", ac.LOCATION as ac_LOCATION, ac.PKGID_Desc as ac_PKGID_Desc, ac.TAGQTY as ac_TAGQTY" \
-        ", ac.FLAG_PossiblyNotRecieved, ac.FLAG_MovementDuringCount, ac.Notes as ac_Notes" \
-        ", mtl.id as matl_id, mtl.org_id, mtl.OrgName" \
-        ", mtl.Material_org as Matl_PartNum, mtl.PartType as PartType" \
-        ", mtl.Description, mtl.TypicalContainerQty, mtl.TypicalPalletQty, mtl.Notes as mtl_Notes"
-    datestr = WrapInQuotes(str(dtobj_pDate),"'","'")
-    date_condition = '(ac.CountDate = ' + datestr + ' OR cs.CountDate = ' + datestr + ') '
-    order_by = 'Matl_PartNum'
-
-    VIEW_Material_sql = "VIEW_materials mtl "
-
-    stmt = select(Organizations).order_by(Organizations.orgname)
-    all_orgs = app_db.session.execute(stmt).scalars().all()
-    for org in all_orgs:
-        # group by org_id
-        org_condition = '(mtl.org_id = ' + str(org.id) + ')'
-
-        A_Sched_Ctd_from = 'WICS_countschedule cs INNER JOIN ' + VIEW_Material_sql
-        A_Sched_Ctd_from += ' INNER JOIN (SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac '
-        A_Sched_Ctd_joinon = ' cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id AND ac.Material_id=mtl.id'
-        A_Sched_Ctd_where = ''
-        if Rptvariation == 'REQ':
-            if A_Sched_Ctd_where:  A_Sched_Ctd_where += ' AND '
-            A_Sched_Ctd_where += 'Requestor IS NOT NULL'
-        A_Sched_Ctd_sql = 'SELECT ' + fldlist + \
-            ' FROM ' + A_Sched_Ctd_from + \
-            ' ON ' + A_Sched_Ctd_joinon + \
-            ' WHERE NOT ac.LocationOnly AND ' + date_condition + ' AND ' + org_condition
-        if A_Sched_Ctd_where:
-            A_Sched_Ctd_sql += ' AND ' + A_Sched_Ctd_where
-        A_Sched_Ctd_sql += ' ORDER BY ' + order_by
-        A_Sched_Ctd_qs = app_db.session.execute(text(A_Sched_Ctd_sql)).all()
-        # build display lines
-        ttl = 'Scheduled and Counted'
-        if Rptvariation == 'REQ':
-            ttl = 'Requested and Counted'
-        SummaryReport.append({
-                    'org':org,
-                    'Title':ttl,
-                    'outputrows': CreateOutputRows(A_Sched_Ctd_qs)
-                    })
-
-        if Rptvariation is None:
-            B_UnSched_Ctd_from = 'WICS_countschedule cs RIGHT JOIN' \
-                ' ((SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac INNER JOIN ' + VIEW_Material_sql + ' ON ac.Material_id=mtl.id)'
-            B_UnSched_Ctd_joinon = 'cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id'
-            B_UnSched_Ctd_where = '(cs.id IS NULL)'
-            B_UnSched_Ctd_sql = 'SELECT ' + fldlist + ' ' + \
-                ' FROM ' + B_UnSched_Ctd_from + \
-                ' ON ' + B_UnSched_Ctd_joinon + \
-                ' WHERE NOT ac.LocationOnly AND ' + date_condition + ' AND ' + org_condition + \
-                ' AND ' + B_UnSched_Ctd_where + \
-                ' ORDER BY ' + order_by
-            B_UnSched_Ctd_qs = app_db.session.execute(text(B_UnSched_Ctd_sql)).all()
-            SummaryReport.append({
-                        'org':org,
-                        'Title':'UnScheduled',
-                        'outputrows': CreateOutputRows(B_UnSched_Ctd_qs)
-                        })
-
-        C_Sched_NotCtd_Ctd_from = '(WICS_countschedule cs INNER JOIN ' + VIEW_Material_sql + ' ON cs.Material_id=mtl.id)'
-        C_Sched_NotCtd_Ctd_from += ' LEFT JOIN (SELECT * FROM WICS_actualcounts WHERE not LocationOnly) ac '
-        C_Sched_NotCtd_Ctd_joinon = 'cs.CountDate=ac.CountDate AND cs.Material_id=ac.Material_id'
-        C_Sched_NotCtd_Ctd_where = '(ac.id IS NULL)'
-        if Rptvariation == 'REQ':
-            if C_Sched_NotCtd_Ctd_where:  C_Sched_NotCtd_Ctd_where += ' AND '
-            C_Sched_NotCtd_Ctd_where += '(Requestor IS NOT NULL)'
-        C_Sched_NotCtd_Ctd_sql = 'SELECT ' + fldlist + ' ' + \
-            ' FROM ' + C_Sched_NotCtd_Ctd_from + \
-            ' ON ' + C_Sched_NotCtd_Ctd_joinon + \
-            ' WHERE ' + date_condition + ' AND ' + org_condition
-        if C_Sched_NotCtd_Ctd_where:
-            C_Sched_NotCtd_Ctd_sql += ' AND ' + C_Sched_NotCtd_Ctd_where
-        C_Sched_NotCtd_Ctd_sql += ' ORDER BY ' + order_by
-        C_Sched_NotCtd_Ctd_qs = app_db.session.execute(text(C_Sched_NotCtd_Ctd_sql)).all()
-        ttl = 'Scheduled but Not Counted'
-        if Rptvariation == 'REQ':
-            ttl = 'Requested but Not Counted'
-        SummaryReport.append({
-                    'org':org,
-                    'Title':ttl,
-                    'outputrows': CreateOutputRows(C_Sched_NotCtd_Ctd_qs, Eval_CTDQTY=False)
-                    })
+    SAP_SOH, SummaryReport = fnCountSummaryReport(dtobj_pDate, Rptvariation, dtobj_SAPDate)
 
     AccuracyCutoff = {
                 'DANGER': coerce_float(current_app.config.get('ACCURACY-DANGER', 90)),
@@ -281,12 +219,14 @@ def fnCountSummaryRpt (passedCountDate='CURRENT_DATE', Rptvariation=None):
                 'WARNING': coerce_float(current_app.config.get('ACCURACY-WARNING',95)),
                 }
 
-    ExcelFileNamePrefix = "CountSummary "
-    svdir = current_app.config.get('SAP_FILELOC', os.getcwd())
-    os.makedirs(svdir+'tmpdl', exist_ok=True)
-    fName_base = 'tmpdl/'+ExcelFileNamePrefix + f'{dtobj_pDate:%Y-%m-%d}'
-    fName = svdir + fName_base
-    ExcelFileName = Excelfile_fromqs(Excel_qdict, fName)
+    # the spreadsheet is built only when it's downloaded (fnCountSummaryExport)
+    exportArgs = {'passedCountDate': f'{dtobj_pDate:%Y-%m-%d}'}
+    if SAP_SOH['SAPDate']:
+        exportArgs['sap'] = f'{SAP_SOH["SAPDate"]:%Y-%m-%d}'
+    if Rptvariation:
+        ExportURL = url_for('WICS.CountSummaryExport-v-dt', Rptvariation=Rptvariation, **exportArgs)
+    else:
+        ExportURL = url_for('WICS.CountSummaryExport-dt', **exportArgs)
 
     # display the form
     cntext = {
@@ -296,9 +236,25 @@ def fnCountSummaryRpt (passedCountDate='CURRENT_DATE', Rptvariation=None):
             'SAPDate': SAP_SOH['SAPDate'],
             'AccuracyCutoff': AccuracyCutoff,
             'SummaryReport': SummaryReport,
-            'FilSavLoc': ExcelFileName,
-            'ExcelFileName': fName_base+ExcelWorkbook_fileext,
+            'ExportURL': ExportURL,
             }
     templt = 'ActualCounts/rpt_CountSummary.html'
     return checkTemplate_and_render(templt, **cntext)
 
+@login_required
+def fnCountSummaryExport(passedCountDate, Rptvariation=None):
+    """
+    the Count Summary spreadsheet for passedCountDate:
+        ?fmt=xlsx (the default) or csv&sap=<date; the SAP snapshot nearest it is used - default passedCountDate>
+    """
+    dtobj_pDate = coerce_date(passedCountDate)
+    dtobj_SAPDate = coerce_date(request.args['sap']) if request.args.get('sap') else dtobj_pDate
+    fmt = request.args.get('fmt', 'xlsx')
+    if fmt not in REPORT_EXPORT_FORMATS:
+        return make_response(f'unknown format {fmt!r}; one of {", ".join(REPORT_EXPORT_FORMATS)}', 400)
+
+    return fnReportExport('CountSummary', (f'{dtobj_pDate:%Y-%m-%d}', Rptvariation, f'SAP {dtobj_SAPDate:%Y-%m-%d}'),
+        CountSummaryExportFields,
+        partial(fnCountSummaryExportRows, dtobj_pDate, Rptvariation, dtobj_SAPDate),
+        fmt=fmt)
+# fnCountSummaryExport
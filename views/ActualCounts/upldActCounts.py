@@ -11,14 +11,11 @@ from flask_login import login_required
 from flask_wtf import FlaskForm
 
 from sqlalchemy import (
-    inspect,
-    select, delete,
+    select, delete, insert, update,
     )
 
-from openpyxl import load_workbook
 from openpyxl.utils.datetime import from_excel, WINDOWS_EPOCH
 
-from calvincTools.mathexpr_parser import evaluate
 from calvincTools.utils import (
     coerce_date,
     ExcelWorkbook_fileext,
@@ -30,6 +27,12 @@ from models import (
     UploadSAPResults, ActualCounts, MaterialList,
     async_comm,
     )
+from procs.sprsht_ingest import (
+    SprshtIngest, SprshtIngestError,
+    Sprsht_fileexts,
+    )
+from procs.ctdqty import evaluate, ctdqty_fields
+from procs.uplvalidate import UploadValidation
 
 #### move to calvincTools.utils
 def coerce_bool(val):
@@ -67,6 +70,28 @@ def coerce_bool(val):
 class FatalUploadError(Exception):
     pass
 
+NOTdbFld_flags = ['**NOTdbFld**',]
+SprshtREQUIREDFLDS = ['Material','CountDate','Counter','LOCATION']
+    # LocationOnly/CTD_QTY_Expr handled separately since at least one must be present and both can be
+# Counts worksheet column header -> ActualCounts (or MaterialList) field
+Sprsht_SSName_TableName_map = {
+        'CountDate': 'CountDate',
+        'Counter': 'Counter',
+        'LOCATION': 'LOCATION',
+        'org_id': 'org_id',
+        'Material': 'Material',
+        'LocationOnly': 'LocationOnly',
+        'CTD_QTY_Expr': 'CTD_QTY_Expr',
+        'Typ Cntner Qty': 'TypicalContainerQty',
+        'Typ Plt Qty': 'TypicalPalletQty',
+        'Notes': 'Notes',
+        'PKGID_Desc': 'PKGID_Desc',
+        'TAGQTY': 'TAGQTY',
+        'Poss Not Rcvd': 'FLAG_PossiblyNotRecieved',
+        'Mvmt Dur Ct': 'FLAG_MovementDuringCount',
+        'WICSignore': NOTdbFld_flags[0],
+        }
+
 def cleanupfld(fld, val, CountSprshtDateEpoch = WINDOWS_EPOCH):
     """
     fld is the name of the field in the ActualCount or MaterialList table
@@ -168,78 +193,52 @@ def proc_UpActCountSprsheet_00CopySpreadsheet(reqid) -> str:
         return ""
     svdir = current_app.config.get('SAP_FILELOC', os.getcwd())
     os.makedirs(svdir, exist_ok=True)    
-    fName = os.path.join(svdir, f"tmpCE{uuid.uuid4()}{ExcelWorkbook_fileext}")
+    # keep the extension so a CSV/TSV export is read as one
+    ext = os.path.splitext(CountSprshtFile.filename or '')[1].lower()
+    if ext not in Sprsht_fileexts: ext = ExcelWorkbook_fileext
+    fName = os.path.join(svdir, f"tmpCE{uuid.uuid4()}{ext}")
     CountSprshtFile.save(fName)
 
     return fName
 
-def proc_UpActCountSprsheet_01ReadSheet(reqid: Any, fName: str) -> None:
+def proc_UpActCountSprsheet_01ReadSheet(reqid: Any, fName: str, validate_only: bool = False) -> Any:
+    """
+    read the Counts sheet and post it.  With validate_only, nothing is written: the rows are read,
+    resolved and validated just the same, and the UploadValidation summary of what would have been
+    posted is returned (None if the sheet can't be read at all; async_comm says why)
+    """
     acomm = async_comm.set_async_comm_state(
         reqid,
         statecode = 'rdng-sprsht',
         statetext = 'Reading Spreadsheet',
         )
 
-    NOTdbFld_flags = ['**NOTdbFld**',]
-
-    wb = load_workbook(filename=fName, read_only=True, data_only=True)
-    CountSprshtDateEpoch = wb.epoch
-    if 'Counts' in wb:
-        ws = wb['Counts']
-    else:
+    try:
+        SS = SprshtIngest(fName, Sprsht_SSName_TableName_map, sheetname='Counts')
+    except SprshtIngestError:
         acomm = async_comm.set_async_comm_state(
             reqid,
             statecode = 'fatalerr',
             statetext = 'This workbook does not contain a sheet named Counts in the correct format',
             result = 'FAIL - no Counts sheet',
             )
-        wb.close()
         os.remove(fName)
         return
-    #endif 'Counts' in wb
-
-    SprshtcolmnNames = ws[1]
-    SprshtREQUIREDFLDS = ['Material','CountDate','Counter','LOCATION']
-        # LocationOnly/CTD_QTY_Expr handled separately since at least one must be present and both can be
-    SprshtcolmnMap = {}
-    Sprsht_SSName_TableName_map = {
-            'CountDate': 'CountDate',
-            'Counter': 'Counter',
-            'LOCATION': 'LOCATION',
-            'org_id': 'org_id',
-            'Material': 'Material',
-            'LocationOnly': 'LocationOnly',
-            'CTD_QTY_Expr': 'CTD_QTY_Expr',
-            'Typ Cntner Qty': 'TypicalContainerQty',
-            'Typ Plt Qty': 'TypicalPalletQty',
-            'Notes': 'Notes',
-            'PKGID_Desc': 'PKGID_Desc',
-            'TAGQTY': 'TAGQTY',
-            'Poss Not Rcvd': 'FLAG_PossiblyNotRecieved',
-            'Mvmt Dur Ct': 'FLAG_MovementDuringCount',
-            'WICSignore': NOTdbFld_flags[0],
-            }
-    for col in SprshtcolmnNames:
-        if col.value in Sprsht_SSName_TableName_map:
-            colkey = Sprsht_SSName_TableName_map[str(col.value)]
-            # has this col.value already been mapped?
-            if (colkey in SprshtcolmnMap and SprshtcolmnMap[colkey] is not None):
-                # yes, that's a problem
-                async_comm.set_async_comm_state(
-                    reqid,
-                    statecode = 'fatalerr',
-                    statetext = f'SAP Spreadsheet has bad header row - More than one column named {col.value}.  See Calvin to fix this.',
-                    result = 'FAIL - bad spreadsheet',
-                    )
-                wb.close()
-                os.remove(fName)
-                return
-            else:
-                assert col.column is not None, f"Column {col.value} has no column index"
-                SprshtcolmnMap[colkey] = col.column - 1
-            # endif previously mapped
-        #endif col.value in SAP_SSName_TableName_map
-    #endfor col in SAPcolmnNames
+    #endtry open Counts sheet
+    CountSprshtDateEpoch = SS.epoch
+
+    if SS.duplicatecols:
+        # has this col.value already been mapped?  yes, that's a problem
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = f'SAP Spreadsheet has bad header row - More than one column named {SS.duplicatecols[0]}.  See Calvin to fix this.',
+            result = 'FAIL - bad spreadsheet',
+            )
+        SS.close()
+        os.remove(fName)
+        return
+    SprshtcolmnMap = SS.colmap
 
     HeaderGood = all([(reqFld in SprshtcolmnMap) for reqFld in SprshtREQUIREDFLDS])
     if not HeaderGood:
@@ -250,226 +249,238 @@ def proc_UpActCountSprsheet_01ReadSheet(reqid: Any, fName: str) -> None:
             statetext = f'Counts worksheet has bad header row - missing columns {MissingRequiredFields}.  See Calvin to fix this.',
             result = 'FAIL - bad spreadsheet',
             )
-        wb.close()
+        SS.close()
         os.remove(fName)
         return
 
+    # rows are validated in memory, then written a chunk at a time: one bulk INSERT each for ActualCounts and
+    # UploadSAPResults, one bulk UPDATE for the MaterialList typical qtys they changed, and one transaction
+    chunkSize = max(1, int(current_app.config.get('COUNTUPLOAD_CHUNKSIZE', 1000)))
+
     SprshtRowNum=1
     nRowsAdded = 0
     nRowsNoMaterial = 0
     nRowsErrors = 0
-    numrows = ws.max_row
-    reportEveryNRows = min(100, max(1, numrows//10))
+    numrows = SS.numrows or 0      # 0 if the sheet has no <dimension> (or it's a CSV); progress then just counts up
+    reportEveryNRows = min(100, max(1, numrows//10)) if numrows else 100
 
-    for row in ws.iter_rows(min_row=SprshtRowNum+1, values_only=True):
-        SprshtRowNum += 1
+    # pass 1: read the sheet, keeping the rows to be posted and the Material numbers they name
+    sheetRows:list[tuple[int, tuple]] = []
+    matlnums:set[str] = set()
+    for SprshtRowNum, row in SS.rows():
         if SprshtRowNum % reportEveryNRows == 0:
             async_comm.set_async_comm_state(
                 reqid,
                 statecode = 'rdng-sprsht',
-                statetext = f'Reading Spreadsheet ... record {SprshtRowNum} of {numrows}<br><progress max="{ws.max_row}" value="{SprshtRowNum}"></progress>',
+                statetext = f'Reading Spreadsheet ... record {SprshtRowNum} of {numrows}<br><progress max="{numrows}" value="{SprshtRowNum}"></progress>',
                 )
 
         ignoreline = any([ 
-                        all([   # you mean WICSignore -- say it !!??!!
-                             NOTdbFld_flags[0] in SprshtcolmnMap, 
-                             row[SprshtcolmnMap[NOTdbFld_flags[0]]]
-                             ]),
+                        (   # you mean WICSignore -- say it !!??!!  (and only if the sheet has the column)
+                            NOTdbFld_flags[0] in SprshtcolmnMap
+                            and row[SprshtcolmnMap[NOTdbFld_flags[0]]]
+                            ),
                         row[SprshtcolmnMap['Material']] is None
                     ])
         if not ignoreline:
-            matlnum = cleanupfld('Material', row[SprshtcolmnMap['Material']])['cleanval']
-            # if no org given, check that Material unique.
-            if Sprsht_SSName_TableName_map['org_id'] not in SprshtcolmnMap:
-                spshtorg = None
-            else:
-                spshtorg = cleanupfld('org_id', row[SprshtcolmnMap['org_id']])['cleanval']
-            stmt = select(MaterialList).where(MaterialList.Material==matlnum)
-            matlorglist = app_db.session.execute(stmt).scalars().all()
-            MatlKount = len(matlorglist)
-            MatObj = None
-            err_already_handled = False
-            if MatlKount == 1:
-                MatObj = matlorglist[0]
-                spshtorg = MatObj.org_id
-            if MatlKount > 1:
-                if spshtorg is None:
-                    resRec = UploadSAPResults(
-                        errState = 'error',
-                        errmsg = f"{matlnum} in multiple org_id's {tuple(matlorglist)}, but no org_id given",
-                        rowNum = SprshtRowNum
-                        )
-                    app_db.session.add(resRec)
-                    app_db.session.commit()
-                    nRowsErrors += 1
-                    err_already_handled = True
-                else:
-                    foundorg, foundrec = (rec.org_id, rec) if (rec := next((rec for rec in matlorglist if rec.org_id == spshtorg), None)) else (None, None)
-                    if foundrec is not None:
-                        MatObj = foundrec
-                    else:
-                        resRec = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f"{matlnum} in in multiple org_id's {tuple(rec.org_id for rec in matlorglist)}, but org_id given ({spshtorg}) is not one of them",
-                            rowNum = SprshtRowNum
-                            )
-                        app_db.session.add(resRec)
-                        app_db.session.commit()
-                        nRowsErrors += 1
-                        err_already_handled = True
-                    # endif foundrec is not None
-                #endif spshtorg is None
-            #endif MatKount > 1
-
-            if MatObj is None:
-                if not err_already_handled:
-                    nRowsErrors += 1
-                    resRec = UploadSAPResults(
-                        errState = 'error',
-                        errmsg = f'either {matlnum} does not exist in MaterialList or incorrect org_id ({str(spshtorg)}) given',
-                        rowNum = SprshtRowNum
-                        )
-                    app_db.session.add(resRec)
-                    app_db.session.commit()
-            else:
-                rowErrs = False
-                requiredFields = {reqFld: False for reqFld in SprshtREQUIREDFLDS}
-                requiredFields['Both LocationOnly and CTD_QTY'] = False
-
-                MatChanged = False
-                SRec = ActualCounts()
-                for fldName, colNum in SprshtcolmnMap.items():
-                    if fldName in NOTdbFld_flags: continue
-                    # check/correct problematic data types
-                    usefld, V = cleanupfld(fldName, row[colNum], CountSprshtDateEpoch=CountSprshtDateEpoch).values()
-                    if (V is not None):
-                        if usefld:
-                            if   fldName == 'CountDate':
-                                setattr(SRec, fldName, V)
-                                requiredFields['CountDate'] = True
-                            elif fldName == 'Material':
-                                setattr(SRec, fldName, MatObj)
-                                requiredFields['Material'] = True
-                            elif fldName == 'Counter':
-                                setattr(SRec, fldName, V)
-                                requiredFields['Counter'] = True
-                            elif fldName == 'LOCATION':
-                                setattr(SRec, fldName, V)
-                                requiredFields['LOCATION'] = True
-                            elif fldName == 'LocationOnly':
-                                setattr(SRec, fldName, coerce_bool(V))
-                                requiredFields['Both LocationOnly and CTD_QTY'] = True
-                            elif fldName == 'CTD_QTY_Expr':
-                                setattr(SRec, fldName, V)
-                                requiredFields['Both LocationOnly and CTD_QTY'] = True
-                            elif fldName == 'TypicalContainerQty' \
-                            or fldName == 'TypicalPalletQty':
-                                if V == '' or V == None: V = 0
-                                if V != 0 and V != getattr(MatObj,fldName,0):
-                                    setattr(MatObj, fldName, V)
-                                    MatChanged = True
-                            else:
-                                if hasattr(SRec, fldName): setattr(SRec, fldName, V)
-                            # endif fldname
-                        else:   # usefld is false
-                            if fldName!='CTD_QTY_Expr':
-                                # we have to suspend judgement on CTD_QTY_Expr until last, because this could be a LocationOnly count
-                                rowErrs = True
-                                resRec = UploadSAPResults(
-                                    errState = 'error',
-                                    errmsg = f'{str(V)} is invalid for {fldName}',
-                                    rowNum = SprshtRowNum
-                                    )
-                                app_db.session.add(resRec)
-                                app_db.session.commit()
-                        #endif usefld
-                    #endif (V is not None)
-                # for each column
-
-                # now we determine if one of LocationOnly or CTD_QTY was given
-                if not requiredFields['Both LocationOnly and CTD_QTY']:
-                    fldName = 'CTD_QTY_Expr'
-                    V = row[SprshtcolmnMap[fldName]]
-                    rowErrs = True
-                    resRec = UploadSAPResults(
-                        errState = 'error',
-                        errmsg = f'record is not marked LocationOnly and {str(V)} is invalid for {fldName}',
-                        rowNum = SprshtRowNum
-                        )
-                    app_db.session.add(resRec)
-                    app_db.session.commit()
-                #endif is not LocationOnly and CTD_QTY_Expr is invalid
-
-                # are all required fields present?
-                AllRequiredPresent = True
-                for keyname, Prsnt in requiredFields.items():
-                    AllRequiredPresent = AllRequiredPresent and Prsnt
-                    if not Prsnt:
-                        rowErrs = True
-                        resRec = UploadSAPResults(
-                            errState = 'error',
-                            errmsg = f'{keyname} missing',
-                            rowNum = SprshtRowNum
-                            )
-                        app_db.session.add(resRec)
-                        app_db.session.commit()
-                    #endif keyname not Prsnt
-                #endfor keyname, Prsnt in requiredFields.items()
-
-                if not rowErrs:
-                    app_db.session.add(SRec)
-                    if MatChanged: app_db.session.add(MatObj)
-                    app_db.session.commit()
-                    resultString = str(SRec)
-                    resultString += ' / LOCATION ONLY'  if SRec.LocationOnly else f' / Qty= {SRec.CTD_QTY_Expr}'
-                    resultString += ' (Typ Cont Qty/Typ Plt Qty also changed)' if MatChanged else ''
-                    resRec = UploadSAPResults(
-                        errState = 'success',
-                        errmsg = resultString,
-                        rowNum = SprshtRowNum
-                        )
-                    app_db.session.add(resRec)
-                    app_db.session.commit()
-                    nRowsAdded += 1
-                else:
-                    nRowsErrors += 1
-                #endif not rowErrs
-            # endif MatObj/not MatObj
+            sheetRows.append((SprshtRowNum, row))
+            matlnums.add(cleanupfld('Material', row[SprshtcolmnMap['Material']])['cleanval'])
         else:
             nRowsNoMaterial += 1
         #endif not ignoreline
-    # endfor row in ws.iter_rows
-
-    resRec_Total = UploadSAPResults(
-        errState = 'nRowsTotal',
-        errmsg = '',
-        rowNum = SprshtRowNum
-        )
-    resRec_Added = UploadSAPResults(
-        errState = 'nRowsAdded',
-        errmsg = '',
-        rowNum = nRowsAdded
-        )
-    resRec_Errors = UploadSAPResults(
-        errState = 'nRowsErrors',
-        errmsg = '',
-        rowNum = nRowsErrors
-        )
-    resRec_Ignored = UploadSAPResults(
-        errState = 'nRowsIgnored',
-        errmsg = '',
-        rowNum = nRowsNoMaterial
-        )
-    app_db.session.add_all([resRec_Total, resRec_Added, resRec_Errors, resRec_Ignored])
-    app_db.session.commit()
+    # endfor row in SS.rows()
+    nRowsRead = SprshtRowNum
+    numrows = nRowsRead
 
     # close and kill temp files
-    wb.close()
+    SS.close()
     os.remove(fName)
+
+    # ... and look them all up at once: Material -> [{id, org_id, typical qtys}, one per org]
+    # keyed casefolded, since the Material == matlnum lookup this replaces was case-insensitive in MySQL
+    TypQtyFlds = ('TypicalContainerQty', 'TypicalPalletQty')
+    MatlMap:dict[str, list[dict[str, Any]]] = {}
+    matllist = sorted(matlnums)
+    for i in range(0, len(matllist), chunkSize):
+        stmt = (
+            select(MaterialList.id, MaterialList.Material, MaterialList.org_id, MaterialList.TypicalContainerQty, MaterialList.TypicalPalletQty)
+            .where(MaterialList.Material.in_(matllist[i:i+chunkSize]))
+            .order_by(MaterialList.org_id)
+            )
+        for rec in app_db.session.execute(stmt):
+            MatlMap.setdefault(rec.Material.casefold(), []).append(rec._asdict())
+    # endfor i
+
+    # pass 2: validate each row against MatlMap, queueing what it writes
+    ActCountFlds = set(ActualCounts.__table__.columns.keys())
+    pendingCounts:list[dict[str, Any]] = []
+    pendingResults:list[dict[str, Any]] = []
+    changedMatls:dict[int, dict[str, Any]] = {}
+    validation = UploadValidation() if validate_only else None
+    def addResult(errState:str, errmsg:str, rowNum:int) -> None:
+        if validation is not None:
+            if errState in ('success', 'error'):
+                validation.add('inserts' if errState == 'success' else 'errors', rowNum, errmsg)
+        else:
+            pendingResults.append({'errState': errState, 'errmsg': errmsg, 'rowNum': rowNum})
+    def postPending() -> None:
+        # a validate-only run writes nothing; the chunk is just let go
+        if validation is None:
+            if pendingCounts:
+                # through the Core table: an ORM bulk INSERT would split the chunk up by which columns are None
+                app_db.session.execute(insert(ActualCounts.__table__), pendingCounts)
+            if changedMatls:
+                app_db.session.execute(update(MaterialList), [{'id': id, **{fld: MatObj[fld] for fld in TypQtyFlds}} for id, MatObj in changedMatls.items()])
+            if pendingResults:
+                app_db.session.execute(insert(UploadSAPResults), pendingResults)
+            app_db.session.commit()
+        pendingCounts.clear()
+        pendingResults.clear()
+        changedMatls.clear()
+    # postPending
+
+    for nRow, (SprshtRowNum, row) in enumerate(sheetRows, start=1):
+        if nRow % reportEveryNRows == 0:
+            async_comm.set_async_comm_state(
+                reqid,
+                statecode = 'rdng-sprsht',
+                statetext = f'{"Checking" if validate_only else "Posting"} Counts ... record {SprshtRowNum} of {numrows}<br><progress max="{numrows}" value="{SprshtRowNum}"></progress>',
+                )
+
+        matlnum = cleanupfld('Material', row[SprshtcolmnMap['Material']])['cleanval']
+        # if no org given, check that Material unique.
+        if Sprsht_SSName_TableName_map['org_id'] not in SprshtcolmnMap:
+            spshtorg = None
+        else:
+            spshtorg = cleanupfld('org_id', row[SprshtcolmnMap['org_id']])['cleanval']
+        matlorglist = MatlMap.get(matlnum.casefold(), [])
+        MatlKount = len(matlorglist)
+        MatObj = None
+        err_already_handled = False
+        if MatlKount == 1:
+            MatObj = matlorglist[0]
+            spshtorg = MatObj['org_id']
+        if MatlKount > 1:
+            if spshtorg is None:
+                addResult('error', f"{matlnum} in multiple org_id's {tuple(rec['org_id'] for rec in matlorglist)}, but no org_id given", SprshtRowNum)
+                nRowsErrors += 1
+                err_already_handled = True
+            else:
+                MatObj = next((rec for rec in matlorglist if rec['org_id'] == spshtorg), None)
+                if MatObj is None:
+                    addResult('error', f"{matlnum} in in multiple org_id's {tuple(rec['org_id'] for rec in matlorglist)}, but org_id given ({spshtorg}) is not one of them", SprshtRowNum)
+                    nRowsErrors += 1
+                    err_already_handled = True
+                # endif MatObj is None
+            #endif spshtorg is None
+        #endif MatKount > 1
+
+        if MatObj is None:
+            if not err_already_handled:
+                nRowsErrors += 1
+                addResult('error', f'either {matlnum} does not exist in MaterialList or incorrect org_id ({str(spshtorg)}) given', SprshtRowNum)
+        else:
+            rowErrs = False
+            requiredFields = {reqFld: False for reqFld in SprshtREQUIREDFLDS}
+            requiredFields['Both LocationOnly and CTD_QTY'] = False
+
+            MatTypQtys = {}
+            # every row carries the same keys so a chunk can go out as a single executemany
+            SRec:dict[str, Any] = {fld: None for fld in ('CountDate', 'Counter', 'LOCATION', 'CycCtID', 'CTD_QTY_Expr', 'PKGID_Desc', 'TAGQTY', 'Notes')}
+            SRec.update({'Material_id': MatObj['id'], 'LocationOnly': 0, 'FLAG_PossiblyNotRecieved': 0, 'FLAG_MovementDuringCount': 0})
+            for fldName, colNum in SprshtcolmnMap.items():
+                if fldName in NOTdbFld_flags: continue
+                # check/correct problematic data types
+                usefld, V = cleanupfld(fldName, row[colNum], CountSprshtDateEpoch=CountSprshtDateEpoch).values()
+                if (V is not None):
+                    if usefld:
+                        if   fldName == 'CountDate':
+                            SRec[fldName] = V
+                            requiredFields['CountDate'] = True
+                        elif fldName == 'Material':
+                            requiredFields['Material'] = True
+                        elif fldName == 'Counter':
+                            SRec[fldName] = V
+                            requiredFields['Counter'] = True
+                        elif fldName == 'LOCATION':
+                            SRec[fldName] = V
+                            requiredFields['LOCATION'] = True
+                        elif fldName == 'LocationOnly':
+                            SRec[fldName] = int(coerce_bool(V))
+                            requiredFields['Both LocationOnly and CTD_QTY'] = True
+                        elif fldName == 'CTD_QTY_Expr':
+                            SRec[fldName] = V
+                            requiredFields['Both LocationOnly and CTD_QTY'] = True
+                        elif fldName in TypQtyFlds:
+                            if V == '' or V == None: V = 0
+                            if V != 0 and V != (MatObj[fldName] or 0):
+                                MatTypQtys[fldName] = V
+                        else:
+                            if fldName in ActCountFlds: SRec[fldName] = V
+                        # endif fldname
+                    else:   # usefld is false
+                        if fldName!='CTD_QTY_Expr':
+                            # we have to suspend judgement on CTD_QTY_Expr until last, because this could be a LocationOnly count
+                            rowErrs = True
+                            addResult('error', f'{str(V)} is invalid for {fldName}', SprshtRowNum)
+                    #endif usefld
+                #endif (V is not None)
+            # for each column
+
+            # now we determine if one of LocationOnly or CTD_QTY was given
+            if not requiredFields['Both LocationOnly and CTD_QTY']:
+                fldName = 'CTD_QTY_Expr'
+                V = row[SprshtcolmnMap[fldName]] if fldName in SprshtcolmnMap else None
+                rowErrs = True
+                addResult('error', f'record is not marked LocationOnly and {str(V)} is invalid for {fldName}', SprshtRowNum)
+            #endif is not LocationOnly and CTD_QTY_Expr is invalid
+
+            # are all required fields present?
+            for keyname, Prsnt in requiredFields.items():
+                if not Prsnt:
+                    rowErrs = True
+                    addResult('error', f'{keyname} missing', SprshtRowNum)
+                #endif keyname not Prsnt
+            #endfor keyname, Prsnt in requiredFields.items()
+
+            if not rowErrs:
+                # the bulk INSERT skips the ORM before_insert event, so CTD_QTY_Eval/Invalid are set here
+                SRec.update(ctdqty_fields(SRec['CTD_QTY_Expr']))
+                pendingCounts.append(SRec)
+                MatChanged = bool(MatTypQtys)
+                if MatChanged:
+                    if validation is not None:
+                        for fld, V in MatTypQtys.items():
+                            validation.add('updates', SprshtRowNum, f"{matlnum} (org {MatObj['org_id']}): {fld} {MatObj[fld]!r} -> {V!r}")
+                    MatObj.update(MatTypQtys)
+                    changedMatls[MatObj['id']] = MatObj
+                resultString = f"{SRec['CountDate']} | {matlnum} | {SRec['Counter']} | {SRec['LOCATION']}"
+                resultString += ' / LOCATION ONLY'  if SRec['LocationOnly'] else f" / Qty= {SRec['CTD_QTY_Expr']}"
+                resultString += ' (Typ Cont Qty/Typ Plt Qty also changed)' if MatChanged else ''
+                addResult('success', resultString, SprshtRowNum)
+                nRowsAdded += 1
+            else:
+                nRowsErrors += 1
+            #endif not rowErrs
+        # endif MatObj/not MatObj
+
+        if nRow % chunkSize == 0:
+            postPending()
+    # endfor SprshtRowNum, row in sheetRows
+
+    addResult('nRowsTotal', '', nRowsRead)
+    addResult('nRowsAdded', '', nRowsAdded)
+    addResult('nRowsErrors', '', nRowsErrors)
+    addResult('nRowsIgnored', '', nRowsNoMaterial)
+    postPending()
+    if validation is not None:
+        return validation.as_dict(nRowsRead=nRowsRead - 1, nRowsIgnored=nRowsNoMaterial)
+
 # def done_UpActCountSprsheet_01ReadSheet(t):
     # report done and move to next step
-    statecode = getattr(async_comm.get_async_comm_state(reqid), 'statecode', 'fatalerr')                 # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to fatalerr if we can't get the statecode
-    statetext = getattr(async_comm.get_async_comm_state(reqid), 'statetext', f'No state for {reqid}')    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to fatalerr if we can't get the statecode
+    acomm = async_comm.get_async_comm_record(reqid)     # None if the record has been deleted (e.g. by cleanup after failure)
+    statecode = acomm['statecode'] if acomm else 'fatalerr'
+    statetext = acomm['statetext'] if acomm else f'No state for {reqid}'
     if statecode != 'fatalerr':
         async_comm.set_async_comm_state(
             reqid,
@@ -553,10 +564,18 @@ def fnUploadActCountSprsht():
             # save the file so we can open it as an excel file
             fName = proc_UpActCountSprsheet_00CopySpreadsheet(reqid)
 
-            proc_UpActCountSprsheet_01ReadSheet(reqid, fName)
+            validate_only = request.form.get('validateOnly', False) == 'validate-only'
+            if validate_only:
+                # nothing was written; the browser shows the summary and starts over for the real upload
+                validation = proc_UpActCountSprsheet_01ReadSheet(reqid, fName, validate_only=True)
+                if validation is not None:
+                    async_comm.delete_async_comm(reqid)
+                    return make_response(jsonify(reqid=str(reqid), statecode='validated', validation=validation))
+            else:
+                proc_UpActCountSprsheet_01ReadSheet(reqid, fName)
+            # endif validate_only
 
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.WANT_RESULTS:
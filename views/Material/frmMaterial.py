@@ -13,15 +13,15 @@ from flask import (
     )
 from flask_login import login_required, current_user
 
-from sqlalchemy import select, func, Integer, literal
-from sqlalchemy.orm import selectinload, aliased
+from sqlalchemy import select, Integer, literal
+from sqlalchemy.orm import selectinload
 
 from calvincTools.utils import (
     checkTemplate_and_render,
     coerce_date,
     )
-from calvincTools.mathexpr_parser import eval_arith
 
+from procs.countsummary import fnCountTotals
 from forms.Material.MaterialForm import (
     MaterialForm, 
     CountsSubForm, ScheduleSubForm, MfrPNSubForm,
@@ -32,10 +32,11 @@ from models import (
     WhsePartTypes, Organizations,
     ActualCounts, CountSchedule, 
     MfrPNtoMaterial, 
-    SAP_SOHRecs, UnitsOfMeasure,
+    SAP_SOHSnapshot, SAP_SOHTotals,
     _defaultOrg,
     )
-from views.SAP.procs_SAP import fnSAPList
+from procs.sohsnapshot import SOH_valid_on
+from views.SAP.procs_SAP import fnSAPList, SAP_QTY_FIELDS
 
 from database import app_db
 
@@ -343,9 +344,9 @@ def fnMaterialForm(recNum=-1, gotoRec=False, newRec=False, HistoryCutoffDate=Non
         }
 
     if flow_case == FlowCase.NEW_RECORD:
-        SAP_SOH = fnSAPList(matl='-')
+        SAP_SOH = fnSAPList(matl='-', byMaterial=True, fields=SAP_QTY_FIELDS)
     else:
-        SAP_SOH = fnSAPList(matl=currRec)
+        SAP_SOH = fnSAPList(matl=currRec, byMaterial=True, fields=SAP_QTY_FIELDS)
     # strip out the SAP_SOH structure that is not needed for the template, to simplify and reduce the amount of data sent to the client.
     # currently, fixing fnSAPList to return simpler structure. Remove this when verified that fnSAPList is returning the simpler structure.
     # SAP_SOH = [ 
@@ -354,104 +355,51 @@ def fnMaterialForm(recNum=-1, gotoRec=False, newRec=False, HistoryCutoffDate=Non
     # assert currRec is not None, 'Material record context not available'
     currRec_org = currRec.org or app_db.session.get(Organizations, _defaultOrg)
     gotoForm = {
-        'choicelist': [
-            SimpleNamespace(id=rec.id, Material_org=f'{rec.Material}:{rec.org.orgname}')
-            for rec in app_db.session.query(MaterialList).all()
-        ],
+        # the Material list itself comes from the typeahead (WICS.MaterialSearch)
         'gotoItem': f'{currRec.Material}:{currRec_org.orgname}' if currRec_org and currRec.id and currRec.Material else '',
     }
 
-    SAP = aliased(SAP_SOHRecs)
-
-    mult_subq = (
-        select(UnitsOfMeasure.Multiplier1)
-        .where(UnitsOfMeasure.UOM == SAP.BaseUnitofMeasure)
-        .correlate(SAP)
-        .scalar_subquery()
-    )
-
+    # the Material's SAP total in each snapshot, from the totals kept with the SAP records
     SAPTotals = app_db.session.execute(
         select(
-            SAP.uploaded_at,
-            SAP.MaterialPartNum,
-            func.sum(SAP.Amount).label('SAPQty'),
-            mult_subq.label('mult'),
-        )
-        .where(SAP.Material_id == currRec.id)
-        .group_by(
-            SAP.uploaded_at,
-            SAP.MaterialPartNum,
-            SAP.BaseUnitofMeasure,
+            SAP_SOHSnapshot.uploaded_at,
+            SAP_SOHTotals.SAPTotal,
         )
-        .order_by(SAP.uploaded_at, SAP.MaterialPartNum)
+        .join(SAP_SOHSnapshot, SOH_valid_on(SAP_SOHSnapshot.uploaded_at, SAP_SOHTotals))
+        .where(SAP_SOHTotals.Material_id == currRec.id)
+        .order_by(SAP_SOHSnapshot.uploaded_at)
     ).mappings().all()
 
-    raw_countdata = app_db.session.execute(
-        select(ActualCounts)
-        .where(ActualCounts.Material_id == currRec.id)
-        .order_by(ActualCounts.CountDate, ActualCounts.id)
-    )
-    raw_countdata = [
-        SimpleNamespace(
-            ActualCounts=r.ActualCounts,
-            Material=r.ActualCounts.Material,
-            CountDate=r.ActualCounts.CountDate,
-            QtyEval=0,
-        )
-        for r in raw_countdata
-    ]
-
-    for r in raw_countdata:
-        if r.ActualCounts.CTD_QTY_Expr:
-            try:
-                r.QtyEval = eval_arith(r.ActualCounts.CTD_QTY_Expr)
-            except Exception:
-                r.QtyEval = 0
-        else:
-            r.QtyEval = 0
-
-    LastMaterial = None
-    LastCountDate = None
     summarydata = []
-    summrecdict = {}
-    SAPQty = 0
-    SAPDate = ''
-
-    for r in raw_countdata:
-        if r.Material != LastMaterial or r.CountDate != LastCountDate:
-            LastMaterial = r.Material
-            LastCountDate = r.CountDate
-            SAPTot_dateset = [s for s in SAPTotals if s.MaterialPartNum == r.Material and s.uploaded_at <= r.CountDate]
-            if SAPTot_dateset:
-                SAPDate = max(s.uploaded_at for s in SAPTot_dateset)
-                SQ = next(s for s in SAPTot_dateset if s.uploaded_at == SAPDate)
-                SAPQty = SQ.SAPQty * SQ.mult
+    for ct in fnCountTotals(currRec.id):
+        SAPTot_dateset = [s for s in SAPTotals if s.uploaded_at <= ct['CountDate']]
+        if SAPTot_dateset:
+            SAPDate = max(s.uploaded_at for s in SAPTot_dateset)
+            SQ = next(s for s in SAPTot_dateset if s.uploaded_at == SAPDate)
+            SAPQty = SQ.SAPTotal
+        else:
+            if len(SAPTotals) > 0:
+                SAPDate = SAPTotals[0]['uploaded_at']
+                SQ = SAPTotals[0]
+                SAPQty = SQ['SAPTotal']
             else:
-                if len(SAPTotals) > 0:
-                    SAPDate = SAPTotals[0]['uploaded_at']
-                    SQ = SAPTotals[0]
-                    SAPQty = SQ['SAPQty'] * SQ['mult']
-                else:
-                    SAPDate = ''
-                    SAPQty = 0
-
-            summrecdict = {
-                'Material': r.Material,
-                'CountDate': r.CountDate,
-                'CountQTY_Eval': 0,
-                'SAPDate': SAPDate,
-                'SAPQty': int(SAPQty),
-            }
-
-        PIQty = summrecdict['CountQTY_Eval'] + r.QtyEval
-        summrecdict['CountQTY_Eval'] = PIQty
-        summrecdict['Diff'] = int(PIQty - SAPQty)
+                SAPDate = ''
+                SAPQty = 0
+
+        PIQty = ct['CountQTY_Eval']
         divsr = 1
         if PIQty != 0 or SAPQty != 0:
             divsr = max(PIQty, SAPQty)
-        summrecdict['Accuracy'] = f"{min(PIQty, SAPQty) / divsr * 100:.2f}%"
-
-        summarydata.append(SimpleNamespace(**summrecdict))
+        summarydata.append(SimpleNamespace(
+            Material=currRec,
+            CountDate=ct['CountDate'],
+            CountQTY_Eval=PIQty,
+            SAPDate=SAPDate,
+            SAPQty=int(SAPQty),
+            Diff=int(PIQty - SAPQty),
+            Accuracy=f"{min(PIQty, SAPQty) / divsr * 100:.2f}%",
+        ))
+    # endfor ct
 
     prefixSummary = 'summaryset'
     entries = [
@@ -488,6 +436,7 @@ def fnMaterialForm(recNum=-1, gotoRec=False, newRec=False, HistoryCutoffDate=Non
         'countsummset': summaryFormSet,
         'MPNset': mainFm.subforms['MfrPN'],
         'SAPSet': SAP_SOH,
+        'SAPMatl': SAP_SOH.get('SAPByMaterial', {}).get(currRec.id),
         'changed_data': chgd_dat,
     }
 
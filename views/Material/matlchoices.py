@@ -0,0 +1,16 @@
+from flask import request, jsonify, current_app
+from flask_login import login_required
+
+from procs.matlsearch import search_materials
+
+@login_required
+def fnMaterialSearch_json():
+    """
+    typeahead for the Material goto boxes: ?q=<text>[&limit=n]
+    returns {"q": q, "results": [{"id", "Material_org", "Description"}, ...]}, best match first
+    """
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', current_app.config.get('MATLSEARCH_LIMIT', 25), type=int)
+    limit = max(1, min(limit, int(current_app.config.get('MATLSEARCH_MAXLIMIT', 200))))
+    return jsonify(q=q, results=search_materials(q, limit=limit))
+# fnMaterialSearch_json
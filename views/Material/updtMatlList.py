@@ -1,4 +1,5 @@
-import uuid, os, re as regex, ast
+import uuid, os, datetime, hashlib, re as regex, ast
+from typing import Any
 from enum import Enum
 
 from flask import (
@@ -10,11 +11,13 @@ from flask import (
 from flask_login import login_required
 from flask_wtf import FlaskForm
 
-from sqlalchemy import text, inspect
+from sqlalchemy import (
+    insert, update, delete,
+    and_, or_, case, cast, func, literal, null, union_all,
+    String,
+    )
 from sqlalchemy.sql import select
 
-from openpyxl import load_workbook
-
 # from async_tasks import huey
 
 from calvincTools.utils import (
@@ -24,9 +27,17 @@ from calvincTools.utils import (
 
 from database import (app_db,)
 from models import (
-    tmpMaterialListUpdate, SAPPlants_org,
+    tmpMaterialListUpdate, SAPPlants_org, MaterialListChangeLog, MM60UpdateLedger,
+    MaterialList, Organizations, ActualCounts, CountSchedule, SAP_SOHRecs,
     async_comm
     )
+from procs.sprsht_ingest import (
+    SprshtIngest, SprshtIngestError,
+    Sprsht_fileexts,
+    )
+from procs.matlchanges import notify_material_changes
+from procs.uplvalidate import UploadValidation
+from async_procs.jobrunner import enqueue_job
     
 
 ####################################################################################
@@ -38,6 +49,59 @@ from models import (
 class FatalUploadError(Exception):
     pass
 
+# MM60 (or ZMSQV001) column header -> tmpMaterialListUpdate field
+SAP_SSName_TableName_map = {
+        'Material': 'Material',
+        'Material description': 'Description',
+        'Plant': 'Plant', 'Plnt': 'Plant',
+        'Material type': 'SAPMaterialType',  'MTyp': 'SAPMaterialType',
+        'Material Group': 'SAPMaterialGroup', 'Matl Group': 'SAPMaterialGroup',
+        'Manufact.': 'SAPManuf', 
+        'MPN': 'SAPMPN', 
+        'ABC': 'SAPABC', 
+        'Price': 'Price', 'Standard price': 'Price',
+        'Price unit': 'PriceUnit', 'per': 'PriceUnit',
+        'Currency':'Currency',
+        }
+
+# 02..04 are built on SQLAlchemy Core, so they compile for MySQL and SQLite alike; these are the table aliases their SQL used
+tmpMatl = tmpMaterialListUpdate
+MatlList = MaterialList
+
+# tmpMaterialListUpdate is shared by every MM60 update; each one stages its rows under its own reqid
+# and never reads or deletes anyone else's, so updates can run side by side
+def _staged(reqid):
+    return tmpMatl.reqid == str(reqid)
+
+# each update's MM60UpdateLedger row says how far it got.  _ledger_mark's change goes out with the
+# caller's next commit - the one that commits the phase's own work
+def _ledger(reqid) -> MM60UpdateLedger|None:
+    return app_db.session.get(MM60UpdateLedger, str(reqid), populate_existing=True)
+
+def _ledger_mark(reqid, **vals) -> None:
+    app_db.session.execute(
+        update(MM60UpdateLedger)
+        .where(MM60UpdateLedger.reqid == str(reqid))
+        .values(UpdatedAt = datetime.datetime.now(), **vals)
+        )
+
+def _phase_reached(PhaseDone:str, phase:'PhaseEnum') -> bool:
+    order = [p.value for p in MM60_PIPELINE_PHASES]
+    return order.index(PhaseDone) >= order.index(phase.value)
+
+# Update Existing Records if Changed choices: (Form Name, db fld Name, zero/blank value)
+MM60_UpdateFld_map = [
+    ('Description','Description',''),
+    ('SAPMatlType','SAPMaterialType',''),
+    ('SAPMatlGroup','SAPMaterialGroup',''),
+    ('SAPManuf','SAPManuf',''),
+    ('SAPMPN','SAPMPN',''),
+    ('SAPABC','SAPABC',''),
+    ('SAPPrice','Price',0),
+    ('SAPPrice','PriceUnit',0),
+    ('SAPPrice','Currency',''),
+]
+
 def proc_MatlListSAPSprsheet_00InitUMLasync_comm(reqid, UpdateExistFldList, rmvMissingMaterial=False):
     # these first calls should create the async_comm record with pk=reqid.  All subsequent calls will update that same record until we delete it in the cleanup proc at the end.
     acomm = async_comm.set_async_comm_state(
@@ -45,16 +109,18 @@ def proc_MatlListSAPSprsheet_00InitUMLasync_comm(reqid, UpdateExistFldList, rmvM
         statecode = 'rdng-sprsht-init',
         statetext = 'Initializing ...',
         )   
-    async_comm.set_async_comm_state(
-        f'{reqid}-UpdExstFldList',
-        statecode = 'UpdateExistFldList',
-        statetext = f'{UpdateExistFldList}',
-        )
-    async_comm.set_async_comm_state(
-        f'{reqid}-RmvMissingMatl',
-        statecode = 'RmvMissingMatl',
-        statetext = f'{rmvMissingMaterial}',
-        )
+    # the update's choices go in its ledger, where every phase - and a resumed update - finds them
+    now = datetime.datetime.now()
+    app_db.session.add(MM60UpdateLedger(
+        reqid = str(reqid),
+        UpdateExistFldList = f'{UpdateExistFldList}',
+        RmvMissingMaterial = int(bool(rmvMissingMaterial)),
+        PhaseDone = PhaseEnum.INIT_UPL.value,
+        LastRowNum = 0,
+        StartedAt = now,
+        UpdatedAt = now,
+        ))
+    app_db.session.commit()
 
 def proc_MatlListSAPSprsheet_00CopyUMLSpreadsheet(reqid, uselocalCopy=False):
     acomm = async_comm.set_async_comm_state(
@@ -74,7 +140,10 @@ def proc_MatlListSAPSprsheet_00CopyUMLSpreadsheet(reqid, uselocalCopy=False):
         return
     svdir = current_app.config.get('SAP_FILELOC', os.getcwd()) if not uselocalCopy else ''
     os.makedirs(svdir, exist_ok=True)    
-    fName = svdir+"tmpMatlList"+str(reqid)+ExcelWorkbook_fileext
+    # keep the extension so a CSV/TSV export is read as one
+    ext = os.path.splitext(SAPFile.filename or '')[1].lower()
+    if ext not in Sprsht_fileexts: ext = ExcelWorkbook_fileext
+    fName = svdir+"tmpMatlList"+str(reqid)+ext
     SAPFile.save(fName)
 
     return fName
@@ -123,8 +192,8 @@ def proc_MatlListSAPSprsheet_00ResolveLocalSpreadsheetPath(reqid):
         raise FatalUploadError(statetext)
 
     _, ext = os.path.splitext(local_path)
-    if ext.lower() != ExcelWorkbook_fileext.lower():
-        statetext = f'Local spreadsheet must be an {ExcelWorkbook_fileext} file: {local_path}'
+    if ext.lower() not in Sprsht_fileexts:
+        statetext = f'Local spreadsheet must be one of {", ".join(Sprsht_fileexts)}: {local_path}'
         async_comm.set_async_comm_state(
             reqid,
             statecode = 'fatalerr',
@@ -135,6 +204,56 @@ def proc_MatlListSAPSprsheet_00ResolveLocalSpreadsheetPath(reqid):
 
     return local_path
 
+def _MM60_rowhash(rec:dict[str, Any], UpdFlds:list[tuple[str, Any]]) -> str:
+    """
+    the hash of what 03 would take from a spreadsheet row: the update choices and the row's values for them.
+    A Material whose MM60RowHash matches is already in line with the row, so 01 needn't stage it
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for dbName, zeroVal in UpdFlds:
+        V = rec.get(dbName)
+        if V is not None and zeroVal == 0:
+            try:
+                V = float(V)
+            except (TypeError, ValueError):
+                pass
+        h.update(f'{dbName}\x1f{V!r}\x1e'.encode())
+    return h.hexdigest()
+
+def badMatNum(MatNum) -> bool:
+    # refuse to work with special chars embedded in the MatNum
+    return bool(regex.match(".*[\n\t\xA0].*",str(MatNum)))
+def badMatNum_errmsg(MatNum) -> str:
+    return f'error: {MatNum!a} is an unusable part number. It contains invalid characters and cannot be added to WICS'
+
+def _MatlListSAPSprsheet_Open(reqid, fName, batchsize, cleanup_file=True) -> SprshtIngest:
+    """open the MM60 spreadsheet and check its header row; a bad one is a fatalerr (FatalUploadError)"""
+    def fail_bad_spreadsheet(statetext):
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = statetext,
+            result = 'FAIL - bad spreadsheet',
+            )
+        if cleanup_file and os.path.exists(fName):
+            os.remove(fName)
+        raise FatalUploadError(statetext)
+    # fail_bad_spreadsheet
+
+    try:
+        SS = SprshtIngest(fName, SAP_SSName_TableName_map, batchsize=batchsize)
+    except SprshtIngestError as e:
+        fail_bad_spreadsheet(f'Error: {e}. Please fix this and try again.')
+    if SS.blankheadercols:
+        SS.close()
+        fail_bad_spreadsheet(f"Error: Blank column header found in spreadsheet at column {SS.blankheadercols[0]}. Please fix this and try again.")
+    SAPcol = SS.colmap
+    if ('Material' not in SAPcol or 'Plant' not in SAPcol):
+        SS.close()
+        fail_bad_spreadsheet('SAP Spreadsheet has bad header row. Plant and/or Material is missing.  See Calvin to fix this.')
+    return SS
+# _MatlListSAPSprsheet_Open
+
 # @huey.context_task(thisapp.app_context())
 def proc_MatlListSAPSprsheet_01ReadSpreadsheet(reqid, fName, cleanup_file=True):
     acomm = async_comm.set_async_comm_state(
@@ -153,100 +272,109 @@ def proc_MatlListSAPSprsheet_01ReadSpreadsheet(reqid, fName, cleanup_file=True):
             )
         raise FatalUploadError(statetext)
     
-    app_db.session.query(tmpMaterialListUpdate).delete(synchronize_session=False)
+    # a resumed update carries on after the last chunk it staged; otherwise this update's rows
+    # (from an earlier try) go - other updates' rows are left alone
+    ledger = _ledger(reqid)
+    ResumeAfterRow = ledger.LastRowNum if ledger else 0
+    if not ResumeAfterRow:
+        app_db.session.execute(delete(tmpMatl).where(_staged(reqid)))
+    _ledger_mark(reqid, fName = fName, CleanupFile = int(cleanup_file))
     app_db.session.commit()
     
-    wb = load_workbook(filename=fName, read_only=True)
-    ws = wb.active
-    assert ws is not None, "Error: Spreadsheet appears to be blank. Please fix this and try again."
-    SAPcolmnNames = ws[1]
-    SAPcol:dict[str, int|None] = {'Plant':None,'Material': None}
-    SAP_SSName_TableName_map = {
-            'Material': 'Material',
-            'Material description': 'Description',
-            'Plant': 'Plant', 'Plnt': 'Plant',
-            'Material type': 'SAPMaterialType',  'MTyp': 'SAPMaterialType',
-            'Material Group': 'SAPMaterialGroup', 'Matl Group': 'SAPMaterialGroup',
-            'Manufact.': 'SAPManuf', 
-            'MPN': 'SAPMPN', 
-            'ABC': 'SAPABC', 
-            'Price': 'Price', 'Standard price': 'Price',
-            'Price unit': 'PriceUnit', 'per': 'PriceUnit',
-            'Currency':'Currency',
-            }
-    for col in SAPcolmnNames:
-        assert col.value is not None, f"Error: Blank column header found in spreadsheet at column {col.column}. Please fix this and try again."
-        assert col.column is not None, f"Error: Column with blank header has no column number. This shouldn't happen. Please check the spreadsheet and try again."
-        if col.value in SAP_SSName_TableName_map:
-            colval = str(col.value)
-            SAPcol[SAP_SSName_TableName_map[colval]] = col.column - 1
-    if (SAPcol['Material'] == None or SAPcol['Plant'] == None):
-        statetext = 'SAP Spreadsheet has bad header row. Plant and/or Material is missing.  See Calvin to fix this.'
-        async_comm.set_async_comm_state(
-            reqid,
-            statecode = 'fatalerr',
-            statetext = statetext,
-            result = 'FAIL - bad spreadsheet',
-            )
-
-        wb.close()
-        if cleanup_file and os.path.exists(fName):
-            os.remove(fName)
-        raise FatalUploadError(statetext)
-
-    numrows = ws.max_row
+    # rows are read in chunks and written with one executemany INSERT (and one transaction) per chunk
+    chunkSize = max(1, int(current_app.config.get('MM60_INSERT_CHUNKSIZE', 5000)))
+    SS = _MatlListSAPSprsheet_Open(reqid, fName, chunkSize, cleanup_file)
+
+    # Plant -> org_id, built once rather than a SAPPlants_org lookup per row.  Keyed as strings: a Plant
+    # column stored as numbers is read as ints
+    PlantOrgMap = {str(rec.SAPPlant): rec.org_id for rec in app_db.session.execute(select(SAPPlants_org)).scalars()}
+
+    # rows that would change nothing (their hash is the Material's MM60RowHash) aren't staged, so 02..04
+    # only work through what changed.  If missing Materials are to be removed, they're still staged, but
+    # only as a link - else 02 would take them for missing.  Keyed casefolded, as MySQL compares Materials
+    UpdateExistFldList = ast.literal_eval(ledger.UpdateExistFldList) if ledger else []
+    rmvMissingMaterial = bool(ledger.RmvMissingMaterial) if ledger else False
+    UpdFlds = [(dbName, zeroVal) for formName, dbName, zeroVal in MM60_UpdateFld_map if formName in UpdateExistFldList]
+    stmt = select(MaterialList.id, MaterialList.org_id, MaterialList.Material, MaterialList.MM60RowHash).where(MaterialList.MM60RowHash.is_not(None))
+    LastRowHash = {(org_id, Material.casefold()): (id, RowHash) for id, org_id, Material, RowHash in app_db.session.execute(stmt)}
+
+    numrows = SS.numrows or 0      # 0 if the sheet has no <dimension> (or it's a CSV); progress then just counts up
     nRows = 0
-    reportEveryNRows = min(100, max(1, numrows//10))
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        nRows += 1
-        if nRows % reportEveryNRows == 0:
-            async_comm.set_async_comm_state(
-                reqid,
-                statecode = 'rdng-sprsht',
-                statetext = f'Reading Spreadsheet ... record {nRows} of {numrows}<br><progress max="{numrows}" value="{nRows}"></progress>',
-                )
-
-        if row[SAPcol['Material']]==None: MatNum = ''
-        else: MatNum = row[SAPcol['Material']]
-        validTmpRec = False
-        ## create a blank tmpMaterialListUpdate record,
-        newrec = tmpMaterialListUpdate()
-        if regex.match(".*[\n\t\xA0].*",str(MatNum)):
-            validTmpRec = True
-            ## refuse to work with special chars embedded in the MatNum
-            newrec.recStatus = 'err-MatlNum'
-            newrec.errmsg = f'error: {MatNum!a} is an unusable part number. It contains invalid characters and cannot be added to WICS'
-        elif len(str(MatNum)):
-            validTmpRec = True
-            plant_col = SAPcol['Plant']
-            if plant_col is not None:
-                org_row = SAPPlants_org.query.filter_by(SAPPlant=row[plant_col]).first()
-                if org_row is not None:
-                    newrec.org = org_row.org
-        # endif invalid Material
-        if validTmpRec:
-            ## populate by looping through SAPcol,
-            ## then save
-            for dbColName, ssColNum in SAPcol.items():
-                assert ssColNum is not None, f"Error: Column {dbColName} has no column number. This shouldn't happen. Please check the spreadsheet and try again."
-                setattr(newrec,dbColName,row[ssColNum])
-            
-            app_db.session.add(newrec)
+    nRowsUnchanged = 0
+    reportEveryNRows = min(100, max(1, numrows//10)) if numrows else 100
+    for batch in SS.batches():
+        MaterialCol = batch.columns['Material']
+        PlantCol = batch.columns['Plant']
+        pendingRecs:list[dict[str, Any]] = []
+        linkRecs:list[dict[str, Any]] = []
+        for i in range(len(batch)):
+            nRows += 1
+            if batch.rowNums[i] <= ResumeAfterRow:
+                continue
+            if nRows % reportEveryNRows == 0:
+                async_comm.set_async_comm_state(
+                    reqid,
+                    statecode = 'rdng-sprsht',
+                    statetext = f'Reading Spreadsheet ... record {nRows} of {numrows}<br><progress max="{numrows}" value="{nRows}"></progress>',
+                    )
+
+            if MaterialCol[i]==None: MatNum = ''
+            else: MatNum = MaterialCol[i]
+            validTmpRec = False
+            ## create a blank tmpMaterialListUpdate row
+            # every row carries the same keys so the chunk can go out as a single executemany
+            newrec:dict[str, Any] = {'reqid': reqid, 'org_id': None, 'recStatus': None, 'errmsg': None, 'RowHash': None}
+            if badMatNum(MatNum):
+                validTmpRec = True
+                ## refuse to work with special chars embedded in the MatNum
+                newrec['recStatus'] = 'err-MatlNum'
+                newrec['errmsg'] = badMatNum_errmsg(MatNum)
+            elif len(str(MatNum)):
+                validTmpRec = True
+                newrec['org_id'] = PlantOrgMap.get('' if PlantCol[i] is None else str(PlantCol[i]).strip())
+            # endif invalid Material
+            if validTmpRec:
+                ## populate from the mapped columns,
+                ## then queue for this chunk
+                for dbColName, colvals in batch.columns.items():
+                    newrec[dbColName] = colvals[i]
+                if newrec['recStatus'] is None and newrec['org_id'] is not None:
+                    newrec['RowHash'] = _MM60_rowhash(newrec, UpdFlds)
+                    lastSeen = LastRowHash.get((newrec['org_id'], str(MatNum).casefold()))
+                    if lastSeen is not None and lastSeen[1] == newrec['RowHash']:
+                        nRowsUnchanged += 1
+                        if rmvMissingMaterial:
+                            linkRecs.append({'reqid': reqid, 'org_id': newrec['org_id'], 'Material': MatNum,
+                                'MaterialLink_id': lastSeen[0], 'recStatus': 'FOUND', 'RowHash': newrec['RowHash']})
+                        continue
+                # endif a Material row
+                pendingRecs.append(newrec)
+        # endfor i in batch
+        if batch.rowNums[-1] > ResumeAfterRow:
+            # the chunk and its checkpoint commit together
+            if pendingRecs:
+                app_db.session.execute(insert(tmpMaterialListUpdate), pendingRecs)
+            if linkRecs:
+                app_db.session.execute(insert(tmpMatl.__table__), linkRecs)
+            _ledger_mark(reqid, LastRowNum = batch.rowNums[-1])
             app_db.session.commit()
-    # endfor
+    # endfor batch
 
-    wb.close()
+    SS.close()
+    _ledger_mark(reqid, PhaseDone = PhaseEnum.READ_SPREADSHEET.value)
+    app_db.session.commit()
     if cleanup_file and os.path.exists(fName):
         os.remove(fName)
 
     # report done and move to next step
-    statecode = getattr(async_comm.get_async_comm_state(reqid), 'statecode', 'fatalerr')                 # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to fatalerr if we can't get the statecode
-    statetext = getattr(async_comm.get_async_comm_state(reqid), 'statetext', f'No state for {reqid}')    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to fatalerr if we can't get the statecode
+    acomm = async_comm.get_async_comm_record(reqid)     # None if the record has been deleted (e.g. by cleanup after failure)
+    statecode = acomm['statecode'] if acomm else 'fatalerr'
+    statetext = acomm['statetext'] if acomm else f'No state for {reqid}'
     if statecode != 'fatalerr':
         async_comm.set_async_comm_state(
             reqid,
             statecode = 'done-rdng-sprsht',
-            statetext = f'Finished Reading Spreadsheet',
+            statetext = f'Finished Reading Spreadsheet ({nRowsUnchanged} unchanged Materials skipped)',
             )
         return reqid
     else:
@@ -267,50 +395,63 @@ def proc_MatlListSAPSprsheet_02_identifyexistingMaterial(reqid):
         statecode = 'get-matl-link',
         statetext = f'Finding SAP MM60 Materials already in WICS Material List',
         )
-    UpdMaterialLinkSQL = 'UPDATE WICS_tmpmateriallistupdate, (select id, org_id, Material from WICS_materiallist) as MasterMaterials'
-    UpdMaterialLinkSQL += ' set WICS_tmpmateriallistupdate.MaterialLink_id = MasterMaterials.id, '
-    UpdMaterialLinkSQL += "     WICS_tmpmateriallistupdate.recStatus = 'FOUND' "
-    UpdMaterialLinkSQL += ' where WICS_tmpmateriallistupdate.org_id = MasterMaterials.org_id '
-    UpdMaterialLinkSQL += '   and WICS_tmpmateriallistupdate.Material = MasterMaterials.Material '
-    app_db.session.execute(text(UpdMaterialLinkSQL))
+    # UPDATE ... FROM (a multi-table UPDATE on MySQL)
+    UpdMaterialLinkStmt = (
+        update(tmpMatl)
+        .where(_staged(reqid), tmpMatl.org_id == MatlList.org_id, tmpMatl.Material == MatlList.Material)
+        .values(MaterialLink_id = MatlList.id, recStatus = 'FOUND')
+        .execution_options(synchronize_session=False)
+        )
+    # every step of 02 can be done again, so an interrupted 02 simply runs again
+    app_db.session.execute(UpdMaterialLinkStmt)
     app_db.session.commit()
 
-    rmvMissingMaterial = getattr(async_comm.get_async_comm_state(f"{reqid}-RmvMissingMatl"), 'statetext', 'False')
-    if rmvMissingMaterial in ['True', True]:
+    ledger = _ledger(reqid)
+    rmvMissingMaterial = bool(ledger.RmvMissingMaterial) if ledger else False
+    if rmvMissingMaterial:
         async_comm.set_async_comm_state(
             reqid,
             statecode = 'id-del-matl',
             statetext = f'Identifying WICS Materials no longer in SAP MM60 Materials',
             )
-        MustKeepMatlsSelCond = ''
-        MustKeepMatlsSelCond += ' AND ' if MustKeepMatlsSelCond else ''
-        MustKeepMatlsSelCond += 'id NOT IN (SELECT DISTINCT tmucopy.MaterialLink_id AS Material_id FROM WICS_tmpmateriallistupdate tmucopy WHERE tmucopy.MaterialLink_id IS NOT NULL)'
-        MustKeepMatlsSelCond += ' AND ' if MustKeepMatlsSelCond else ''
-        MustKeepMatlsSelCond += 'id NOT IN (SELECT DISTINCT Material_id FROM WICS_actualcounts)'
-        MustKeepMatlsSelCond += ' AND ' if MustKeepMatlsSelCond else ''
-        MustKeepMatlsSelCond += 'id NOT IN (SELECT DISTINCT Material_id FROM WICS_countschedule)'
-        MustKeepMatlsSelCond += ' AND ' if MustKeepMatlsSelCond else ''
-        MustKeepMatlsSelCond += 'id NOT IN (SELECT DISTINCT Material_id FROM WICS_sap_sohrecs)'
-
-        DeleteMatlsSelectSQL = "INSERT INTO WICS_tmpmateriallistupdate (recStatus, delMaterialLink, MaterialLink_id, org_id, Material, Description, Plant "
-        DeleteMatlsSelectSQL += ", SAPMaterialType, SAPMaterialGroup, Currency  ) "    # these can go once I set null=True on these fields
-        DeleteMatlsSelectSQL += " SELECT  concat('DEL ',FORMAT(id,0)), id, NULL, org_id, Material, Description, Plant "
-        DeleteMatlsSelectSQL += ", SAPMaterialType, SAPMaterialGroup, Currency  "    # these can go once I set null=True on these fields
-        DeleteMatlsSelectSQL += " FROM WICS_materiallist"
-        DeleteMatlsSelectSQL += f" WHERE ({MustKeepMatlsSelCond})"
-        app_db.session.execute(text(DeleteMatlsSelectSQL))
+        MustKeepMatlsSelCond = and_(
+            MatlList.id.not_in(select(tmpMatl.MaterialLink_id).where(_staged(reqid), tmpMatl.MaterialLink_id.is_not(None)).distinct()),
+            MatlList.id.not_in(select(ActualCounts.Material_id).distinct()),
+            MatlList.id.not_in(select(CountSchedule.Material_id).distinct()),
+            MatlList.id.not_in(select(SAP_SOHRecs.Material_id).distinct()),
+            )
+
+        DeleteMatlsSelect = (
+            select(
+                literal(str(reqid), String), literal('DEL ', String) + cast(MatlList.id, String), MatlList.id, null(), MatlList.org_id, MatlList.Material, MatlList.Description, MatlList.Plant,
+                MatlList.SAPMaterialType, MatlList.SAPMaterialGroup, MatlList.Currency,     # these can go once I set null=True on these fields
+                )
+            .where(MustKeepMatlsSelCond)
+            )
+        DeleteMatlsSelectStmt = insert(tmpMatl).from_select(
+            ['reqid', 'recStatus', 'delMaterialLink', 'MaterialLink_id', 'org_id', 'Material', 'Description', 'Plant',
+                'SAPMaterialType', 'SAPMaterialGroup', 'Currency'],
+            DeleteMatlsSelect,
+            )
+        # (replacing any DEL rows an earlier try left)
+        app_db.session.execute(delete(tmpMatl).where(_staged(reqid), tmpMatl.recStatus.like('DEL%')))
+        app_db.session.execute(DeleteMatlsSelectStmt)
         app_db.session.commit()
-    # end if rmvMissingMaterial in ('True', True)
+    # end if rmvMissingMaterial
 
     async_comm.set_async_comm_state(
         reqid,
         statecode = 'id-add-matl',
         statetext = f'Identifying SAP MM60 Materials new to WICS',
         )
-    MarkAddMatlsSelectSQL = "UPDATE WICS_tmpmateriallistupdate"
-    MarkAddMatlsSelectSQL += " SET recStatus = 'ADD'"
-    MarkAddMatlsSelectSQL += " WHERE (MaterialLink_id IS NULL) AND (recStatus is NULL)"
-    app_db.session.execute(text(MarkAddMatlsSelectSQL))
+    MarkAddMatlsStmt = (
+        update(tmpMatl)
+        .where(_staged(reqid), tmpMatl.MaterialLink_id.is_(None), tmpMatl.recStatus.is_(None))
+        .values(recStatus = 'ADD')
+        .execution_options(synchronize_session=False)
+        )
+    app_db.session.execute(MarkAddMatlsStmt)
+    _ledger_mark(reqid, PhaseDone = PhaseEnum.IDENTIFY_EXIST.value)
     app_db.session.commit()
 
     # report done and move to next step
@@ -329,43 +470,65 @@ def proc_MatlListSAPSprsheet_03_UpdateExistingRecs(reqid):
         acomm = async_comm.set_async_comm_state(
             reqid,
             statecode = 'upd-existing-recs',
-            statetext = f'Updating _{fldName}_ Field in Existing Records',
+            statetext = f'Updating _{fldName}_ Field(s) in Existing Records',
             )
 
     setstate_MatlListSAPSprsheet_03_UpdateExistingRecs('')
 
-    # (Form Name, db fld Name, zero/blank value)
-    FormTodbFld_map = [
-        ('Description','Description','""'),
-        ('SAPMatlType','SAPMaterialType','""'),
-        ('SAPMatlGroup','SAPMaterialGroup','""'),
-        ('SAPManuf','SAPManuf','""'),
-        ('SAPMPN','SAPMPN','""'),
-        ('SAPABC','SAPABC','""'),
-        ('SAPPrice','Price',0),
-        ('SAPPrice','PriceUnit',0),
-        ('SAPPrice','Currency','""'),
-    ]
-
-    UpdateExistFldList_str = getattr(async_comm.get_async_comm_state(f"{reqid}-UpdExstFldList"), 'statetext', '[]')    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to '' if we can't get the statetext
-    UpdateExistFldList = ast.literal_eval(UpdateExistFldList_str)
-
-    if UpdateExistFldList:
-        for formName, dbName, zeroVal in FormTodbFld_map:
-            if formName in UpdateExistFldList:
-                setstate_MatlListSAPSprsheet_03_UpdateExistingRecs(dbName)
-                # UPDATE this field
-                UpdSQLSetStmt = f"MatlList.{dbName}=tmpMatl.{dbName}"
-                UpdSQLWhereStmt = f"(IFNULL(tmpMatl.{dbName},{zeroVal}) != {zeroVal} AND IFNULL(MatlList.{dbName},{zeroVal})!=IFNULL(tmpMatl.{dbName},{zeroVal}))"
-
-                UpdSQLStmt = "UPDATE WICS_materiallist AS MatlList, WICS_tmpmateriallistupdate AS tmpMatl"
-                UpdSQLStmt += f" SET {UpdSQLSetStmt}"
-                UpdSQLStmt += f" WHERE (tmpMatl.MaterialLink_id=MatlList.id) AND {UpdSQLWhereStmt}"
-                app_db.session.execute(text(UpdSQLStmt))
-                app_db.session.commit()
-            #endif formName in UpdateExistFldList
-        #endfor
-    # endif UpdateExistFldList not empty
+    FormTodbFld_map = MM60_UpdateFld_map
+
+    ledger = _ledger(reqid)
+    UpdateExistFldList = ast.literal_eval(ledger.UpdateExistFldList) if ledger else []
+
+    UpdFlds = [(dbName, zeroVal) for formName, dbName, zeroVal in FormTodbFld_map if formName in UpdateExistFldList]
+    if UpdFlds:
+        setstate_MatlListSAPSprsheet_03_UpdateExistingRecs('/'.join(dbName for dbName, _ in UpdFlds))
+        # the test for "this field changed", per field: IFNULL(tmp,zero) != zero AND IFNULL(MatlList,zero) != IFNULL(tmp,zero)
+        ChgCond = {
+            dbName: and_(
+                func.coalesce(getattr(tmpMatl, dbName), zeroVal) != zeroVal,
+                func.coalesce(getattr(MatlList, dbName), zeroVal) != func.coalesce(getattr(tmpMatl, dbName), zeroVal),
+                )
+            for dbName, zeroVal in UpdFlds}
+
+        # log the changes first, while MatlList still has the old values: one INSERT ... SELECT for all the fields
+        LogSelects = [
+            select(
+                literal(str(reqid), String), func.now(), MatlList.id, MatlList.org_id, MatlList.Material, literal(dbName, String),
+                cast(getattr(MatlList, dbName), String), cast(getattr(tmpMatl, dbName), String),
+                )
+            .join_from(MatlList, tmpMatl, tmpMatl.MaterialLink_id == MatlList.id)
+            .where(_staged(reqid), Cond)
+            for dbName, Cond in ChgCond.items()]
+        LogStmt = insert(MaterialListChangeLog).from_select(
+            ['reqid', 'ChangedAt', 'Material_id', 'org_id', 'Material', 'FieldName', 'OldValue', 'NewValue'],
+            union_all(*LogSelects),
+            )
+        app_db.session.execute(LogStmt)
+
+        # then UPDATE every field in one pass over the join; a field keeps its value unless its own test says it changed
+        UpdStmt = (
+            update(MatlList)
+            .where(_staged(reqid), tmpMatl.MaterialLink_id == MatlList.id, or_(*ChgCond.values()))
+            .values({
+                getattr(MatlList, dbName): case((Cond, getattr(tmpMatl, dbName)), else_=getattr(MatlList, dbName))
+                for dbName, Cond in ChgCond.items()})
+            .execution_options(synchronize_session=False)
+            )
+        app_db.session.execute(UpdStmt)
+    # endif UpdFlds not empty
+
+    # each linked Material is now in line with its row; remember the row's hash for 01's unchanged-row skip next time
+    RowHashStmt = (
+        update(MatlList)
+        .where(_staged(reqid), tmpMatl.MaterialLink_id == MatlList.id, tmpMatl.RowHash.is_not(None))
+        .where(or_(MatlList.MM60RowHash.is_(None), MatlList.MM60RowHash != tmpMatl.RowHash))
+        .values(MM60RowHash = tmpMatl.RowHash)
+        .execution_options(synchronize_session=False)
+        )
+    app_db.session.execute(RowHashStmt)
+    _ledger_mark(reqid, PhaseDone = PhaseEnum.UPDATE_EXISTING.value)
+    app_db.session.commit()
 
     # report done and move to next step
     async_comm.set_async_comm_state(
@@ -380,8 +543,8 @@ def proc_MatlListSAPSprsheet_03_UpdateExistingRecs(reqid):
 def proc_MatlListSAPSprsheet_04_Remove(reqid):
 # temporarily skipped ...
 
-    doRmv_str = getattr(async_comm.get_async_comm_state(f"{reqid}-RmvMissingMatl"), 'statetext', 'False')
-    doRmv = doRmv_str in [True, 'True'] # ast.literal_eval(doRmv_str)
+    ledger = _ledger(reqid)
+    doRmv = bool(ledger.RmvMissingMaterial) if ledger else False
 
     if not doRmv:
         async_comm.set_async_comm_state(
@@ -398,29 +561,18 @@ def proc_MatlListSAPSprsheet_04_Remove(reqid):
             statetext = f'Removing WICS Materials no longer in SAP MM60 Materials',
             )
 
-        # do the Removals
-        ## DeleteMatlsDoitSQL = "DELETE FROM WICS_materiallist"
-        ## DeleteMatlsDoitSQL += f" WHERE ({MustKeepMatlsDelCond})"
-        DeleteMatlsDoitSQL = 'DELETE MATL'
-        DeleteMatlsDoitSQL += ' FROM WICS_materiallist AS MATL INNER JOIN WICS_tmpmateriallistupdate AS TMP'
-        DeleteMatlsDoitSQL += '    ON MATL.id = TMP.delMaterialLink'
-        DeleteMatlsDoitSQL += ' WHERE TMP.recStatus like "DEL%"'
-        app_db.session.execute(text(DeleteMatlsDoitSQL))
+        # do the Removals; the ids come from a subquery, since SQLite has no multi-table DELETE
+        DeleteMatlsDoitStmt = (
+            delete(MatlList)
+            .where(MatlList.id.in_(select(tmpMatl.delMaterialLink).where(_staged(reqid), tmpMatl.recStatus.like('DEL%'))))
+            .execution_options(synchronize_session=False)
+            )
+        app_db.session.execute(DeleteMatlsDoitStmt)
+        _ledger_mark(reqid, PhaseDone = PhaseEnum.REMOVE.value)
         app_db.session.commit()
     # endif doRmv
 
     # report done and move to next step    
-    mandatorytaskdonekey = f'MatlX{reqid}'
-    statecodeVal = ".03D."
-    existingstatecode = ''
-    if async_comm.async_comm_exists(mandatorytaskdonekey): 
-        existingstatecode = getattr(async_comm.get_async_comm_state(mandatorytaskdonekey), 'statecode', '')    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to '' if we can't get the statecode
-    MatlXval = existingstatecode + statecodeVal
-    async_comm.set_async_comm_state(
-        mandatorytaskdonekey,
-        statecode = MatlXval,
-        statetext = '',
-        )
     async_comm.set_async_comm_state(
         reqid,
         statecode = 'done-del-matl',
@@ -438,25 +590,23 @@ def proc_MatlListSAPSprsheet_04_Add(reqid):
     # phase out the UNKNOWN type; just leave WhsePartType_id blank for new records until we can get a real type assigned in WICS
     # UnknownTypeID = WhsePartTypes.objects.using(dbToUse).get(WhsePartType=WICS.globals._PartTypeName_UNKNOWN)
 
-    # do the adds
-    # one day django will implement insert ... select.  Until then ...
-    # come back to this one day and rewrite it to use the ORM instead of raw SQL;
-    AddMatlsSelectSQL = "SELECT"
-    # AddMatlsSelectSQL += " org_id, Material, Description, Plant, " + str(UnknownTypeID.pk) + " AS PartType_id,"
-    AddMatlsSelectSQL += " org_id, Material, Description, Plant,"
-    AddMatlsSelectSQL += " SAPMaterialType, SAPMaterialGroup, Price, PriceUnit, Currency,"
-    AddMatlsSelectSQL += " '' AS TypicalContainerQty, '' AS TypicalPalletQty, '' AS Notes"
-    AddMatlsSelectSQL += " FROM WICS_tmpmateriallistupdate"
-    AddMatlsSelectSQL += " WHERE (MaterialLink_id IS NULL) AND (recStatus = 'ADD') "
-
-    AddMatlsDoitSQL = "INSERT INTO WICS_materiallist"
-    # AddMatlsDoitSQL += " (org_id, Material, Description, Plant, PartType_id,"
-    AddMatlsDoitSQL += " (org_id, Material, Description, Plant,"
-    AddMatlsDoitSQL += " SAPMaterialType, SAPMaterialGroup, Price, PriceUnit, Currency,"
-    AddMatlsDoitSQL += " TypicalContainerQty, TypicalPalletQty, Notes)"
-    AddMatlsDoitSQL += " " + AddMatlsSelectSQL
-    
-    app_db.session.execute(text(AddMatlsDoitSQL))
+    # do the adds - of the Materials not already there, so an interrupted 04Add simply runs again
+    AddMatlsSelect = (
+        select(
+            tmpMatl.org_id, tmpMatl.Material, tmpMatl.Description, tmpMatl.Plant,
+            tmpMatl.SAPMaterialType, tmpMatl.SAPMaterialGroup, tmpMatl.Price, tmpMatl.PriceUnit, tmpMatl.Currency,
+            literal('', String), literal('', String), literal('', String), tmpMatl.RowHash,
+            )
+        .where(_staged(reqid), tmpMatl.MaterialLink_id.is_(None), tmpMatl.recStatus == 'ADD')
+        .where(~select(MatlList.id).where(MatlList.org_id == tmpMatl.org_id, MatlList.Material == tmpMatl.Material).exists())
+        )
+    AddMatlsDoitStmt = insert(MatlList).from_select(
+        ['org_id', 'Material', 'Description', 'Plant',
+            'SAPMaterialType', 'SAPMaterialGroup', 'Price', 'PriceUnit', 'Currency',
+            'TypicalContainerQty', 'TypicalPalletQty', 'Notes', 'MM60RowHash'],
+        AddMatlsSelect,
+        )
+    app_db.session.execute(AddMatlsDoitStmt)
     app_db.session.commit()
 
     async_comm.set_async_comm_state(
@@ -464,26 +614,18 @@ def proc_MatlListSAPSprsheet_04_Add(reqid):
         statecode = 'add-matl-get-recid',
         statetext = f'Getting Record ids of SAP MM60 Materials new to WICS',
         )
-    UpdMaterialLinkSQL = 'UPDATE WICS_tmpmateriallistupdate, (select id, org_id, Material from WICS_materiallist) as MasterMaterials'
-    UpdMaterialLinkSQL += ' set WICS_tmpmateriallistupdate.MaterialLink_id = MasterMaterials.id '
-    UpdMaterialLinkSQL += ' where WICS_tmpmateriallistupdate.org_id = MasterMaterials.org_id '
-    UpdMaterialLinkSQL += '   and WICS_tmpmateriallistupdate.Material = MasterMaterials.Material '
-    UpdMaterialLinkSQL += "   and (MaterialLink_id IS NULL) AND (recStatus = 'ADD')"
-    app_db.session.execute(text(UpdMaterialLinkSQL))
+    UpdMaterialLinkStmt = (
+        update(tmpMatl)
+        .where(tmpMatl.org_id == MatlList.org_id, tmpMatl.Material == MatlList.Material)
+        .where(_staged(reqid), tmpMatl.MaterialLink_id.is_(None), tmpMatl.recStatus == 'ADD')
+        .values(MaterialLink_id = MatlList.id)
+        .execution_options(synchronize_session=False)
+        )
+    app_db.session.execute(UpdMaterialLinkStmt)
+    _ledger_mark(reqid, PhaseDone = PhaseEnum.ADD.value)
     app_db.session.commit()
 
     # report done and move to next step
-    mandatorytaskdonekey = f'MatlX{reqid}'
-    statecodeVal = ".03A."
-    existingstatecode = ''
-    if async_comm.async_comm_exists(mandatorytaskdonekey):
-        existingstatecode = getattr(async_comm.get_async_comm_state(mandatorytaskdonekey), 'statecode', '')    # if the record has been deleted (e.g. by cleanup after failure), this will throw an exception, so default to '' if we can't get the statecode
-    MatlXval = existingstatecode + statecodeVal
-    async_comm.set_async_comm_state(
-        mandatorytaskdonekey,
-        statecode = MatlXval,
-        statetext = '',
-        )
     async_comm.set_async_comm_state(
         reqid,
         statecode = 'done-add-matl',
@@ -499,14 +641,11 @@ def proc_MatlListSAPSprsheet_99_FinalProc(reqid):
         statetext = 'Finished Processing Spreadsheet',
         )
     
-def proc_MatlListSAPSprsheet_99_Cleanup(reqid):
+def proc_MatlListSAPSprsheet_99_Cleanup(reqid, clear_tmptable=True):
 
     # also kill reqid, acomm, qcluster process
     keylist = [
         reqid, 
-        f"{reqid}-UpdExstFldList",
-        f"{reqid}-RmvMissingMatl",
-        f"MatlX{reqid}",
         ]
     for key in keylist:
         async_comm.delete_async_comm(key)
@@ -523,9 +662,209 @@ def proc_MatlListSAPSprsheet_99_Cleanup(reqid):
     # except AttributeError:
     #     pass
 
-    # delete the temporary table
-    app_db.session.query(tmpMaterialListUpdate).delete(synchronize_session=False)
+    # delete this update's ledger and staging rows (a validate-only run never staged any)
+    app_db.session.execute(delete(MM60UpdateLedger).where(MM60UpdateLedger.reqid == str(reqid)))
+    if clear_tmptable:
+        app_db.session.execute(delete(tmpMatl).where(_staged(reqid)))
     app_db.session.commit()
+# proc_MatlListSAPSprsheet_99_Cleanup
+
+def proc_MatlListSAPSprsheet_99_PurgeAbandoned(maxAgeSecs:float|None = None) -> list[str]:
+    """
+    the janitor: clean up after MM60 updates that were started and never finished (browser closed,
+    worker killed, ...).  An update is abandoned once neither its async_comm record nor its ledger
+    has been touched in maxAgeSecs (MM60_STAGING_MAXAGE_SECS); until then it can be resumed.
+    Returns the reqids purged
+    """
+    if maxAgeSecs is None:
+        maxAgeSecs = float(current_app.config.get('MM60_STAGING_MAXAGE_SECS', 6*3600))
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=maxAgeSecs)
+
+    # async_comm may live in another database, so the updates are checked one by one
+    ledgerUpdatedAt = dict(app_db.session.execute(select(MM60UpdateLedger.reqid, MM60UpdateLedger.UpdatedAt)).tuples().all())
+    reqids = set(app_db.session.scalars(select(tmpMatl.reqid).distinct())) | set(ledgerUpdatedAt)
+    purged = []
+    for reqid in reqids:
+        acomm = async_comm.get_async_comm_record(reqid) if reqid is not None else None
+        lastSeen = max((t for t in (acomm and acomm['timestamp'], ledgerUpdatedAt.get(reqid)) if t), default=None)
+        if lastSeen is None or lastSeen < cutoff:
+            if reqid is None:
+                # staged before rows carried a reqid
+                app_db.session.execute(delete(tmpMatl).where(tmpMatl.reqid.is_(None)))
+                app_db.session.commit()
+            else:
+                proc_MatlListSAPSprsheet_99_Cleanup(reqid)
+            purged.append(reqid)
+    # endfor reqid
+    return purged
+# proc_MatlListSAPSprsheet_99_PurgeAbandoned
+
+def proc_MatlListSAPSprsheet_RunPipeline(reqid, fName=None, cleanup_file=True):
+    """
+    the whole MM60 chain (01ReadSpreadsheet .. 04Add, then 'done'), run by the background job runner
+    (async_procs.jobrunner) that INIT_UPL enqueues it on.  Progress goes to async_comm as each proc runs.
+    Phases the update's ledger says are done are skipped, so RESUME runs this again (fName None: the
+    spreadsheet named in the ledger) to carry on an interrupted update
+    """
+    try:
+        ledger = _ledger(reqid)
+        if ledger is None:
+            statetext = f'Error: there is no Material List update {reqid} to run.'
+            async_comm.set_async_comm_state(
+                reqid,
+                statecode = 'fatalerr',
+                statetext = statetext,
+                result = 'FAIL - no ledger',
+                )
+            raise FatalUploadError(statetext)
+        if fName is None:
+            fName, cleanup_file = ledger.fName or '', bool(ledger.CleanupFile)
+        PhaseDone = ledger.PhaseDone
+
+        pipeline = [
+            (PhaseEnum.READ_SPREADSHEET, lambda: proc_MatlListSAPSprsheet_01ReadSpreadsheet(reqid, fName, cleanup_file=cleanup_file)),
+            (PhaseEnum.IDENTIFY_EXIST, lambda: proc_MatlListSAPSprsheet_02_identifyexistingMaterial(reqid)),
+            (PhaseEnum.UPDATE_EXISTING, lambda: proc_MatlListSAPSprsheet_03_UpdateExistingRecs(reqid)),
+            # skip removals for now; just go straight to the adds (see PhaseEnum.REMOVE)
+            # (PhaseEnum.REMOVE, lambda: proc_MatlListSAPSprsheet_04_Remove(reqid)),
+            (PhaseEnum.ADD, lambda: proc_MatlListSAPSprsheet_04_Add(reqid)),
+            ]
+        for phase, proc in pipeline:
+            if not _phase_reached(PhaseDone, phase):
+                proc()
+        # endfor phase
+        proc_MatlListSAPSprsheet_99_FinalProc(reqid)
+    except FatalUploadError:
+        # the failing proc has already set statecode 'fatalerr'; the browser sees it on the SSE stream
+        pass
+    except Exception as e:
+        app_db.session.rollback()
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = f'Error: Something went wrong while updating the Material List. Details: {e}',
+            result = 'FAIL - exception in background job',
+            )
+        raise
+    finally:
+        # 03/04 write MaterialList with bulk SQL, which the material caches' session events don't see
+        notify_material_changes(None)
+    return reqid
+# proc_MatlListSAPSprsheet_RunPipeline
+
+def _MM60_changed(new, old, zeroVal) -> bool:
+    # 03's test, IFNULL(tmp,zero) != zero AND IFNULL(MatlList,zero) != IFNULL(tmp,zero), with MySQL's case-insensitive string compare
+    if zeroVal == 0:
+        new, old = float(new or 0), float(old or 0)
+        return new != 0 and old != new
+    new, old = str(new or ''), str(old or '')
+    return new != '' and old.casefold() != new.casefold()
+
+def proc_MatlListSAPSprsheet_Validate(reqid, fName, UpdateExistFldList, rmvMissingMaterial=False, cleanup_file=True) -> dict[str, Any]:
+    """
+    a validate-only MM60 update: 01ReadSpreadsheet .. 04Add worked out in memory, writing nothing.
+    The sheet is read a column batch at a time and matched against one read of MaterialList (and,
+    with rmvMissingMaterial, one read each of the Material ids that counts, schedules and SOH
+    records keep).  Returns the UploadValidation summary of the adds, updates, removals and errors
+    """
+    async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'validating',
+        statetext = 'Checking Spreadsheet',
+        )
+    chunkSize = max(1, int(current_app.config.get('MM60_INSERT_CHUNKSIZE', 5000)))
+    SS = _MatlListSAPSprsheet_Open(reqid, fName, chunkSize, cleanup_file)
+
+    PlantOrgMap = {str(rec.SAPPlant): rec.org_id for rec in app_db.session.execute(select(SAPPlants_org)).scalars()}
+    UpdFlds = [(dbName, zeroVal) for formName, dbName, zeroVal in MM60_UpdateFld_map if formName in UpdateExistFldList]
+    # 02 links on org_id + Material; keyed casefolded, as MySQL compares them
+    stmt = select(MaterialList.id, MaterialList.org_id, MaterialList.Material, *[getattr(MaterialList, dbName) for dbName, _ in UpdFlds])
+    MatlMap = {(rec.org_id, rec.Material.casefold()): rec for rec in app_db.session.execute(stmt)}
+    tmpCols = tmpMaterialListUpdate.__table__.columns
+
+    validation = UploadValidation()
+    linkedIds:set[int] = set()
+    addRows:dict[tuple[int, str], int] = {}        # (org_id, Material) -> the row that would add it
+    numrows = SS.numrows or 0
+    nRows = 0
+    reportEveryNRows = min(100, max(1, numrows//10)) if numrows else 100
+    for batch in SS.batches():
+        for i, rowNum in enumerate(batch.rowNums):
+            nRows += 1
+            if nRows % reportEveryNRows == 0:
+                async_comm.set_async_comm_state(
+                    reqid,
+                    statecode = 'validating',
+                    statetext = f'Checking Spreadsheet ... record {nRows} of {numrows}<br><progress max="{numrows}" value="{nRows}"></progress>',
+                    )
+            MatNum = batch.columns['Material'][i]
+            if MatNum is None or not len(str(MatNum)):
+                continue
+            MatNum = str(MatNum)
+            if badMatNum(MatNum):
+                validation.add('errors', rowNum, badMatNum_errmsg(MatNum))
+                continue
+
+            # the row as tmpMaterialListUpdate would take it
+            newrec:dict[str, Any] = {}
+            rowErrs:list[str] = []
+            for dbColName, colvals in batch.columns.items():
+                V = colvals[i]
+                coltype = tmpCols[dbColName].type
+                if V is not None and coltype.python_type is not str:
+                    try:
+                        V = int(float(V)) if coltype.python_type is int else float(V)
+                    except (TypeError, ValueError):
+                        rowErrs.append(f'{V!r} is not a number, for {dbColName}')
+                elif V is not None:
+                    V = str(V)
+                    if coltype.length and len(V) > coltype.length:
+                        rowErrs.append(f'{dbColName} is longer than {coltype.length} characters')
+                newrec[dbColName] = V
+            # endfor dbColName
+            Plant = '' if batch.columns['Plant'][i] is None else str(batch.columns['Plant'][i]).strip()
+            org_id = PlantOrgMap.get(Plant)
+            if org_id is None:
+                rowErrs.append(f"Plant {Plant!r} is not assigned to a WICS org")
+            if rowErrs:
+                for errmsg in rowErrs:
+                    validation.add('errors', rowNum, f'{MatNum}: {errmsg}')
+                continue
+
+            key = (org_id, MatNum.casefold())
+            existing = MatlMap.get(key)
+            if existing is not None:
+                linkedIds.add(existing.id)
+                for dbName, zeroVal in UpdFlds:
+                    if dbName in newrec and _MM60_changed(newrec[dbName], getattr(existing, dbName), zeroVal):
+                        validation.add('updates', rowNum, f'{MatNum} (org {org_id}): {dbName} {getattr(existing, dbName)!r} -> {newrec[dbName]!r}')
+                # endfor dbName
+            elif key in addRows:
+                validation.add('errors', rowNum, f'{MatNum} (org {org_id}) is new to WICS, but is also in row {addRows[key]}; it can only be added once')
+            elif not newrec.get('Description'):
+                validation.add('errors', rowNum, f'{MatNum} (org {org_id}) is new to WICS, but has no Material description')
+            else:
+                addRows[key] = rowNum
+                validation.add('inserts', rowNum, f"{MatNum} (org {org_id}): {newrec['Description']}")
+            # endif existing/new
+        # endfor i in batch
+    # endfor batch
+    SS.close()
+    if cleanup_file and os.path.exists(fName):
+        os.remove(fName)
+
+    if rmvMissingMaterial:
+        # 02's MustKeepMatlsSelCond
+        keepIds = set(linkedIds)
+        for model in (ActualCounts, CountSchedule, SAP_SOHRecs):
+            keepIds.update(app_db.session.scalars(select(model.Material_id).distinct()))
+        for rec in MatlMap.values():
+            if rec.id not in keepIds:
+                validation.add('deletes', None, f'{rec.Material} (org {rec.org_id})')
+    # endif rmvMissingMaterial
+
+    return validation.as_dict(nRowsRead=nRows, nMaterialsInWICS=len(MatlMap))
+# proc_MatlListSAPSprsheet_Validate
 
 class PhaseEnum(Enum):
     INIT_UPL = "init-upl"
@@ -538,7 +877,36 @@ class PhaseEnum(Enum):
     CLEANUP_FAILURE = "cleanup-after-failure"
     RESULTS_PRESENTED = "resultspresented"
     FINAL = "**FINAL**"
+    RESUME = "resume"
 # PhaseEnum
+# the phases an update's ledger records, in order
+MM60_PIPELINE_PHASES = (PhaseEnum.INIT_UPL, PhaseEnum.READ_SPREADSHEET, PhaseEnum.IDENTIFY_EXIST, PhaseEnum.UPDATE_EXISTING, PhaseEnum.REMOVE, PhaseEnum.ADD)
+
+def fnMatlListSAPSprsheet_Unfinished() -> list[dict[str, Any]]:
+    """
+    the MM60 updates that have a ledger but haven't been cleaned up, newest first, each with its
+    async_comm state and whether it can be resumed - its job is taken to have died once neither it
+    nor its ledger has been touched in MM60_RESUME_IDLE_SECS
+    """
+    idleSecs = float(current_app.config.get('MM60_RESUME_IDLE_SECS', 300))
+    idleSince = datetime.datetime.now() - datetime.timedelta(seconds=idleSecs)
+    unfinished = []
+    for ledger in app_db.session.scalars(select(MM60UpdateLedger).order_by(MM60UpdateLedger.StartedAt.desc())):
+        acomm = async_comm.get_async_comm_record(ledger.reqid)
+        lastSeen = max((t for t in (acomm and acomm['timestamp'], ledger.UpdatedAt) if t), default=ledger.UpdatedAt)
+        statecode = acomm['statecode'] if acomm else None
+        unfinished.append({
+            'reqid': ledger.reqid,
+            'StartedAt': ledger.StartedAt,
+            'PhaseDone': ledger.PhaseDone,
+            'LastRowNum': ledger.LastRowNum,
+            'lastSeen': lastSeen,
+            'statecode': statecode,
+            'resumable': statecode in ('fatalerr', 'done') or lastSeen < idleSince,
+            })
+    # endfor ledger
+    return unfinished
+# fnMatlListSAPSprsheet_Unfinished
 
 @login_required
 def fnUpdateMatlListfromSAP_init():
@@ -553,21 +921,68 @@ def fnUpdateMatlListfromSAP():
 
     if request.method == 'POST':
         if   client_phaseEnum == PhaseEnum.INIT_UPL:
-            # start Huey consumer (or at least make sure it's running) and save the pid in a cookie so we can kill it later in the cleanup proc.  When we can start Huey programmatically, this is where we start it and get the pid.
-            # reqid = subprocess.Popen(
-                # ['python', f'huey_consumer.py', 'app.huey -w 4']
-            # ).pid
-            # retinfo.set_cookie('reqid',str(reqid))
+            # the spreadsheet has to be saved (or found) while we still have the request;
+            # everything after that is queued on the job runner and this request returns at once.
+            # The browser follows progress on /SSE/UplSprSht/<reqid> and asks for WANT_RESULTS when it sees 'done'
+            # while we're here, clear out any updates that were abandoned part way
+            proc_MatlListSAPSprsheet_99_PurgeAbandoned()
 
-            reqid = uuid.uuid4()
+            reqid = str(uuid.uuid4())
             while async_comm.async_comm_exists(reqid):
-                reqid = uuid.uuid4()
+                reqid = str(uuid.uuid4())
 
             UpdateExistFldList = request.form.getlist('UpIfCh')
             rmvMissingMaterial = (request.form.get('rmvMissingMaterial', False) == 'remove-missing-material')
             proc_MatlListSAPSprsheet_00InitUMLasync_comm(reqid, UpdateExistFldList, rmvMissingMaterial)
-            
-            retinfo = make_response(jsonify(reqid=str(reqid)))
+
+            use_local_copy = request.form.get('use-local-copy', False) == 'use-local-copy'
+            try:
+                if use_local_copy:
+                    UMLSSName = proc_MatlListSAPSprsheet_00ResolveLocalSpreadsheetPath(reqid)
+                else:
+                    UMLSSName = proc_MatlListSAPSprsheet_00CopyUMLSpreadsheet(reqid)
+                #endif use local copy
+            except FatalUploadError:
+                UMLSSName = None
+            if UMLSSName is None:
+                acomm_dict = async_comm.get_async_comm_record(reqid)
+                return make_response(jsonify(acomm_dict))
+            # endif no spreadsheet
+
+            if request.form.get('validateOnly', False) == 'validate-only':
+                # checked here and now, writing nothing; the browser shows the summary and starts over for the real update
+                try:
+                    validation = proc_MatlListSAPSprsheet_Validate(reqid, UMLSSName, UpdateExistFldList, rmvMissingMaterial,
+                        cleanup_file=not use_local_copy)
+                except FatalUploadError:
+                    # nothing to resume (the spreadsheet is gone), so its ledger goes too - once the error is read
+                    acomm_dict = async_comm.get_async_comm_record(reqid)
+                    proc_MatlListSAPSprsheet_99_Cleanup(reqid, clear_tmptable=False)
+                    return make_response(jsonify(acomm_dict))
+                proc_MatlListSAPSprsheet_99_Cleanup(reqid, clear_tmptable=False)
+                return make_response(jsonify(reqid=reqid, statecode='validated', validation=validation))
+            # endif validateOnly
+
+            enqueue_job('views.Material.updtMatlList:proc_MatlListSAPSprsheet_RunPipeline',
+                reqid, UMLSSName, cleanup_file=not use_local_copy)
+
+            retinfo = make_response(jsonify(reqid=reqid, queued=True))
+            return retinfo
+
+        elif client_phaseEnum == PhaseEnum.RESUME:
+            # carry on an interrupted update from its last checkpoint, on the job runner as INIT_UPL does
+            thisUpdate = next((u for u in fnMatlListSAPSprsheet_Unfinished() if u['reqid'] == reqid), None)
+            if thisUpdate is None or not thisUpdate['resumable']:
+                statetext = f'Update {reqid} can\'t be resumed - it has been cleaned up, or it is still running.'
+                return make_response(jsonify(reqid=reqid, statecode='fatalerr', statetext=statetext))
+            async_comm.set_async_comm_state(
+                reqid,
+                statecode = 'resuming',
+                statetext = f"Resuming after {thisUpdate['PhaseDone']}",
+                )
+            enqueue_job('views.Material.updtMatlList:proc_MatlListSAPSprsheet_RunPipeline', reqid)
+
+            retinfo = make_response(jsonify(reqid=reqid, queued=True))
             return retinfo
 
         elif client_phaseEnum == PhaseEnum.READ_SPREADSHEET:
@@ -579,55 +994,61 @@ def fnUpdateMatlListfromSAP():
             #endif use local copy
             proc_MatlListSAPSprsheet_01ReadSpreadsheet(reqid, UMLSSName, cleanup_file=not use_local_copy)
 
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.IDENTIFY_EXIST:
             proc_MatlListSAPSprsheet_02_identifyexistingMaterial(reqid)
             
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.UPDATE_EXISTING:
             proc_MatlListSAPSprsheet_03_UpdateExistingRecs(reqid)
             
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.REMOVE:
             # skip removals for now; just go straight to the adds
             # proc_MatlListSAPSprsheet_04_Remove(reqid)
             
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.ADD:
             proc_MatlListSAPSprsheet_04_Add(reqid)
             
-            acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-            acomm_dict = None if acomm is None else {c.key: getattr(acomm, c.key) for c in inspect(acomm).mapper.column_attrs}
+            acomm_dict = async_comm.get_async_comm_record(reqid)    # something's very wrong if this doesn't exist
             retinfo = make_response(jsonify(acomm_dict))
             return retinfo
         elif client_phaseEnum == PhaseEnum.WANT_RESULTS:
             proc_MatlListSAPSprsheet_99_FinalProc(reqid)
             # async_comm.delete_async_comm(mandatory_commit_key)
             
-            stmt = select(tmpMaterialListUpdate).where(tmpMaterialListUpdate.recStatus.startswith('err'))
+            stmt = select(tmpMaterialListUpdate).where(_staged(reqid), tmpMaterialListUpdate.recStatus.startswith('err'))
             ImpErrList = app_db.session.execute(stmt).scalars().all()
-            stmt = select(tmpMaterialListUpdate).where(tmpMaterialListUpdate.recStatus=='ADD')
+            stmt = select(tmpMaterialListUpdate).where(_staged(reqid), tmpMaterialListUpdate.recStatus=='ADD')
             AddedMatlsList = app_db.session.execute(stmt).scalars().all()
-            stmt = select(tmpMaterialListUpdate).where(tmpMaterialListUpdate.recStatus.startswith('DEL'))
+            stmt = select(tmpMaterialListUpdate).where(_staged(reqid), tmpMaterialListUpdate.recStatus.startswith('DEL'))
             RemvdMatlsList = app_db.session.execute(stmt).scalars().all()
+            # what 03UpdateExisting changed, a Material at a time
+            stmt = (
+                select(MaterialListChangeLog, Organizations.orgname)
+                .join(Organizations, MaterialListChangeLog.org_id == Organizations.id)
+                .where(MaterialListChangeLog.reqid == reqid)
+                .order_by(MaterialListChangeLog.Material, Organizations.orgname, MaterialListChangeLog.id)
+                )
+            ChangedMatls:dict[int, dict[str, Any]] = {}
+            for chg, orgname in app_db.session.execute(stmt):
+                ChangedMatls.setdefault(chg.Material_id, {'orgname': orgname, 'Material': chg.Material, 'changes': []})['changes'].append(chg)
             cntext = {
                 'dummyForm': FlaskForm(),       # for getting csrf_token
                 'reqid': reqid,
                 'ImpErrList':ImpErrList,
                 'AddedMatls':AddedMatlsList,
                 'RemvdMatls':RemvdMatlsList,
+                'ChangedMatls':list(ChangedMatls.values()),
                 }
             templt = 'Material/frmUpdateMatlListfromSAP_done.html'
             return checkTemplate_and_render(templt, **cntext)
@@ -648,40 +1069,13 @@ def fnUpdateMatlListfromSAP():
 
         cntext = {
             'reqid': -1,
+            'UnfinishedUpdates': fnMatlListSAPSprsheet_Unfinished(),
             }
         templt = 'Material/frmUpdateMatlListfromSAP_phase0.html'
         return checkTemplate_and_render(templt, **cntext)
     #endif req.method = 'POST'
 # fnunUpdateMatlListfromSAP
 
-# def init_UpldMatlList():
-#     reqid = str(uuid.uuid4())
-#     while async_comm.async_comm_exists(reqid):
-#         reqid = str(uuid.uuid4())
-
-#     UpdateExistFldList = request.form.getlist('UpIfCh')
-#     rmvMissingMaterial = (request.form.get('rmvMissingMaterial', False) == 'remove-missing-material')
-#     proc_MatlListSAPSprsheet_00InitUMLasync_comm(reqid, UpdateExistFldList, rmvMissingMaterial)
-
-#     uselocalCopy = (request.form.get('use-local-copy', False) == 'use-local-copy')
-#     UMLSSName = proc_MatlListSAPSprsheet_00CopyUMLSpreadsheet(reqid, uselocalCopy)
-
-#     pipeline = (
-#         proc_MatlListSAPSprsheet_01ReadSpreadsheet.s(reqid, UMLSSName)
-#         .then(proc_MatlListSAPSprsheet_02_identifyexistingMaterial.s())
-#         .then(proc_MatlListSAPSprsheet_03_UpdateExistingRecs.s())
-#         .then(proc_MatlListSAPSprsheet_04_Remove.s())
-#         .then(proc_MatlListSAPSprsheet_04_Add.s())
-#         )
-#     huey.enqueue(pipeline)
-    
-
-#     acomm = async_comm.get_async_comm_state(reqid)    # something's very wrong if this doesn't exist
-#     # retinfo = make_response(jsonify(reqid))
-#     # return retinfo
-#     return {"job_id": reqid}
-# # init_UpldMatlList
-
 # from database import HueySession
 # @app.get("/SSE/UpdMatlLst/<reqid>")
 
@@ -1,8 +1,9 @@
 from . import procs_SAP
+from . import upldSAP
 
 from .procs_SAP import (
     nearestSAPDate,
     fnShowSAP,
-    fnSAPList,
+    fnSAPList, fnSAPListIter, fnSAPByMaterial, fnSAPTotals, SAP_QTY_FIELDS,
     fnSAPExists, fnajaxSAPExists,
 )
@@ -8,7 +8,7 @@ from sqlalchemy import select
 
 from flask import (
     request, session, 
-    jsonify,
+    jsonify, make_response,
     current_app,
     )
 from flask_login import login_required, current_user
@@ -25,30 +25,27 @@ from calvincTools.utils import (
     )
 
 from models import (
-    SAP_SOHRecs, SAPPlants_org, UnitsOfMeasure, UploadSAPResults,
+    SAP_SOHRecs, SAP_SOHTotals, SAPPlants_org, UnitsOfMeasure, UploadSAPResults,
     #, VIEW_SAP
     WhsePartTypes, MaterialList, tmpMaterialListUpdate,
     async_comm,
     )
 
 from database import app_db
+from procs.sohsnapshot import SOH_valid_on
+from procs.sapdates import SAP_dates, nearest_SAP_date, SAP_date_exists
+from procs.saptable import fnSAPTablePage
 
 
 def nearestSAPDate(for_date=date.today()) -> date|None:
     """
-    returns the nearest SAP_SOHRecs.uploaded_at date that is less than or equal to for_date
-    if no SAP_SOHRecs exist, returns None
+    returns the nearest SAP snapshot date that is less than or equal to for_date
+    if there is none, the earliest snapshot date (even though it's after for_date)
+    if no SAP snapshots exist, returns None
+    the dates come from the app-wide cache in procs.sapdates
     """
     
-    stmt = select(SAP_SOHRecs.uploaded_at).where(SAP_SOHRecs.uploaded_at <= for_date).order_by(SAP_SOHRecs.uploaded_at.desc()).limit(1)
-    nearest_date = app_db.session.execute(stmt).scalar_one_or_none()
-    
-    if nearest_date is None:
-        # if there are any SAP_SOHRecs, return the earliest one, even if it's after for_date
-        stmt_earliest = select(SAP_SOHRecs.uploaded_at).order_by(SAP_SOHRecs.uploaded_at.asc()).limit(1)
-        nearest_date = app_db.session.execute(stmt_earliest).scalar_one_or_none()
-    
-    return nearest_date
+    return nearest_SAP_date(coerce_date(for_date))
 # nearestSAPDate
 
 def fnSAPExists(reqDate:date=date.today()) -> bool:
@@ -56,7 +53,7 @@ def fnSAPExists(reqDate:date=date.today()) -> bool:
     returns true or false indicating if SAP_SOH data exists for reqDate
     """
 
-    return nearestSAPDate(for_date=reqDate) == reqDate
+    return SAP_date_exists(coerce_date(reqDate))
 # fnSAPExists
 def fnajaxSAPExists(reqDate=date.today()):
     """
@@ -69,63 +66,106 @@ def fnajaxSAPExists(reqDate=date.today()):
 
 @login_required
 def fnShowSAP(reqDate=date.today()):
+    """
+    the SAP table page.  Only the frame is rendered here; the page loads the lines itself, a page at a time
+    as it's scrolled, from fnSAPTable_json
+    """
 
     reqDate = coerce_date(reqDate)
     _myDtFmt = current_app.config.get('DEFAULT_DATEFORMAT', '%Y-%m-%d')
 
-    SAP_tbl = fnSAPList(for_date=reqDate)
+    SAPDate = nearestSAPDate(for_date=reqDate)
     
-    stmt = select(SAP_SOHRecs.uploaded_at).distinct().order_by(SAP_SOHRecs.uploaded_at.desc())
-    SAPDatesRaw = app_db.session.execute(stmt).scalars().all()
+    SAPDatesRaw = reversed(SAP_dates())
     
     SAPDates = []
     for D in SAPDatesRaw:
         SAPDates.append(D.strftime(_myDtFmt))
 
 
-    cntext = {'reqDate': SAP_tbl['reqDate'],
+    cntext = {'reqDate': reqDate,
             'SAPDateList': SAPDates,
-            'SAPDate': SAP_tbl['SAPDate'].strftime(_myDtFmt),
-            'SAPSet': SAP_tbl['SAPTable'],
+            'SAPDate': SAPDate.strftime(_myDtFmt) if SAPDate else '',
+            'SAPDateISO': SAPDate.isoformat() if SAPDate else '',
+            'pageSize': int(current_app.config.get('SAPTABLE_PAGESIZE', 200)),
             }
     templt = 'SAP/show_SAP_table.html'
     return checkTemplate_and_render(templt, **cntext)
 
+@login_required
+def fnSAPTable_json(reqDate):
+    """
+    a page of the SAP table for the snapshot nearest reqDate:
+        ?sort=<SAPTABLE_SORTS key>&dir=asc|desc&after=<cursor>&limit=n&material=<prefix>&plant=&storageloc=
+    returns {"SAPDate", "rows": [{...}, ...], "next": cursor or null[, "nRows" on the first page]}
+    """
+    SAPDate = nearestSAPDate(for_date=coerce_date(reqDate))
+    if SAPDate is None:
+        return jsonify(SAPDate=None, rows=[], next=None, nRows=0)
+
+    limit = request.args.get('limit', current_app.config.get('SAPTABLE_PAGESIZE', 200), type=int)
+    limit = max(1, min(limit, int(current_app.config.get('SAPTABLE_MAXPAGESIZE', 1000))))
+    try:
+        page = fnSAPTablePage(SAPDate,
+            sort=request.args.get('sort', 'material'),
+            descending=request.args.get('dir', 'asc') == 'desc',
+            after=request.args.get('after') or None,
+            limit=limit,
+            material=request.args.get('material', '').strip() or None,
+            plant=request.args.get('plant', '').strip() or None,
+            storageloc=request.args.get('storageloc', '').strip() or None,
+            )
+    except ValueError as e:
+        return make_response(jsonify(error=str(e)), 400)
+    return jsonify(SAPDate=SAPDate.isoformat(), **page)
+# fnSAPTable_json
+
 
 ####################################################################################
 ####################################################################################
 ####################################################################################
 
 
-# read the last SAP list before for_date into a list of SAP_SOHRecs
-def fnSAPList(for_date = date.today(), matl = None) -> dict:
+# the SAP_SOHRecs fields most callers of fnSAPList need: fnSAPList(..., fields=SAP_QTY_FIELDS)
+SAP_QTY_FIELDS = ('Material_id', 'MaterialPartNum', 'StorageLocation', 'Amount', 'BaseUnitofMeasure')
+
+def fnSAPByMaterial(SAPTable) -> dict[int, dict]:
     """
-    finally done!: allow matl to be a MaterialList object or an id
-    matl is a Material (string, NOT object!), or list, tuple or queryset of Materials to list, or None if all records are to be listed
-    the SAPDate returned is the last one prior or equal to for_date
+    index a fnSAPList SAPTable (or an fnSAPListIter stream) by Material_id:
+        {Material_id: {'SAPRows': [SAP_SOHRecs or row, ...], 'SAPTotal': sum of Amount*mult}}
+    SAPRows keep the SAPTable order (i.e., by StorageLocation).  A row with no UOM multiplier counts as mult 1
     """
-    _myDtFmt = '%Y-%m-%d %H:%M'
-
-    dateObj = coerce_date(for_date)
-
-    LatestSAPDate = nearestSAPDate(for_date=dateObj)
-
-    # Create the subquery equivalent to Django's Subquery + OuterRef
-    uom_subquery = (
-        select(UnitsOfMeasure.Multiplier1)
-        .where(UnitsOfMeasure.UOM == SAP_SOHRecs.BaseUnitofMeasure)
-        .limit(1)
-        .scalar_subquery()
-    )
+    SAPByMatl:dict[int, dict] = {}
+    for SAProw in SAPTable:
+        entry = SAPByMatl.get(SAProw.Material_id)
+        if entry is None:
+            entry = SAPByMatl[SAProw.Material_id] = {'SAPRows': [], 'SAPTotal': 0}
+        entry['SAPRows'].append(SAProw)
+        entry['SAPTotal'] += (SAProw.Amount or 0) * (SAProw.mult if SAProw.mult is not None else 1)
+    # endfor SAProw
+    return SAPByMatl
+# fnSAPByMaterial
+
+def _SAPList_stmt(LatestSAPDate, matl = None, fields = None):
+    """fnSAPList's query: SAP_SOHRecs entities (or, given fields, just those columns) and mult"""
+    if fields is None:
+        cols = [SAP_SOHRecs]
+    else:
+        unknown = [fld for fld in fields if fld not in SAP_SOHRecs.__table__.c]
+        if unknown:
+            raise ValueError(f'not SAP_SOHRecs fields: {", ".join(unknown)}')
+        cols = [getattr(SAP_SOHRecs, fld) for fld in fields]
 
     # Build the main query with the annotation (label) and ordering
+    # UOM is unique, so the outer join gives each row its multiplier (or None)
     stmt = (
         select(
-            SAP_SOHRecs, 
-            uom_subquery.label("mult")
+            *cols, 
+            UnitsOfMeasure.Multiplier1.label("mult")
         )
         .join(SAP_SOHRecs.Material)  # Assuming a relationship is configured
-        .where(SAP_SOHRecs.uploaded_at == LatestSAPDate)
+        .outerjoin(UnitsOfMeasure, UnitsOfMeasure.UOM == SAP_SOHRecs.BaseUnitofMeasure)
+        .where(SOH_valid_on(LatestSAPDate))
         .order_by(
             MaterialList.org_id, 
             MaterialList.Material, 
@@ -145,11 +185,35 @@ def fnSAPList(for_date = date.today(), matl = None) -> dict:
         # endif matl type
     # endif matl provided
 
-    SAPLatest = app_db.session.execute(stmt).all()
-    sap_record_list = []
-    for sap_record, mult in SAPLatest:
-        sap_record.mult = mult
-        sap_record_list.append(sap_record)
+    return stmt
+# _SAPList_stmt
+
+# read the last SAP list before for_date into a list of SAP_SOHRecs
+def fnSAPList(for_date = date.today(), matl = None, byMaterial = False, fields = None) -> dict:
+    """
+    finally done!: allow matl to be a MaterialList object or an id
+    matl is a Material (string, NOT object!), or list, tuple or queryset of Materials to list, or None if all records are to be listed
+    the SAPDate returned is the last one prior or equal to for_date
+    if byMaterial, SList['SAPByMaterial'] is also returned - SAPTable indexed by Material_id (see fnSAPByMaterial)
+    fields (e.g., SAP_QTY_FIELDS) makes SAPTable a list of lightweight rows with just those SAP_SOHRecs fields, and mult,
+    instead of SAP_SOHRecs entities.  For a whole snapshot, fnSAPListIter doesn't hold it all in memory at once
+    """
+    _myDtFmt = '%Y-%m-%d %H:%M'
+
+    dateObj = coerce_date(for_date)
+
+    LatestSAPDate = nearestSAPDate(for_date=dateObj)
+
+    stmt = _SAPList_stmt(LatestSAPDate, matl, fields)
+
+    if fields is None:
+        SAPLatest = app_db.session.execute(stmt).all()
+        sap_record_list = []
+        for sap_record, mult in SAPLatest:
+            sap_record.mult = mult
+            sap_record_list.append(sap_record)
+    else:
+        sap_record_list = app_db.session.execute(stmt).all()
     
     SList = {'reqDate': for_date, 'SAPDate': LatestSAPDate, 'SAPTable':[]}
 
@@ -158,15 +222,60 @@ def fnSAPList(for_date = date.today(), matl = None) -> dict:
     if not sap_record_list:
         SList['SAPDate'] = None
     SList['SAPTable'] = sap_record_list
+    if byMaterial:
+        SList['SAPByMaterial'] = fnSAPByMaterial(sap_record_list)
 
     return SList
 
+def fnSAPListIter(for_date = date.today(), matl = None, fields = SAP_QTY_FIELDS, chunkSize = None):
+    """
+    fnSAPList's rows (fields and mult; fields=None for SAP_SOHRecs entities, with .mult set) for the SAP date nearest
+    for_date, streamed from the database chunkSize (default SAPLIST_STREAM_CHUNKSIZE) rows at a time
+    """
+    LatestSAPDate = nearestSAPDate(for_date=coerce_date(for_date))
+    if chunkSize is None:
+        chunkSize = int(current_app.config.get('SAPLIST_STREAM_CHUNKSIZE', 2000))
+
+    stmt = _SAPList_stmt(LatestSAPDate, matl, fields).execution_options(yield_per=max(1, int(chunkSize)))
+    for row in app_db.session.execute(stmt):
+        if fields is None:
+            sap_record, mult = row
+            sap_record.mult = mult
+            yield sap_record
+        else:
+            yield row
+    # endfor row
+# fnSAPListIter
+
+def fnSAPTotals(for_date = date.today(), matl = None) -> dict:
+    """
+    the SAP totals (Amount * UOM multiplier, summed per Material) as of the last SAP date prior or equal to for_date,
+    read from WICS_sap_sohtotals instead of adding up the SAP rows.  matl is as for fnSAPList
+    returns {'reqDate', 'SAPDate', 'SAPTotals': {Material_id: total}}; a Material with no SAP rows isn't in SAPTotals
+    """
+    LatestSAPDate = nearestSAPDate(for_date=coerce_date(for_date))
+
+    stmt = select(SAP_SOHTotals.Material_id, SAP_SOHTotals.SAPTotal).where(SOH_valid_on(LatestSAPDate, SAP_SOHTotals))
+    if matl:
+        if isinstance(matl,MaterialList):
+            stmt = stmt.where(SAP_SOHTotals.Material_id == matl.id)
+        elif isinstance(matl,int):
+            stmt = stmt.where(SAP_SOHTotals.Material_id == matl)
+        else:   # it better be an iterable!
+            stmt = stmt.where(SAP_SOHTotals.Material_id.in_([m for m in matl]))
+        # endif matl type
+    # endif matl provided
+
+    return {'reqDate': for_date, 'SAPDate': LatestSAPDate, 'SAPTotals': dict(app_db.session.execute(stmt).tuples().all())}
+# fnSAPTotals
+
 
 ####################################################################################
 ####################################################################################
 ####################################################################################
 
 ##### the suite of procs to support fnUploadSAP
+##### (ported to Flask in views/SAP/upldSAP.py; kept here for reference)
 
 
 # class UploadSAPForm(forms.Form):
@@ -0,0 +1,402 @@
+import datetime, os, uuid
+from typing import Any
+from enum import Enum
+
+from flask import (
+    request, current_app,
+    redirect, url_for,
+    make_response, jsonify,
+    )
+from flask_login import login_required
+from flask_wtf import FlaskForm
+
+from sqlalchemy import (
+    select, delete, insert, func,
+    )
+
+from calvincTools.utils import (
+    coerce_date,
+    ExcelWorkbook_fileext,
+    checkTemplate_and_render,
+    )
+
+from database import app_db
+from models import (
+    SAP_SOHSnapshot, SAPPlants_org, MaterialList, UploadSAPResults,
+    async_comm,
+    )
+from procs.sprsht_ingest import (
+    SprshtIngest, SprshtIngestError,
+    Sprsht_fileexts,
+    )
+from procs.sohsnapshot import store_SOH_snapshot, fnSOH_LegacyDates, SOHLegacyHistoryError
+from async_procs.jobrunner import enqueue_job
+
+
+##############################################################
+##############################################################
+##############################################################
+
+##### the suite of procs to support fnUploadSAP
+
+class FatalUploadError(Exception):
+    pass
+
+# MM52 column header -> SAP_SOHRecs field
+SAP_SSName_TableName_map = {
+        'Material': 'MaterialPartNum',      # Material+org will translate to a Material_id
+        'Plant': 'Plant',
+        'Material description': 'Description',
+        'Material type': 'MaterialType',
+        'Storage location': 'StorageLocation',
+        'Base Unit of Measure': 'BaseUnitofMeasure',
+        'Unrestricted': 'Amount',
+        'Currency': 'Currency',
+        'Value Unrestricted': 'ValueUnrestricted',
+        'Special Stock': 'SpecialStock',
+        'Blocked':'Blocked',
+        'Value BlockedStock':'ValueBlocked',
+        'Vendor':'Vendor',
+        'Batch': 'Batch',
+        }
+SprshtREQUIREDFLDS = ['MaterialPartNum', 'Plant']
+SAP_NumericFlds = ('Amount', 'ValueUnrestricted', 'Blocked', 'ValueBlocked')
+SAP_StringFlds = tuple(fld for fld in SAP_SSName_TableName_map.values() if fld not in SAP_NumericFlds)
+# every SAP_SOHRecs row is built in this field order, so a chunk can go out as a single executemany
+SOHRec_flds = ('org_id', 'Material_id') + SAP_StringFlds + SAP_NumericFlds
+
+def _sohnum(val) -> float|None:
+    # a CSV export gives the quantities as text, maybe with thousands separators
+    if val is None or isinstance(val, (int, float)):
+        return val
+    val = str(val).strip().replace(',', '')
+    if not val:
+        return None
+    try:
+        return float(val)
+    except ValueError:
+        return None
+# _sohnum
+
+def proc_UpSAPSprsheet_00InitUpld(reqid) -> None:
+    acomm = async_comm.set_async_comm_state(
+        reqid,
+        processname = 'Upload SAP MM52',
+        statecode = 'reading-spreadsht-init',
+        statetext = 'Initializing',
+        )
+
+    # Clear lingering results, if they exist, from previous uploads
+    app_db.session.execute(delete(UploadSAPResults))
+    app_db.session.commit()
+
+def proc_UpSAPSprsheet_00CopySpreadsheet(reqid) -> str:
+    acomm = async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'uploading-sprsht',
+        statetext = 'Uploading Spreadsheet',
+        )
+
+    # save the file so we can open it as an excel file
+    SAPFile = request.files.get('SAPFile')
+    if SAPFile is None:
+        acomm = async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = 'No spreadsheet file uploaded',
+            result = 'FAIL - no file',
+            )
+        return ""
+    svdir = current_app.config.get('SAP_FILELOC', os.getcwd())
+    os.makedirs(svdir, exist_ok=True)
+    # keep the extension so a CSV/TSV export is read as one
+    ext = os.path.splitext(SAPFile.filename or '')[1].lower()
+    if ext not in Sprsht_fileexts: ext = ExcelWorkbook_fileext
+    fName = os.path.join(svdir, f"tmpSAP{uuid.uuid4()}{ext}")
+    SAPFile.save(fName)
+
+    return fName
+
+def proc_UpSAPSprsheet_01ReadSheet(reqid: Any, fName: str, UplDate: datetime.date|str) -> None:
+    """
+    read an MM52 and make it the SAP_SOHRecs snapshot for UplDate.  Plants and Materials are resolved
+    up front (one query each); the sheet is then read and checked a batch at a time, and the new snapshot
+    stored (procs.sohsnapshot: only the lines that changed are written, a chunk per executemany) in a
+    single transaction - so the SAP screens see either the old snapshot or the new one, never a part of either
+    """
+    UplDate = coerce_date(UplDate)
+    acomm = async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'rdng-sprsht',
+        statetext = 'Reading Spreadsheet',
+        )
+
+    def fail_upload(statetext, result = 'FAIL - bad spreadsheet'):
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = statetext,
+            result = result,
+            )
+        if os.path.exists(fName):
+            os.remove(fName)
+        raise FatalUploadError(statetext)
+    # fail_upload
+
+    # a snapshot stored over history that's still a full copy per day would read (and retire) those
+    # copies - store_SOH_snapshot refuses it too, but this says so before the sheet is read
+    legacyDates = fnSOH_LegacyDates()
+    if legacyDates:
+        fail_upload(f'SAP history for {len(legacyDates)} day(s) from {legacyDates[0]} on has not been converted yet.  '
+            'Run `flask wics compact-sap-history` first, then upload again.', result = 'FAIL - SAP history not converted')
+
+    chunkSize = max(1, int(current_app.config.get('SAPUPLOAD_CHUNKSIZE', 5000)))
+    try:
+        SS = SprshtIngest(fName, SAP_SSName_TableName_map, batchsize=chunkSize)
+    except SprshtIngestError as e:
+        fail_upload(f'Error: {e}. Please fix this and try again.')
+    # from here the sheet is closed and the file removed however the read ends
+    try:
+        if SS.duplicatecols:
+            SS.close()
+            fail_upload(f'SAP Spreadsheet has bad header row - More than one column named {SS.duplicatecols[0]}.  See Calvin to fix this.')
+        MissingRequiredFields = [reqFld for reqFld in SprshtREQUIREDFLDS if reqFld not in SS.colmap]
+        if MissingRequiredFields:
+            SS.close()
+            fail_upload(f'SAP Spreadsheet has bad header row - no {" or ".join(MissingRequiredFields)} column.  See Calvin to fix this.')
+
+        # Plant -> org_id, and (org_id, Material) -> Material_id, each built with one query rather than a lookup per row;
+        # Materials keyed casefolded, since the MaterialList.get this replaces was case-insensitive in MySQL
+        PlantOrgMap = {str(rec.SAPPlant): rec.org_id for rec in app_db.session.execute(select(SAPPlants_org)).scalars()}
+        stmt = select(MaterialList.id, MaterialList.org_id, MaterialList.Material).where(MaterialList.org_id.in_(set(PlantOrgMap.values())))
+        MatlMap = {(org_id, Material.casefold()): id for id, org_id, Material in app_db.session.execute(stmt)}
+
+        nRowsRead = 1
+        nRowsAdded = 0
+        nRowsErrors = 0
+        nRowsNoMaterial = 0
+        numrows = SS.numrows or 0      # 0 if the sheet has no <dimension> (or it's a CSV); progress then just counts up
+        reportEveryNRows = min(1000, max(1, numrows//100)) if numrows else 1000
+
+        # the new snapshot is held as tuples in SOHRec_flds order until it's written
+        pendingSOH:list[tuple] = []
+        pendingResults:list[dict[str, Any]] = []
+        for batch in SS.batches():
+            MaterialCol = batch.columns['MaterialPartNum']
+            PlantCol = batch.columns['Plant']
+            StringCols = [batch.columns.get(fld) for fld in SAP_StringFlds]
+            NumericCols = [batch.columns.get(fld) for fld in SAP_NumericFlds]
+            for i, SprshtRowNum in enumerate(batch.rowNums):
+                nRowsRead = SprshtRowNum
+                if SprshtRowNum % reportEveryNRows == 0:
+                    async_comm.set_async_comm_state(
+                        reqid,
+                        statecode = 'rdng-sprsht',
+                        statetext = f'Reading Spreadsheet ... record {SprshtRowNum} of {numrows}<br><progress max="{numrows}" value="{SprshtRowNum}"></progress>',
+                        )
+
+                MatlNum = '' if MaterialCol[i] is None else str(MaterialCol[i]).strip()
+                if not MatlNum:
+                    nRowsNoMaterial += 1
+                    continue
+                Plant = '' if PlantCol[i] is None else str(PlantCol[i]).strip()
+                _org = PlantOrgMap.get(Plant)
+                Material_id = MatlMap.get((_org, MatlNum.casefold())) if _org is not None else None
+                if Material_id is None:
+                    nRowsErrors += 1
+                    if _org is None:
+                        errmsg = f'{Plant!r} is not a known SAP Plant (row for {MatlNum})'
+                    else:
+                        errmsg = f'either {MatlNum} does not exist in MaterialList or incorrect Plant ({Plant}) given'
+                    pendingResults.append({'errState': 'error', 'errmsg': errmsg, 'rowNum': SprshtRowNum})
+                    continue
+                # endif no Material_id
+
+                # we are preserving the incoming MaterialPartNum string
+                pendingSOH.append(
+                    (_org, Material_id)
+                    + tuple('' if col is None or col[i] is None else str(col[i]) for col in StringCols)
+                    + tuple(None if col is None else _sohnum(col[i]) for col in NumericCols)
+                    )
+                nRowsAdded += 1
+            # endfor i, SprshtRowNum
+        # endfor batch
+    finally:
+        # close and kill temp files
+        SS.close()
+        if os.path.exists(fName):
+            os.remove(fName)
+    # endtry
+
+    # if SAP SOH records exist for this date, they're replaced; only one set of SAP SOH records per day
+    # (this was signed off on by user before coming here).  History still stored a full copy per day is
+    # converted by `flask wics compact-sap-history`, not here (the upload refuses until it has been).
+    # async_comm writes on its own connection, which SQLite (but not MySQL) would keep waiting on the write
+    # lock this transaction holds, so there each chunk's progress is only kept in memory (and streamed)
+    # until the transaction's done
+    async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'wrtng-SAP',
+        statetext = f'Replacing the SAP snapshot for {UplDate} ... {nRowsAdded} records',
+        )
+    deferProgress = (app_db.engine.dialect.name == 'sqlite')
+    def reportWriteProgress(nWritten, nRowsNew):
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'wrtng-SAP',
+            statetext = f'Replacing the SAP snapshot for {UplDate} ... changed record {nWritten} of {nRowsNew}<br><progress max="{nRowsNew}" value="{nWritten}"></progress>',
+            deferwrite = deferProgress,
+            )
+    # reportWriteProgress
+    try:
+        stored = store_SOH_snapshot(UplDate, SOHRec_flds, pendingSOH, chunkSize, progress=reportWriteProgress)
+        nRowsReplaced = stored['nRowsReplaced']
+        pendingResults.extend([
+            {'errState': 'nRowsTotal', 'errmsg': '', 'rowNum': nRowsRead},
+            {'errState': 'nRowsAdded', 'errmsg': '', 'rowNum': nRowsAdded},
+            {'errState': 'nRowsErrors', 'errmsg': '', 'rowNum': nRowsErrors},
+            {'errState': 'nRowsIgnored', 'errmsg': '', 'rowNum': nRowsNoMaterial},
+            {'errState': 'nRowsReplaced', 'errmsg': '', 'rowNum': nRowsReplaced},
+            ])
+        for i in range(0, len(pendingResults), chunkSize):
+            app_db.session.execute(insert(UploadSAPResults.__table__), pendingResults[i:i+chunkSize])
+        app_db.session.commit()
+    except SOHLegacyHistoryError as e:
+        # unconverted history turned up since the check above
+        app_db.session.rollback()
+        fail_upload(f'Error: {e}', result = 'FAIL - SAP history not converted')
+    except Exception:
+        app_db.session.rollback()
+        raise
+    # endtry
+
+    async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'done-rdng-sprsht',
+        statetext = f'Finished Reading Spreadsheet',
+        )
+# proc_UpSAPSprsheet_01ReadSheet
+
+def proc_UpSAPSprsheet_99_FinalProc(reqid:Any) -> None:
+    async_comm.set_async_comm_state(
+        reqid,
+        statecode = 'done',
+        statetext = 'Finished Processing Spreadsheet',
+        )
+
+def proc_UpSAPSprsheet_99_Cleanup(reqid:Any) -> None:
+    async_comm.delete_async_comm(reqid)
+
+    # delete the temporary table
+    app_db.session.execute(delete(UploadSAPResults))
+    app_db.session.commit()
+# proc_UpSAPSprsheet_99_Cleanup
+
+def proc_UpSAPSprsheet_RunUpload(reqid, fName, UplDate):
+    """
+    read the MM52 and post it, then 'done'; run by the background job runner (async_procs.jobrunner)
+    that INIT_UPL enqueues it on.  Progress goes to async_comm, for the browser's SSE stream
+    """
+    try:
+        proc_UpSAPSprsheet_01ReadSheet(reqid, fName, UplDate)
+        proc_UpSAPSprsheet_99_FinalProc(reqid)
+    except FatalUploadError:
+        # 01 has already set statecode 'fatalerr'; the browser sees it on the SSE stream
+        pass
+    except Exception as e:
+        app_db.session.rollback()
+        async_comm.set_async_comm_state(
+            reqid,
+            statecode = 'fatalerr',
+            statetext = f'Error: Something went wrong while uploading the SAP spreadsheet. Details: {e}',
+            result = 'FAIL - exception in background job',
+            )
+        raise
+    return reqid
+# proc_UpSAPSprsheet_RunUpload
+
+class PhaseEnum(Enum):
+    INIT_UPL = "init-upl"
+    READ_SPREADSHEET = "01ReadSpreadsheet"
+
+    WANT_RESULTS = "wantresults"
+    CLEANUP_FAILURE = "cleanup-after-failure"
+    RESULTS_PRESENTED = "resultspresented"
+    FINAL = "**FINAL**"
+# PhaseEnum
+
+@login_required
+def fnUploadSAP_init():
+    return redirect(url_for('WICS.UploadSAPSprSht'))
+
+@login_required
+def fnUploadSAP():
+
+    client_phase = request.form.get('currentPhase', None)
+    client_phaseEnum = PhaseEnum(client_phase) if client_phase is not None else None
+    reqid = request.form.get('reqid', None)
+
+    if request.method == 'POST':
+        if   client_phaseEnum == PhaseEnum.INIT_UPL:
+            # the spreadsheet is saved while we still have the request; reading and posting it is queued
+            # on the job runner and this request returns at once.  The browser follows progress on
+            # /SSE/UplSprSht/<reqid> and asks for WANT_RESULTS when it sees 'done'
+            reqid = str(uuid.uuid4())
+            while async_comm.async_comm_exists(reqid):
+                reqid = str(uuid.uuid4())
+
+            proc_UpSAPSprsheet_00InitUpld(reqid)
+
+            UplDate = coerce_date(request.form.get('uploaded_at') or datetime.date.today())
+            fName = proc_UpSAPSprsheet_00CopySpreadsheet(reqid)
+            if not fName:
+                return make_response(jsonify(async_comm.get_async_comm_record(reqid)))
+
+            enqueue_job('views.SAP.upldSAP:proc_UpSAPSprsheet_RunUpload', reqid, fName, UplDate.isoformat())
+
+            retinfo = make_response(jsonify(reqid=reqid, queued=True))
+            return retinfo
+        elif client_phaseEnum == PhaseEnum.WANT_RESULTS:
+            stmt = select(UploadSAPResults.errState, UploadSAPResults.rowNum).where(UploadSAPResults.errState.like('nRows%'))
+            ResultStats = dict(app_db.session.execute(stmt).tuples().all())
+
+            stmt = select(UploadSAPResults).where(UploadSAPResults.errState.not_like('nRows%')).order_by(UploadSAPResults.rowNum)
+            UplResults = app_db.session.execute(stmt).scalars().all()
+            cntext = {
+                'dummyForm': FlaskForm(),       # for getting csrf_token
+                'reqid': reqid,
+                'uploaded_at': request.form.get('uploaded_at', ''),
+                'UplProblems': UplResults,
+                'ResultStats': {
+                    'nRowsRead': ResultStats.get('nRowsTotal', 1) - 1,
+                        # -1 because header doesn't count
+                    'nRowsAdded': ResultStats.get('nRowsAdded', 0),
+                    'nRowsNoMaterial': ResultStats.get('nRowsIgnored', 0),
+                    'nRowsErrors': ResultStats.get('nRowsErrors', 0),
+                    'nRowsReplaced': ResultStats.get('nRowsReplaced', 0),
+                    },
+                }
+            templt = 'SAP/frm_upload_SAP_Success.html'
+            return checkTemplate_and_render(templt, **cntext)
+        elif client_phaseEnum == PhaseEnum.CLEANUP_FAILURE:
+            proc_UpSAPSprsheet_99_Cleanup(reqid)
+            return make_response(jsonify(status='cleanup-complete', reqid=str(reqid)))
+        elif client_phaseEnum == PhaseEnum.RESULTS_PRESENTED:
+            proc_UpSAPSprsheet_99_Cleanup(reqid)
+            return make_response(jsonify(status='results-presented', reqid=str(reqid)))
+        elif client_phaseEnum == PhaseEnum.FINAL:
+            return make_response(jsonify(status='final', reqid=str(reqid)))
+        else:
+            return make_response(jsonify(error=f'Unknown client_phase: {client_phase}'), 400)
+        # endif client_phaseEnum
+    else:   # req.method != 'POST'
+        LastSAPUploadDate = app_db.session.scalar(select(func.max(SAP_SOHSnapshot.uploaded_at)))
+        cntext = {
+            'LastSAPUploadDate': LastSAPUploadDate,
+            'today': datetime.date.today(),
+            }
+        templt = 'SAP/frm_upload_SAP.html'
+    #endif req.method
+
+    return checkTemplate_and_render(templt, **cntext)
+# fnUploadSAP